@@ -1,66 +1,217 @@
+import logging
 import os
-from typing import Any, List, Optional
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
-from langchain.chains import RetrievalQA
-from langchain.document_loaders import DirectoryLoader, PyPDFLoader, TextLoader
 from langchain.embeddings import OpenAIEmbeddings
-from langchain.llms import OpenAI
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import Chroma
+
+from app.config import env_bool, env_float, env_int, env_str
+from app.embeddings import (
+    BatchedEmbeddings,
+    CachedEmbeddings,
+    LimitedEmbeddings,
+    SQLiteEmbeddingCache,
+    TracedEmbeddings,
+)
+from app.ingestion import IngestionManifest, hash_file, hash_text, make_chunk_id
+from app.lexical import (
+    BM25Index,
+    is_keyword_query,
+    lexical_weight,
+    reciprocal_rank_fusion,
+)
+from app.pipeline import IngestionPipeline
+from app.retrieval import PipelineRetriever, RetrievalPipeline, make_reranker
+from app.telemetry import telemetry
+from app.vectorstores import (
+    VECTOR_STORES,
+    ChromaVectorStore,
+    NumpyVectorStore,
+    VectorStore,
+)
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class RAGSystem:
     def __init__(self, chroma_directiory: str, collection_name: str):
         self.chroma_directory = chroma_directiory
         self.collection_name = collection_name
-        self.embeddings = OpenAIEmbeddings()
-        self.llm = OpenAI(temperature=0.7)
+        self.embeddings = self._setup_embeddings()
+        # LLM dan RetrievalQA hanya dipakai mode "qa", dibuat saat pertama dipakai
+        self._llm = None
+        self._qa_chain = None
+        self._lazy_lock = threading.Lock()
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000, chunk_overlap=200, length_function=len
         )
-        self.vectorstore = None
-        self.qa_chain = None
+        self.vectorstore: Optional[VectorStore] = None
+        self.manifest = IngestionManifest(self.chroma_directory, self.collection_name)
+        self._lock = threading.RLock()
+        self.pipeline = IngestionPipeline(
+            self,
+            max_workers=env_int("INGEST_MAX_WORKERS", 0) or None,
+            pages_per_task=env_int("INGEST_PAGES_PER_TASK", 16),
+            embed_batch_size=env_int("INGEST_EMBED_BATCH_SIZE", 256),
+            max_pending_batches=env_int("INGEST_MAX_PENDING_BATCHES", 2),
+        )
+
+        self.lexical = None
+        self.retrieval = RetrievalPipeline(
+            self,
+            k=env_int("RETRIEVAL_K", 4),
+            fetch_k=env_int("RETRIEVAL_FETCH_K", 12),
+            max_tokens=env_int("RETRIEVAL_MAX_TOKENS", 1500),
+            score_threshold=env_float("RETRIEVAL_SCORE_THRESHOLD", 0.0),
+            mmr_lambda=env_float("RETRIEVAL_MMR_LAMBDA", 0.7),
+            duplicate_threshold=env_float("RETRIEVAL_DUPLICATE_THRESHOLD", 0.5),
+            reranker=make_reranker(
+                env_str("RETRIEVAL_RERANKER", "none"),
+                env_str("RETRIEVAL_CROSS_ENCODER_MODEL", ""),
+            ),
+        )
+
+        self._setup_vectorstore()
+        self._setup_lexical()
 
-        self._setup_chroma()
+    @property
+    def llm(self):
+        with self._lazy_lock:
+            if self._llm is None:
+                from langchain.llms import OpenAI
 
-    def _setup_chroma(self):
+                self._llm = OpenAI(temperature=0.7)
+            return self._llm
+
+    @property
+    def qa_chain(self):
+        if self._qa_chain is None and self._has_documents():
+            with self._lock:
+                # Cek ulang: request lain mungkin sudah membangun chain
+                if self._qa_chain is None:
+                    self._setup_qa_chain()
+        return self._qa_chain
+
+    @qa_chain.setter
+    def qa_chain(self, qa_chain):
+        self._qa_chain = qa_chain
+
+    def _setup_embeddings(self):
+        # Limiter di luar tracing: durasi embedding tidak termasuk waktu antri.
+        # Batching di luar limiter: setiap batch antri dan di-retry sendiri
+        # Retry client OpenAI dimatikan: 429 diulang limiter, error sementara
+        # diulang per batch, jadi satu batch tidak dikirim berlipat-lipat
+        embeddings = BatchedEmbeddings(
+            LimitedEmbeddings(TracedEmbeddings(OpenAIEmbeddings(max_retries=0))),
+            batch_size=env_int("EMBEDDING_BATCH_SIZE", 64),
+            max_concurrency=env_int("EMBEDDING_MAX_CONCURRENT_BATCHES", 4),
+            max_retries=env_int("EMBEDDING_BATCH_RETRIES", 2),
+        )
+        if not env_bool("EMBEDDING_CACHE", True):
+            return embeddings
+        backend = SQLiteEmbeddingCache(
+            os.path.join(self.chroma_directory, "embedding_cache.sqlite")
+        )
+        return CachedEmbeddings(
+            embeddings,
+            backend=backend,
+            lru_size=env_int("EMBEDDING_CACHE_LRU_SIZE", 2048),
+        )
+
+    def _make_vectorstore(self) -> VectorStore:
+        backend = env_str("VECTOR_STORE", "chroma").lower()
+        if backend not in VECTOR_STORES:
+            raise ValueError(f"VECTOR_STORE harus salah satu dari {VECTOR_STORES}")
+        if backend == "numpy":
+            return NumpyVectorStore(
+                self.chroma_directory,
+                self.collection_name,
+                self.embeddings,
+                hnsw=env_bool("VECTOR_STORE_HNSW", False),
+                hnsw_min_rows=env_int("VECTOR_STORE_HNSW_MIN_ROWS", 20000),
+                hnsw_ef=env_int("VECTOR_STORE_HNSW_EF", 128),
+                quantization=env_str("VECTOR_STORE_QUANTIZATION", "none"),
+                rescore_factor=env_int("VECTOR_STORE_RESCORE_FACTOR", 4),
+            )
+        return ChromaVectorStore(
+            self.chroma_directory, self.collection_name, self.embeddings
+        )
+
+    def _setup_vectorstore(self):
         try:
-            self.vectorstore = Chroma(
-                persist_directory=self.chroma_directory,
-                embedding_function=self.embeddings,
-                collection_name=self.collection_name,
+            self.vectorstore = self._make_vectorstore()
+            logger.info(
+                "Berhasil memuat vector store %s dari %s",
+                self.vectorstore.name,
+                self.chroma_directory,
             )
-            print(f"Berhasil memuat ChromaDB dari {self.chroma_directory}")
         except Exception as e:
-            print(f"Membuat ChromaDB baru: {e}")
+            logger.info("Membuat vector store baru: %s", e)
             # Buat directory jika belum ada
             os.makedirs(self.chroma_directory, exist_ok=True)
 
+    def _setup_lexical(self):
+        if not env_bool("HYBRID_SEARCH", True):
+            return
+        self.lexical = BM25Index(
+            os.path.join(self.chroma_directory, f"{self.collection_name}_bm25.sqlite")
+        )
+        if len(self.lexical) == 0 and self._has_documents():
+            # Collection lama yang dibuat sebelum ada index BM25
+            ids, documents = self.vectorstore.get_all()
+            self.lexical.add(ids, documents)
+            logger.info("Index BM25 dibangun dari %s chunks yang ada", len(documents))
+
+    def _has_documents(self) -> bool:
+        if self.vectorstore is None:
+            return False
+        try:
+            return self.vectorstore.count() > 0
+        except Exception as e:
+            logger.warning("Gagal menghitung isi collection: %s", e)
+            return False
+
+    def close(self):
+        with self._lock:
+            batched = self.embeddings
+            if isinstance(self.embeddings, CachedEmbeddings):
+                batched = self.embeddings.embeddings
+                if self.embeddings.backend:
+                    self.embeddings.backend.close()
+            if isinstance(batched, BatchedEmbeddings):
+                batched.close()
+            self.pipeline.close()
+            if self.lexical is not None:
+                self.lexical.close()
+            if self.vectorstore is not None:
+                self.vectorstore.close()
+            self.qa_chain = None
+            self.vectorstore = None
+
     def load_one_document(self, directory_path: str, file_name: str, file_type: str):
+        # Buka path file secara langsung (mmap) tanpa scan folder lewat glob
+        file_path = os.path.join(directory_path, file_name)
         documents = []
-        if file_type == "txt":
-            loader = DirectoryLoader(
-                directory_path, glob=f"{file_name}", loader_cls=TextLoader
-            )
-        elif file_type == "pdf":
-            loader = DirectoryLoader(
-                directory_path, glob=f"{file_name}", loader_cls=PyPDFLoader
-            )
-
         try:
-            document = loader.load()
+            document = list(self.pipeline.iter_pages(file_path, file_type))
             documents.extend(document)
-            print(f"Berhasil memuat {len(document)} dokumen {file_type}")
+            logger.info("Berhasil memuat %s dokumen %s", len(document), file_type)
         except Exception as e:
-            print(f"Error loading {file_type} files: {e}")
+            logger.error("Error loading %s files: %s", file_type, e)
 
         return documents
 
     def load_document(self, directory_path: str, file_types: Optional[List] = None):
+        from langchain.document_loaders import DirectoryLoader, PyPDFLoader, TextLoader
+
         if file_types is None:
             file_types = ["pdf", "txt"]
 
@@ -80,48 +231,140 @@ class RAGSystem:
             try:
                 document = loader.load()
                 documents.extend(document)
-                print(f"Berhasil memuat {len(document)} dokumen {file_type}")
+                logger.info("Berhasil memuat %s dokumen %s", len(document), file_type)
             except Exception as e:
-                print(f"Error loading {file_type} files: {e}")
+                logger.error("Error loading %s files: %s", file_type, e)
 
         return documents
 
+    def _file_hash(self, source: str, documents: List[Document]) -> str:
+        if os.path.isfile(source):
+            return hash_file(source)
+        return hash_text("".join(document.page_content for document in documents))
+
+    def _split_with_ids(self, source: str, documents: List[Document]):
+        chunks = []
+        chunk_ids = []
+        for chunk in self.text_splitter.split_documents(documents):
+            chunk_id = make_chunk_id(source, hash_text(chunk.page_content))
+            # Chunk duplikat di file yang sama cukup disimpan sekali
+            if chunk_id in chunk_ids:
+                continue
+            chunks.append(chunk)
+            chunk_ids.append(chunk_id)
+        return chunks, chunk_ids
+
+    def ingest_files(
+        self,
+        file_paths: List[str],
+        on_page=None,
+        file_type: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        file_hashes: Optional[Dict[str, str]] = None,
+    ):
+        """Parsing dan index file lewat pipeline paralel/streaming."""
+        return self.pipeline.ingest(
+            file_paths,
+            on_page=on_page,
+            file_type=file_type,
+            metadata=metadata,
+            file_hashes=file_hashes,
+        )
+
     def add_document(self, documents: List[Document]):
+        # Satu instance dipakai bersama oleh banyak request, tulis secara berurutan
+        with self._lock:
+            self._add_document(documents)
+
+    def _add_document(self, documents: List[Document]):
         if not documents:
-            print("Tidak ada document yang akan ditambahkan")
+            logger.info("Tidak ada document yang akan ditambahkan")
             return
 
-        texts = self.text_splitter.split_documents(documents)
-        print(f"Dokumen dipecah menjadi {len(texts)} chunks")
+        documents_by_source = {}
+        for document in documents:
+            source = document.metadata.get("source", "unknown")
+            documents_by_source.setdefault(source, []).append(document)
+
+        total_added = 0
+        total_removed = 0
+        for source, source_documents in documents_by_source.items():
+            file_hash = self._file_hash(source, source_documents)
+            if self.manifest.is_unchanged(source, file_hash):
+                logger.info("Dokumen %s tidak berubah, dilewati", source)
+                continue
+
+            chunks, chunk_ids = self._split_with_ids(source, source_documents)
+            previous_ids = set(self.manifest.get_chunk_ids(source))
+            new_chunks = [
+                (chunk_id, chunk)
+                for chunk_id, chunk in zip(chunk_ids, chunks)
+                if chunk_id not in previous_ids
+            ]
+            stale_ids = list(previous_ids - set(chunk_ids))
 
+            if new_chunks:
+                self._upsert_chunks(
+                    [chunk for _, chunk in new_chunks],
+                    [chunk_id for chunk_id, _ in new_chunks],
+                )
+            if stale_ids:
+                self._delete_chunks(stale_ids)
+
+            self.manifest.update_file(source, file_hash, chunk_ids)
+            total_added += len(new_chunks)
+            total_removed += len(stale_ids)
+            logger.info(
+                "Dokumen %s: %s chunks, %s baru, %s dihapus",
+                source,
+                len(chunks),
+                len(new_chunks),
+                len(stale_ids),
+            )
+
+        self.manifest.save()
+        if self.vectorstore is not None:
+            self.vectorstore.persist()
+        logger.info(
+            "Berhasil menambahkan %s chunks dan menghapus %s chunks lama di vector store",
+            total_added,
+            total_removed,
+        )
+
+    def _upsert_chunks(self, chunks: List[Document], chunk_ids: List[str]):
         if self.vectorstore is None:
             # Buat vector store baru
-            self.vectorstore = Chroma.from_documents(
-                documents=texts,
-                embedding=self.embeddings,
-                persist_directory=self.chroma_directory,
-                collection_name=self.collection_name,
-            )
-        else:
-            # Tambahkan ke vector store yang sudah ada
-            self.vectorstore.add_documents(texts)
+            self.vectorstore = self._make_vectorstore()
+        self.vectorstore.upsert(chunks, chunk_ids)
+        if self.lexical is not None:
+            self.lexical.add(chunk_ids, chunks)
+
+    def _delete_chunks(self, chunk_ids: List[str]):
+        if self.vectorstore is not None:
+            self.vectorstore.delete(ids=chunk_ids)
+        if self.lexical is not None:
+            self.lexical.delete(chunk_ids)
 
-        self.vectorstore.persist()
-        print(f"Berhasil menambahkan {len(texts)} chunks ke vector store")
+    def remove_document(self, source: str):
+        with self._lock:
+            stale_ids = self.manifest.remove_file(source)
+            if stale_ids:
+                self._delete_chunks(stale_ids)
+            self.manifest.save()
+        logger.info("Berhasil menghapus %s chunks dari %s", len(stale_ids), source)
 
-        # Update QA chain
-        self._setup_qa_chain()
+    def corpus_version(self) -> str:
+        return self.manifest.version()
 
     def _setup_qa_chain(self):
+        from langchain.chains import RetrievalQA
+
         if self.vectorstore is None:
-            print("Vector store belum diinisialisasi")
+            logger.warning("Vector store belum diinisialisasi")
             return
 
-        # Buat retriever
-        retriever = self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 4},  # Ambil 4 dokumen paling relevan
-        )
+        # Retriever memakai pipeline retrieval (cutoff, MMR, re-rank, budget token)
+        retriever = PipelineRetriever(pipeline=self.retrieval)
 
         # Buat QA chain
         self.qa_chain = RetrievalQA.from_chain_type(
@@ -132,26 +375,231 @@ class RAGSystem:
             verbose=True,
         )
 
-        print("QA chain berhasil disetup")
+        logger.info("QA chain berhasil disetup")
 
-    def query(self, question: str):
-        if self.qa_chain is None:
+    def query(self, question: str, filter: Optional[Dict[str, str]] = None):
+        qa_chain = self.qa_chain
+        if qa_chain is None:
             return False
+        if filter:
+            # Salinan chain dengan retriever yang hanya melihat subset dokumen
+            qa_chain = qa_chain.model_copy(
+                update={
+                    "retriever": PipelineRetriever(
+                        pipeline=self.retrieval, filter=filter
+                    )
+                }
+            )
 
         try:
-            result = self.qa_chain({"query": question})
+            result = qa_chain({"query": question})
             return {
                 "answer": result["result"],
                 "source_documents": result["source_documents"],
             }
         except Exception as e:
-            print(f"error saat query ke dokumen: {e}")
+            logger.error("error saat query ke dokumen: %s", e)
             return False
 
-    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, str]] = None
+    ) -> List[Document]:
         if self.vectorstore is None:
             return []
-        return self.vectorstore.similarity_search(query, k=k)
+        vector = self.embeddings.embed_query(query)
+        with telemetry.timed_search(self.vectorstore.name):
+            results = self.vectorstore.search(vector, k=k, filter=filter)
+        return [document for document, _ in results]
+
+    def retrieve(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        fetch_k: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        filter: Optional[Dict[str, str]] = None,
+    ) -> List[Document]:
+        """Ambil chunk relevan tanpa memanggil LLM lewat pipeline retrieval.
+        Skor relevansi disimpan di metadata. filter membatasi pencarian ke
+        chunk dengan metadata yang sama (misalnya tenant_id atau source)."""
+        return self.retrieval.run(
+            query, k=k, fetch_k=fetch_k, max_tokens=max_tokens, filter=filter
+        )
+
+    def chunk_vectors(self, documents: List[Document]) -> np.ndarray:
+        """Embedding chunk dari vector store (tanpa memanggil API embedding).
+        Chunk yang vectornya tidak tersimpan (misalnya ID format lama) baru
+        di-embed ulang."""
+        ids = [
+            make_chunk_id(
+                document.metadata.get("source", "unknown"),
+                hash_text(document.page_content),
+            )
+            for document in documents
+        ]
+        stored = self.vectorstore.get_vectors(ids) if self.vectorstore else {}
+        missing = [
+            index for index, chunk_id in enumerate(ids) if chunk_id not in stored
+        ]
+        if missing:
+            embedded = self.embeddings.embed_documents(
+                [documents[index].page_content for index in missing]
+            )
+            stored.update(
+                (ids[index], np.asarray(vector, dtype=np.float32))
+                for index, vector in zip(missing, embedded)
+            )
+        return np.asarray([stored[chunk_id] for chunk_id in ids], dtype=np.float32)
+
+    def _vector_search(
+        self, query: str, k: int, filter: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[Document, float]]:
+        if self.vectorstore is None:
+            return []
+        # Embedding dihitung terpisah agar durasi query vector store terukur sendiri
+        vector = self.embeddings.embed_query(query)
+        with telemetry.timed_search(self.vectorstore.name):
+            results = self.vectorstore.search(vector, k=k, filter=filter)
+        # Skor adalah jarak, semakin kecil semakin relevan
+        results.sort(key=lambda item: item[1])
+        return results
+
+    def _lexical_search(
+        self, query: str, k: int, filter: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[Document, float]]:
+        if self.lexical is None:
+            return []
+        with telemetry.timed_search("bm25"):
+            hits = self.lexical.search(query, k=k, filter=filter)
+        documents = self.lexical.get_documents([chunk_id for chunk_id, _ in hits])
+        return [
+            (documents[chunk_id], score)
+            for chunk_id, score in hits
+            if chunk_id in documents
+        ]
+
+    def keyword_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[Document, float]]:
+        """Hasil BM25 saja untuk query kata kunci (lihat is_keyword_query),
+        tanpa panggilan embedding. Kosong jika query bukan kata kunci atau
+        BM25 tidak menemukan apa pun."""
+        if self.lexical is None or not is_keyword_query(query):
+            return []
+        return self._lexical_search(query, k, filter)
+
+    def hybrid_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[Document, float]]:
+        """Gabungkan hasil BM25 dan vector dengan reciprocal rank fusion.
+
+        Query kata kunci yang ditemukan BM25 dijawab dari BM25 saja tanpa
+        embedding. Query lain selalu memakai pencarian vector; kutipan atau
+        token seperti kode menaikkan bobot BM25. Skor: semakin besar semakin
+        relevan.
+        """
+        keyword_results = self.keyword_search(query, k, filter)
+        if keyword_results:
+            return keyword_results
+        lexical_results = self._lexical_search(query, k, filter)
+        vector_results = self._vector_search(query, k, filter)
+        if not lexical_results:
+            return [(document, -distance) for document, distance in vector_results]
+
+        documents = {}
+        rankings = []
+        for results in (lexical_results, vector_results):
+            ranking = []
+            for document, _ in results:
+                key = make_chunk_id(
+                    document.metadata.get("source", "unknown"),
+                    hash_text(document.page_content),
+                )
+                documents.setdefault(key, document)
+                ranking.append(key)
+            rankings.append(ranking)
+        return [
+            (documents[key], score)
+            for key, score in reciprocal_rank_fusion(
+                rankings, weights=[lexical_weight(query), 1.0]
+            )[:k]
+        ]
+
+
+# Urutan LRU. Instance yang di-pin (collection utama) tidak pernah dibuang,
+# collection per tenant dibuang (dan ditutup) jika jumlahnya melebihi batas
+_registry: "OrderedDict[Tuple[str, str], RAGSystem]" = OrderedDict()
+_pinned: Set[Tuple[str, str]] = set()
+_leases: Dict[Tuple[str, str], int] = {}
+_registry_lock = threading.Lock()
+max_rag_systems = env_int("RAG_MAX_SYSTEMS", 32)
+
+
+def _acquire(chroma_directory: str, collection_name: str, pin: bool):
+    key = (os.path.abspath(chroma_directory), collection_name)
+    with _registry_lock:
+        rag = _registry.get(key)
+        if rag is None:
+            rag = RAGSystem(chroma_directory, collection_name)
+            _registry[key] = rag
+        _registry.move_to_end(key)
+        if pin:
+            _pinned.add(key)
+        else:
+            _leases[key] = _leases.get(key, 0) + 1
+        evicted = _evict()
+    _close_evicted(evicted)
+    return key, rag
+
+
+def _evict() -> List[RAGSystem]:
+    # Dipanggil dengan _registry_lock; instance yang sedang dipakai dilewati
+    evicted = []
+    for key in list(_registry):
+        if len(_registry) <= max_rag_systems:
+            break
+        if key in _pinned or _leases.get(key):
+            continue
+        evicted.append(_registry.pop(key))
+    return evicted
+
+
+def _close_evicted(evicted: List[RAGSystem]):
+    for rag in evicted:
+        logger.info("Menutup RAGSystem %s (LRU)", rag.collection_name)
+        rag.close()
+
+
+def get_rag_system(chroma_directory: str, collection_name: str) -> RAGSystem:
+    """Ambil RAGSystem bersama untuk satu (path, collection) di proses ini.
+    Instance ini di-pin: tetap terbuka sampai close_rag_systems()."""
+    return _acquire(chroma_directory, collection_name, pin=True)[1]
+
+
+@contextmanager
+def use_rag_system(chroma_directory: str, collection_name: str):
+    """Pinjam RAGSystem selama blok with, misalnya collection milik tenant.
+    Di luar blok instance boleh dibuang oleh LRU (RAG_MAX_SYSTEMS)."""
+    key, rag = _acquire(chroma_directory, collection_name, pin=False)
+    try:
+        yield rag
+    finally:
+        with _registry_lock:
+            _leases[key] -= 1
+            if not _leases[key]:
+                del _leases[key]
+            evicted = _evict()
+        _close_evicted(evicted)
+
+
+def close_rag_systems():
+    with _registry_lock:
+        systems = list(_registry.values())
+        _registry.clear()
+        _pinned.clear()
+        _leases.clear()
+    for rag in systems:
+        rag.close()
 
 
 if __name__ == "__main__":
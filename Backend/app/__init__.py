@@ -1,11 +1,24 @@
-from typing import Any, Dict
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
 
-from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
-
-from app.workflow import Workflow
+logger = logging.getLogger(__name__)
 
 
 class Agent:
+    """Agent dengan inisialisasi lazy.
+
+    Workflow (client LLM, Chroma, embeddings, memory) beserta import
+    langchain/chromadb yang berat baru dibuat saat pertama kali dipakai atau
+    saat warmup(), sehingga import modul ini tetap cepat.
+
+    Satu instance dipakai bersama oleh semua request: state percakapan hanya
+    ada di checkpointer per thread_id dan di hasil yang dikembalikan, tidak
+    pernah disimpan di atribut Agent.
+    """
+
     def __init__(
         self,
         directory_path: str,
@@ -13,26 +26,108 @@ class Agent:
         collection_name: str,
         include_memory=False,
     ):
-        self.workflow = Workflow(
-            directory_path=directory_path,
-            chromadb_path=chromadb_path,
-            collection_name=collection_name,
-            include_memory=include_memory,
+        self.directory_path = directory_path
+        self.chromadb_path = chromadb_path
+        self.collection_name = collection_name
+        self.include_memory = include_memory
+        self._workflow = None
+        self._workflow_lock = threading.Lock()
+
+    @property
+    def workflow(self):
+        with self._workflow_lock:
+            if self._workflow is None:
+                from app.workflow import Workflow
+
+                self._workflow = Workflow(
+                    directory_path=self.directory_path,
+                    chromadb_path=self.chromadb_path,
+                    collection_name=self.collection_name,
+                    include_memory=self.include_memory,
+                )
+            return self._workflow
+
+    @property
+    def initialized(self) -> bool:
+        return self._workflow is not None
+
+    async def aworkflow(self):
+        if self._workflow is not None:
+            return self._workflow
+        # Pembuatan pertama blocking (import + client), jangan tahan event loop
+        return await asyncio.to_thread(lambda: self.workflow)
+
+    def warmup(self) -> float:
+        started = time.perf_counter()
+        from app.tokens import count_tokens
+
+        workflow = self.workflow
+        workflow.rag._has_documents()
+        count_tokens("warmup")
+        elapsed = time.perf_counter() - started
+        logger.info("Warmup agent selesai dalam %.2f detik", elapsed)
+        return elapsed
+
+    def execute(
+        self,
+        state: Dict,
+        thread_id,
+        user_id: Optional[str] = None,
+        document_name: Optional[str] = None,
+    ):
+        return self.workflow.run(
+            state=state,
+            thread_id=thread_id,
+            user_id=user_id,
+            document_name=document_name,
+        )
+
+    async def aexecute(
+        self,
+        state: Dict,
+        thread_id,
+        user_id: Optional[str] = None,
+        document_name: Optional[str] = None,
+    ):
+        workflow = await self.aworkflow()
+        return await workflow.arun(
+            state=state,
+            thread_id=thread_id,
+            user_id=user_id,
+            document_name=document_name,
         )
-        self._history_messages = None
 
-    def execute(self, state: Dict, thread_id):
-        result = self.workflow.run(state=state, thread_id=thread_id)
-        self._history_messages = result["messages"]
-        return result
+    async def astream(
+        self,
+        state: Dict,
+        thread_id,
+        user_id: Optional[str] = None,
+        document_name: Optional[str] = None,
+    ):
+        workflow = await self.aworkflow()
+        async for event in workflow.astream(
+            state=state,
+            thread_id=thread_id,
+            user_id=user_id,
+            document_name=document_name,
+        ):
+            yield event
+
+    def close(self):
+        if self._workflow is not None:
+            self._workflow.close()
+
+    @staticmethod
+    def pretty_print(history_messages):
+        """Cetak messages dari hasil execute(); history tidak disimpan di Agent
+        karena instance dipakai bersama oleh banyak request."""
+        from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 
-    def pretty_print(self):
-        if self._history_messages is None:
+        if not history_messages:
             print("No messages found.")
             return
         messages = ""
-        print(self._history_messages)
-        for message in self._history_messages:
+        for message in history_messages:
             if isinstance(message, HumanMessage):
                 msg = f"=========Human=========\n{message.content}\n\n"
             elif isinstance(message, AIMessage):
@@ -56,7 +151,8 @@ if __name__ == "__main__":
         if user_input == "exit":
             print("bye bye")
             break
-        agent.execute(
+        result = agent.execute(
             {"user_message": user_input},
             "thread_123",
         )
+        agent.pretty_print(result["messages"])
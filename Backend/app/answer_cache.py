@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Cache jawaban berdasarkan kemiripan embedding pertanyaan.
+
+    Setiap entri terikat ke versi corpus (hash manifest collection), sehingga
+    cache otomatis tidak berlaku lagi ketika dokumen di collection berubah.
+    Entri kedaluwarsa setelah ttl_seconds dan yang paling lama tidak dipakai
+    dibuang ketika jumlahnya melebihi max_entries.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        threshold: float = 0.95,
+        ttl_seconds: int = 86400,
+        max_entries: int = 1000,
+    ):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers (id TEXT PRIMARY KEY, corpus_version TEXT NOT NULL, question TEXT NOT NULL, vector BLOB NOT NULL, answer TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._version: Optional[str] = None
+        self._ids: List[str] = []
+        self._answers: List[str] = []
+        self._created: List[float] = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def _load_version(self, corpus_version: str):
+        if self._version == corpus_version:
+            return
+        # Versi corpus berubah: entri dari versi lama tidak berlaku lagi
+        self._conn.execute(
+            "DELETE FROM answers WHERE corpus_version != ?", (corpus_version,)
+        )
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT id, vector, answer, created_at FROM answers WHERE corpus_version = ?",
+            (corpus_version,),
+        ).fetchall()
+        self._version = corpus_version
+        self._ids = [row[0] for row in rows]
+        self._answers = [row[2] for row in rows]
+        self._created = [row[3] for row in rows]
+        vectors = [np.frombuffer(row[1], dtype=np.float32) for row in rows]
+        self._matrix = (
+            np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        )
+
+    def _remove(self, indexes: List[int]):
+        if not indexes:
+            return
+        ids = [self._ids[index] for index in indexes]
+        self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in ids])
+        self._conn.commit()
+        keep = [index for index in range(len(self._ids)) if index not in set(indexes)]
+        self._ids = [self._ids[index] for index in keep]
+        self._answers = [self._answers[index] for index in keep]
+        self._created = [self._created[index] for index in keep]
+        self._matrix = (
+            self._matrix[keep] if keep else np.zeros((0, 0), dtype=np.float32)
+        )
+
+    def is_empty(self, corpus_version: str) -> bool:
+        with self._lock:
+            self._load_version(corpus_version)
+            return not self._ids
+
+    def lookup(self, vector, corpus_version: str) -> Optional[str]:
+        with self._lock:
+            self._load_version(corpus_version)
+            if not self._ids:
+                self.misses += 1
+                return None
+            now = time.time()
+            if self.ttl_seconds > 0:
+                self._remove(
+                    [
+                        index
+                        for index, created in enumerate(self._created)
+                        if now - created > self.ttl_seconds
+                    ]
+                )
+                if not self._ids:
+                    self.misses += 1
+                    return None
+            similarities = self._matrix @ self._normalize(vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE answers SET last_used = ? WHERE id = ?", (now, self._ids[best])
+            )
+            self._conn.commit()
+            self.hits += 1
+            return self._answers[best]
+
+    def store(self, question: str, vector, answer: str, corpus_version: str):
+        normalized = self._normalize(vector)
+        now = time.time()
+        entry_id = uuid.uuid4().hex
+        with self._lock:
+            self._load_version(corpus_version)
+            self._conn.execute(
+                "INSERT INTO answers (id, corpus_version, question, vector, answer, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry_id,
+                    corpus_version,
+                    question,
+                    normalized.tobytes(),
+                    answer,
+                    now,
+                    now,
+                ),
+            )
+            self._conn.commit()
+            self._ids.append(entry_id)
+            self._answers.append(answer)
+            self._created.append(now)
+            self._matrix = (
+                np.vstack([self._matrix, normalized])
+                if self._matrix.size
+                else normalized.reshape(1, -1)
+            )
+            if len(self._ids) > self.max_entries:
+                # Buang entri yang paling lama tidak dipakai (LRU)
+                rows = self._conn.execute(
+                    "SELECT id FROM answers WHERE corpus_version = ? ORDER BY last_used ASC LIMIT ?",
+                    (corpus_version, len(self._ids) - self.max_entries),
+                ).fetchall()
+                stale = {row[0] for row in rows}
+                self._remove([index for index, i in enumerate(self._ids) if i in stale])
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._ids)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
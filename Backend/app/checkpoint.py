@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.config import env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+
+# Selang waktu minimal antar pembersihan thread kedaluwarsa di SQLite
+SQLITE_PRUNE_INTERVAL_SECONDS = 60
+
+
+class BoundedMemorySaver(MemorySaver):
+    """MemorySaver dengan batas jumlah thread (LRU), TTL per thread, dan
+    hanya menyimpan beberapa checkpoint terakhir per thread.
+
+    Thread dibuang lewat delete_thread (API publik). Pemangkasan checkpoint
+    lama per thread menyentuh storage/writes/blobs milik MemorySaver
+    (langgraph-checkpoint 2.x, versinya di-pin di pyproject); jika struktur
+    itu berubah, pemangkasan per thread dimatikan dengan warning.
+    """
+
+    def __init__(
+        self,
+        max_threads: int = 1000,
+        ttl_seconds: int = 3600,
+        max_checkpoints_per_thread: int = 3,
+    ):
+        super().__init__()
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.max_checkpoints_per_thread = max(2, max_checkpoints_per_thread)
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        self._channel_versions: Dict[Tuple[str, str, str], Dict] = {}
+        self._lock = threading.RLock()
+        self._can_prune = all(
+            isinstance(getattr(self, name, None), dict)
+            for name in ("storage", "writes", "blobs")
+        )
+        if not self._can_prune:
+            logger.warning(
+                "Struktur internal MemorySaver berubah, checkpoint lama per "
+                "thread tidak dipangkas (batas thread dan TTL tetap berlaku)"
+            )
+
+    def _touch(self, thread_id: str):
+        self._last_used[thread_id] = time.monotonic()
+        self._last_used.move_to_end(thread_id)
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [
+            thread_id
+            for thread_id, last_used in self._last_used.items()
+            if self.ttl_seconds > 0 and now - last_used > self.ttl_seconds
+        ]
+        for thread_id in expired:
+            self._delete_thread(thread_id)
+        while len(self._last_used) > self.max_threads:
+            thread_id = next(iter(self._last_used))
+            self._delete_thread(thread_id)
+
+    def _delete_thread(self, thread_id: str):
+        super().delete_thread(thread_id)
+        self._last_used.pop(thread_id, None)
+        for key in [key for key in self._channel_versions if key[0] == thread_id]:
+            del self._channel_versions[key]
+
+    def _prune_checkpoints(self, thread_id: str, checkpoint_ns: str):
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        stale_ids = list(checkpoints)[: -self.max_checkpoints_per_thread]
+        if not stale_ids:
+            return
+        for checkpoint_id in stale_ids:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._channel_versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        # Blob channel yang tidak lagi direferensikan checkpoint tersisa ikut dihapus
+        referenced = set()
+        for checkpoint_id in checkpoints:
+            versions = self._channel_versions.get(
+                (thread_id, checkpoint_ns, checkpoint_id), {}
+            )
+            referenced.update(versions.items())
+        for key in list(self.blobs.keys()):
+            if (
+                key[0] == thread_id
+                and key[1] == checkpoint_ns
+                and (key[2], key[3]) not in referenced
+            ):
+                del self.blobs[key]
+
+    def get_tuple(self, config):
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            self._evict()
+            result = super().get_tuple(config)
+            if result is not None:
+                self._touch(thread_id)
+            return result
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        with self._lock:
+            items = list(
+                super().list(config, filter=filter, before=before, limit=limit)
+            )
+        yield from items
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            self._channel_versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(
+                checkpoint["channel_versions"]
+            )
+            if self._can_prune:
+                self._prune_checkpoints(thread_id, checkpoint_ns)
+            self._touch(thread_id)
+            self._evict()
+            return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            return super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str):
+        with self._lock:
+            self._delete_thread(thread_id)
+
+    def thread_count(self) -> int:
+        with self._lock:
+            return len(self._last_used)
+
+
+def _sqlite_saver(
+    db_path: str,
+    max_threads: int = 0,
+    ttl_seconds: int = 0,
+    max_checkpoints_per_thread: int = 3,
+):
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError as e:
+        raise ImportError(
+            "CHECKPOINTER=sqlite membutuhkan package langgraph-checkpoint-sqlite, "
+            "install dengan `uv sync --extra sqlite` (atau pip install 'backend[sqlite]')"
+        ) from e
+
+    class ThreadedSqliteSaver(SqliteSaver):
+        """SqliteSaver yang memangkas checkpoint lama per thread dan membuang
+        thread yang tidak aktif melebihi ttl_seconds atau di luar max_threads
+        thread terakhir (0 = tanpa batas). Aktivitas thread dicatat di tabel
+        thread_activity pada database yang sama."""
+
+        def __init__(self, conn: sqlite3.Connection):
+            super().__init__(conn)
+            self.max_threads = max_threads
+            self.ttl_seconds = ttl_seconds
+            self.max_checkpoints_per_thread = max(2, max_checkpoints_per_thread)
+            self._last_prune = 0.0
+            with self.lock:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+                )
+                conn.commit()
+
+        def put(self, config, checkpoint, metadata, new_versions):
+            result = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = str(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+            with self.lock:
+                # checkpoint_id berurutan waktu (uuid6), sisakan yang terbaru
+                stale = self.conn.execute(
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                    (thread_id, checkpoint_ns, self.max_checkpoints_per_thread),
+                ).fetchall()
+                for table in ("checkpoints", "writes"):
+                    self.conn.executemany(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                        [(thread_id, checkpoint_ns, row[0]) for row in stale],
+                    )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+                    (thread_id, time.time()),
+                )
+                self.conn.commit()
+            self._prune_threads()
+            return result
+
+        def _prune_threads(self):
+            now = time.time()
+            if now - self._last_prune < SQLITE_PRUNE_INTERVAL_SECONDS:
+                return
+            self._last_prune = now
+            stale = []
+            with self.lock:
+                if self.ttl_seconds > 0:
+                    stale += self.conn.execute(
+                        "SELECT thread_id FROM thread_activity WHERE updated_at < ?",
+                        (now - self.ttl_seconds,),
+                    ).fetchall()
+                if self.max_threads > 0:
+                    stale += self.conn.execute(
+                        "SELECT thread_id FROM thread_activity ORDER BY updated_at DESC LIMIT -1 OFFSET ?",
+                        (self.max_threads,),
+                    ).fetchall()
+            for thread_id in {row[0] for row in stale}:
+                self.delete_thread(thread_id)
+            if stale:
+                logger.info("%s thread checkpoint SQLite dihapus", len(stale))
+
+        def delete_thread(self, thread_id):
+            super().delete_thread(thread_id)
+            with self.lock:
+                self.conn.execute(
+                    "DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),)
+                )
+                self.conn.commit()
+
+        # SqliteSaver hanya sync, versi async dijalankan di thread lain
+        async def aget_tuple(self, config):
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config, *, filter=None, before=None, limit=None):
+            items = await asyncio.to_thread(
+                lambda: list(
+                    self.list(config, filter=filter, before=before, limit=limit)
+                )
+            )
+            for item in items:
+                yield item
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            return await asyncio.to_thread(
+                self.put, config, checkpoint, metadata, new_versions
+            )
+
+        async def aput_writes(self, config, writes, task_id, task_path=""):
+            return await asyncio.to_thread(
+                self.put_writes, config, writes, task_id, task_path
+            )
+
+        async def adelete_thread(self, thread_id):
+            return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    return ThreadedSqliteSaver(conn)
+
+
+def make_checkpointer():
+    backend = env_str("CHECKPOINTER", "memory").lower()
+    if backend == "sqlite":
+        db_path = env_str("CHECKPOINT_DB_PATH", "data/checkpoints.sqlite")
+        logger.info("Menggunakan checkpointer SQLite di %s", db_path)
+        return _sqlite_saver(
+            db_path,
+            max_threads=env_int("CHECKPOINT_SQLITE_MAX_THREADS", 100000),
+            ttl_seconds=env_int("CHECKPOINT_SQLITE_TTL_SECONDS", 7 * 86400),
+            max_checkpoints_per_thread=env_int("CHECKPOINT_MAX_PER_THREAD", 3),
+        )
+    return BoundedMemorySaver(
+        max_threads=env_int("CHECKPOINT_MAX_THREADS", 1000),
+        ttl_seconds=env_int("CHECKPOINT_TTL_SECONDS", 3600),
+        max_checkpoints_per_thread=env_int("CHECKPOINT_MAX_PER_THREAD", 3),
+    )
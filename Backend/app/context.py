@@ -0,0 +1,176 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Set, Tuple
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+from app.telemetry import telemetry
+from app.tokens import count_message_tokens, message_text, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_CONFIG = {"tags": ["nostream"], "run_name": "summarize_history"}
+
+
+class ContextAssembler:
+    """Menyusun history percakapan untuk prompt agar tidak melewati budget token.
+
+    Giliran terbaru dipertahankan utuh, hasil tool lama dipangkas, dan giliran
+    yang lebih tua dilipat ke dalam ringkasan berjalan yang di-cache per thread.
+    """
+
+    def __init__(
+        self,
+        llm,
+        prompts,
+        max_tokens: int = 3000,
+        tool_message_tokens: int = 200,
+        max_threads: int = 1000,
+        model: str = "gpt-4o",
+    ):
+        self.llm = llm
+        self.prompts = prompts
+        self.max_tokens = max_tokens
+        self.tool_message_tokens = tool_message_tokens
+        self.max_threads = max_threads
+        self.model = model
+        # thread_id -> (ringkasan, id pesan yang sudah masuk ringkasan)
+        self._summaries: "OrderedDict[str, Tuple[str, Set[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _compress_tool_messages(
+        self, messages: Sequence[BaseMessage]
+    ) -> List[BaseMessage]:
+        last_turn = _last_turn_start(messages)
+        compressed = []
+        for index, message in enumerate(messages):
+            if isinstance(message, ToolMessage) and index < last_turn:
+                content = truncate_tokens(
+                    message_text(message), self.tool_message_tokens, self.model
+                )
+                if content != message.content:
+                    message = message.model_copy(
+                        update={"content": content + "\n[hasil tool dipangkas]"}
+                    )
+            compressed.append(message)
+        return compressed
+
+    def _split(self, messages: List[BaseMessage]):
+        """Cari titik potong di awal giliran user sehingga sisa pesan muat di budget."""
+        total = 0
+        cut = len(messages)
+        for index in range(len(messages) - 1, -1, -1):
+            total += count_message_tokens([messages[index]], self.model)
+            if total > self.max_tokens:
+                break
+            if isinstance(messages[index], HumanMessage):
+                cut = index
+        if cut == len(messages):
+            # Giliran terakhir saja sudah melebihi budget, tetap kirim giliran itu
+            cut = _last_turn_start(messages)
+        return messages[:cut], messages[cut:]
+
+    def _pending_summary(self, thread_id: str, older: List[BaseMessage]):
+        with self._lock:
+            summary, covered = self._summaries.get(thread_id, ("", set()))
+            if thread_id in self._summaries:
+                self._summaries.move_to_end(thread_id)
+        new_messages = [
+            message
+            for message in older
+            if message.id is None or message.id not in covered
+        ]
+        return summary, covered, new_messages
+
+    def _store_summary(
+        self, thread_id: str, summary: str, covered: Set[str], new_messages
+    ):
+        covered = covered | {message.id for message in new_messages if message.id}
+        with self._lock:
+            self._summaries[thread_id] = (summary, covered)
+            self._summaries.move_to_end(thread_id)
+            while len(self._summaries) > self.max_threads:
+                self._summaries.popitem(last=False)
+
+    def _summary_prompt(self, summary: str, new_messages: List[BaseMessage]):
+        conversation = "\n".join(
+            f"{_role(message)}: {message_text(message)}"
+            for message in new_messages
+            if not isinstance(message, SystemMessage)
+        )
+        return self.prompts.summarize_history(summary, conversation)
+
+    def _with_summary(self, summary: str, recent: List[BaseMessage]):
+        if not summary:
+            return recent
+        return [
+            SystemMessage(content=f"Ringkasan percakapan sebelumnya:\n{summary}")
+        ] + recent
+
+    def assemble(
+        self, messages: Sequence[BaseMessage], thread_id: Optional[str] = None
+    ) -> List[BaseMessage]:
+        messages = self._compress_tool_messages(messages)
+        if count_message_tokens(messages, self.model) <= self.max_tokens:
+            return messages
+        older, recent = self._split(messages)
+        if not thread_id:
+            return recent
+        summary, covered, new_messages = self._pending_summary(thread_id, older)
+        if new_messages:
+            try:
+                response = self.llm.invoke(
+                    self._summary_prompt(summary, new_messages), config=SUMMARY_CONFIG
+                )
+                telemetry.record_llm(getattr(self.llm, "model_name", None), response)
+                summary = response.content
+                self._store_summary(thread_id, summary, covered, new_messages)
+            except Exception as e:
+                logger.warning("Gagal meringkas history, pesan lama dibuang: %s", e)
+        return self._with_summary(summary, recent)
+
+    async def aassemble(
+        self, messages: Sequence[BaseMessage], thread_id: Optional[str] = None
+    ) -> List[BaseMessage]:
+        messages = self._compress_tool_messages(messages)
+        if count_message_tokens(messages, self.model) <= self.max_tokens:
+            return messages
+        older, recent = self._split(messages)
+        if not thread_id:
+            return recent
+        summary, covered, new_messages = self._pending_summary(thread_id, older)
+        if new_messages:
+            try:
+                response = await self.llm.ainvoke(
+                    self._summary_prompt(summary, new_messages), config=SUMMARY_CONFIG
+                )
+                telemetry.record_llm(getattr(self.llm, "model_name", None), response)
+                summary = response.content
+                self._store_summary(thread_id, summary, covered, new_messages)
+            except Exception as e:
+                logger.warning("Gagal meringkas history, pesan lama dibuang: %s", e)
+        return self._with_summary(summary, recent)
+
+
+def _last_turn_start(messages: Sequence[BaseMessage]) -> int:
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return index
+    return 0
+
+
+def _role(message: BaseMessage) -> str:
+    if isinstance(message, HumanMessage):
+        return "user"
+    if isinstance(message, AIMessage):
+        return "assistant"
+    if isinstance(message, ToolMessage):
+        return "tool"
+    return message.type
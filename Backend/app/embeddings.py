@@ -0,0 +1,360 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.limits import is_transient_error
+from app.telemetry import Telemetry, telemetry
+
+logger = logging.getLogger(__name__)
+
+
+def _pack_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack_vector(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCacheBackend:
+    """Interface penyimpanan embedding persisten, dipakai oleh CachedEmbeddings."""
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        raise NotImplementedError
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteEmbeddingCache(EmbeddingCacheBackend):
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        # Batasi jumlah parameter per query agar aman untuk SQLite
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+            for key, blob in rows:
+                found[key] = _unpack_vector(blob)
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, _pack_vector(vector)) for key, vector in items.items()],
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embedding dengan cache dua tingkat: LRU di memori lalu backend di disk.
+
+    Hanya teks yang belum pernah di-embed yang dikirim ke model, dalam satu batch.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        backend: Optional[EmbeddingCacheBackend] = None,
+        model_name: Optional[str] = None,
+        lru_size: int = 2048,
+    ):
+        self.embeddings = embeddings
+        self.backend = backend
+        self.model_name = model_name or getattr(embeddings, "model", None) or "default"
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(
+            f"{self.model_name}\x00{text}".encode("utf-8")
+        ).hexdigest()
+
+    def _lru_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+            return vector
+
+    def _lru_set(self, key: str, vector: List[float]):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors: Dict[str, List[float]] = {}
+
+        missing = []
+        hits = 0
+        for key in keys:
+            if key in vectors or key in missing:
+                continue
+            vector = self._lru_get(key)
+            if vector is None:
+                missing.append(key)
+            else:
+                vectors[key] = vector
+                hits += 1
+        self.memory_hits += hits
+
+        if missing and self.backend is not None:
+            from_disk = self.backend.get_many(missing)
+            for key, vector in from_disk.items():
+                vectors[key] = vector
+                self._lru_set(key, vector)
+            self.disk_hits += len(from_disk)
+            hits += len(from_disk)
+            missing = [key for key in missing if key not in from_disk]
+
+        if missing:
+            text_by_key = dict(zip(keys, texts))
+            new_vectors = self.embeddings.embed_documents(
+                [text_by_key[key] for key in missing]
+            )
+            fresh = dict(zip(missing, new_vectors))
+            for key, vector in fresh.items():
+                vectors[key] = vector
+                self._lru_set(key, vector)
+            if self.backend is not None:
+                self.backend.set_many(fresh)
+            self.misses += len(missing)
+
+        telemetry.record_cache("embedding", True, hits)
+        telemetry.record_cache("embedding", False, len(missing))
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+
+class TracedEmbeddings(Embeddings):
+    """Catat jumlah dan durasi panggilan ke API embedding."""
+
+    def __init__(self, embeddings: Embeddings, telemetry: Telemetry = telemetry):
+        self.embeddings = embeddings
+        self.telemetry = telemetry
+        self.model = getattr(embeddings, "model", None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        vectors = self.embeddings.embed_documents(texts)
+        self.telemetry.record_embedding(
+            self.model, len(texts), time.perf_counter() - started
+        )
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        vectors = await self.embeddings.aembed_documents(texts)
+        self.telemetry.record_embedding(
+            self.model, len(texts), time.perf_counter() - started
+        )
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class LimitedEmbeddings(Embeddings):
+    """Kirim panggilan embedding lewat limiter per model (concurrency, rate
+    limit, backoff 429, dan penggabungan batch identik yang sedang berjalan)."""
+
+    def __init__(self, embeddings: Embeddings, limiter=None):
+        from app.limits import limiter_for
+
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", None)
+        self.limiter = limiter or limiter_for(self.model, kind="embedding")
+
+    def _key(self, texts: List[str]) -> str:
+        digest = hashlib.sha256()
+        for text in texts:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.limiter.call(
+            self.embeddings.embed_documents, texts, key=self._key(texts)
+        )
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.limiter.acall(
+            self.embeddings.aembed_documents, texts, key=self._key(texts)
+        )
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class BatchedEmbeddings(Embeddings):
+    """Pecah teks menjadi batch berukuran batch_size dan kirim hingga
+    max_concurrency batch bersamaan. Batch yang gagal karena error sementara
+    (timeout, koneksi, 5xx) diulang sendiri dengan backoff tanpa mengirim ulang
+    batch lain. Error lain langsung dilempar; 429 diulang oleh limiter."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        max_retries: int = 2,
+        backoff_seconds: float = 0.5,
+    ):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", None)
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._lock = threading.Lock()
+        # Satu pool per instance, dibuat saat pertama kali ada lebih dari 1 batch
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.batches = 0
+        self.retries = 0
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        return [
+            texts[start : start + self.batch_size]
+            for start in range(0, len(texts), self.batch_size)
+        ]
+
+    def _on_retry(self, attempt: int, error: Exception) -> float:
+        with self._lock:
+            self.retries += 1
+        telemetry.metrics.inc("embedding_batch_retries_total", model=self.model)
+        delay = self.backoff_seconds * 2**attempt
+        logger.warning(
+            "Batch embedding gagal (%s), dicoba lagi dalam %.1f detik", error, delay
+        )
+        return delay
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = self.embeddings.embed_documents(batch)
+                break
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient_error(e):
+                    raise
+                time.sleep(self._on_retry(attempt, e))
+        with self._lock:
+            self.batches += 1
+        return vectors
+
+    async def _aembed_batch(self, batch: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = await self.embeddings.aembed_documents(batch)
+                break
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient_error(e):
+                    raise
+                await asyncio.sleep(self._on_retry(attempt, e))
+        with self._lock:
+            self.batches += 1
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = self._batches(texts)
+        if len(batches) <= 1:
+            return self._embed_batch(texts) if texts else []
+        # Context disalin per batch agar span telemetry ikut ke thread
+        futures = [
+            self._pool().submit(copy_context().run, self._embed_batch, batch)
+            for batch in batches
+        ]
+        return [vector for future in futures for vector in future.result()]
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix="embedding-batch",
+                )
+            return self._executor
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._aembed_batch(batch)
+
+        results = await asyncio.gather(*(run(batch) for batch in self._batches(texts)))
+        return [vector for vectors in results for vector in vectors]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self._aembed_batch([text]))[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"batches": self.batches, "retries": self.retries}
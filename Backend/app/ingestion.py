@@ -0,0 +1,95 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_text(text: str) -> str:
+    return hash_bytes(text.encode("utf-8"))
+
+
+def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_id(source: str, chunk_hash: str) -> str:
+    # ID stabil: chunk yang sama dari file yang sama selalu mendapat ID yang sama
+    return hash_text(f"{source}\x00{chunk_hash}")
+
+
+class IngestionManifest:
+    """Catatan file dan chunk yang sudah di-embed ke satu collection Chroma."""
+
+    def __init__(self, persist_directory: str, collection_name: str):
+        self.path = os.path.join(
+            persist_directory, f"{collection_name}_ingestion_manifest.json"
+        )
+        self._lock = threading.Lock()
+        self._files: Dict[str, Dict] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            self._files = data.get("files", {})
+        except (OSError, ValueError) as e:
+            logger.warning(
+                "Manifest ingestion tidak bisa dibaca, mulai dari kosong: %s", e
+            )
+            self._files = {}
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump({"version": MANIFEST_VERSION, "files": self._files}, file)
+            os.replace(tmp_path, self.path)
+
+    def get_file_hash(self, source: str) -> Optional[str]:
+        entry = self._files.get(source)
+        return entry["file_hash"] if entry else None
+
+    def get_chunk_ids(self, source: str) -> List[str]:
+        entry = self._files.get(source)
+        return list(entry["chunk_ids"]) if entry else []
+
+    def is_unchanged(self, source: str, file_hash: str) -> bool:
+        return self.get_file_hash(source) == file_hash
+
+    def update_file(self, source: str, file_hash: str, chunk_ids: List[str]):
+        with self._lock:
+            self._files[source] = {"file_hash": file_hash, "chunk_ids": chunk_ids}
+
+    def remove_file(self, source: str) -> List[str]:
+        with self._lock:
+            entry = self._files.pop(source, None)
+        return entry["chunk_ids"] if entry else []
+
+    def sources(self) -> List[str]:
+        return list(self._files)
+
+    def version(self) -> str:
+        # Berubah setiap kali ada file yang ditambah, diubah, atau dihapus
+        with self._lock:
+            entries = sorted(
+                (source, entry["file_hash"]) for source, entry in self._files.items()
+            )
+        return hash_text(json.dumps(entries))
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+
+class JobStore:
+    """Penyimpanan status job di memori. Job yang sudah selesai dibuang
+    setelah ttl_seconds, atau jika jumlahnya melebihi max_finished."""
+
+    def __init__(self, ttl_seconds: float = 3600, max_finished: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max_finished
+        self._jobs: Dict[str, Dict] = {}
+        # job_id -> waktu selesai, urut dari yang paling lama
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, job: Dict):
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+            if job["status"] in FINISHED:
+                self._finished[job["job_id"]] = job["updated_at"]
+                self._finished.move_to_end(job["job_id"])
+            self._prune()
+
+    def _prune(self):
+        expire_before = time.time() - self.ttl_seconds
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if len(self._finished) <= self.max_finished and (
+                self.ttl_seconds <= 0 or finished_at >= expire_before
+            ):
+                break
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def unfinished(self) -> List[Dict]:
+        with self._lock:
+            return [
+                dict(job)
+                for job in self._jobs.values()
+                if job["status"] in (QUEUED, RUNNING)
+            ]
+
+
+class SQLiteJobStore(JobStore):
+    """Penyimpanan status job di SQLite agar job yang belum selesai
+    dijalankan ulang setelah restart."""
+
+    def __init__(
+        self, db_path: str, ttl_seconds: float = 3600, max_finished: int = 1000
+    ):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def save(self, job: Dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, status, data) VALUES (?, ?, ?)",
+                (job["job_id"], job["status"], json.dumps(job)),
+            )
+            if job["status"] in FINISHED:
+                self._prune()
+            self._conn.commit()
+
+    def _prune(self):
+        finished = "status IN (?, ?)"
+        updated_at = "json_extract(data, '$.updated_at')"
+        if self.ttl_seconds > 0:
+            self._conn.execute(
+                f"DELETE FROM jobs WHERE {finished} AND {updated_at} < ?",
+                (*FINISHED, time.time() - self.ttl_seconds),
+            )
+        self._conn.execute(
+            f"DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE {finished} ORDER BY {updated_at} DESC LIMIT -1 OFFSET ?)",
+            (*FINISHED, self.max_finished),
+        )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def unfinished(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class IngestionJobQueue:
+    """Antrian job ingestion dokumen yang dikerjakan oleh worker di event loop.
+
+    handler menerima (job, set_stage) dan mengembalikan hasil job. Jumlah job
+    yang berjalan bersamaan dibatasi oleh max_concurrency.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Dict, Callable[[str], None]], Awaitable[Dict]],
+        store: Optional[JobStore] = None,
+        max_concurrency: int = 2,
+    ):
+        self.handler = handler
+        self.store = store or JobStore()
+        self.max_concurrency = max(1, max_concurrency)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        for job in self.store.unfinished():
+            # Job yang terputus saat restart dijalankan ulang dari awal
+            job.update(status=QUEUED, stage=QUEUED)
+            self.store.save(job)
+            self._queue.put_nowait(job["job_id"])
+            logger.info("Menjalankan ulang job %s", job["job_id"])
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)
+        ]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, payload: Dict) -> Dict:
+        if self._queue is None:
+            raise RuntimeError("Job queue belum dijalankan")
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "stage": QUEUED,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.store.save(job)
+        self._queue.put_nowait(job["job_id"])
+        return self.public_view(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.store.get(job_id)
+        return self.public_view(job) if job else None
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @staticmethod
+    def public_view(job: Dict) -> Dict:
+        return {key: value for key, value in job.items() if key != "payload"}
+
+    def _update(self, job: Dict, **fields):
+        job.update(fields, updated_at=time.time())
+        if job["status"] in FINISHED:
+            # Payload (state awal graph) hanya dibutuhkan selama job berjalan
+            job.pop("payload", None)
+        self.store.save(job)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self.store.get(job_id)
+            if job is None:
+                continue
+            self._update(job, status=RUNNING, stage=RUNNING)
+            try:
+                result = await self.handler(
+                    job, lambda stage: self._update(job, stage=stage)
+                )
+                self._update(job, status=DONE, stage=DONE, result=result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Job %s gagal: %s", job_id, e)
+                self._update(job, status=FAILED, stage=FAILED, error=str(e))
+            finally:
+                self._queue.task_done()
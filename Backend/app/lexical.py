@@ -0,0 +1,207 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# Token seperti kode/identifier: ERR_404, v2.1, config.yaml, foo::bar
+CODE_PATTERN = re.compile(
+    r"\w*(?:[A-Za-z]\d|\d[A-Za-z]|[A-Za-z0-9][_.:/][A-Za-z0-9])\w*"
+)
+
+
+# Akronim huruf kapital: RPL, API, SQL2
+ACRONYM_PATTERN = re.compile(r"[A-Z][A-Z0-9]+")
+
+
+def is_keyword_query(query: str) -> bool:
+    """Query yang seluruhnya kata kunci: satu frasa dalam kutipan, atau setiap
+    kata berupa token kode atau akronim ("RPL", "ERR_404 config.yaml").
+    Pertanyaan biasa yang menyebut akronim ("Apa itu RPL?") tidak termasuk."""
+    query = query.strip()
+    if len(query) > 2 and query[0] == query[-1] == '"' and query.count('"') == 2:
+        return True
+    words = [word.strip("?!.,;:()") for word in query.split()]
+    return bool(words) and all(
+        CODE_PATTERN.fullmatch(word) or ACRONYM_PATTERN.fullmatch(word)
+        for word in words
+    )
+
+
+def lexical_weight(query: str, boost: float = 2.0) -> float:
+    """Bobot ranking BM25 di RRF. Kutipan atau token seperti kode dicari persis
+    sehingga BM25 diberi bobot lebih; pertanyaan biasa memakai bobot 1."""
+    if '"' in query or CODE_PATTERN.search(query):
+        return boost
+    return 1.0
+
+
+# Field metadata yang bisa dipakai sebagai filter pencarian
+FILTER_FIELDS = ("tenant_id", "source")
+
+
+class BM25Index:
+    """Inverted index BM25 lokal yang di-update per chunk dan disimpan di SQLite.
+
+    Postings dan panjang dokumen disimpan di memori untuk pencarian, isi chunk
+    hanya dibaca dari SQLite untuk hasil teratas.
+    """
+
+    def __init__(self, db_path: str, k1: float = 1.5, b: float = 0.75):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL, terms TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._lengths: Dict[str, int] = {}
+        self._fields: Dict[str, Dict[str, str]] = {}
+        self._total_length = 0
+        self._load()
+
+    def _load(self):
+        rows = self._conn.execute("SELECT id, metadata, terms FROM chunks").fetchall()
+        for chunk_id, metadata, terms in rows:
+            self._index_terms(chunk_id, json.loads(terms))
+            self._set_fields(chunk_id, json.loads(metadata))
+
+    def _set_fields(self, chunk_id: str, metadata: Dict):
+        fields = {
+            field: str(metadata[field]) for field in FILTER_FIELDS if field in metadata
+        }
+        if fields:
+            self._fields[chunk_id] = fields
+
+    def _matches(self, chunk_id: str, filter: Dict[str, str]) -> bool:
+        fields = self._fields.get(chunk_id, {})
+        return all(fields.get(key) == str(value) for key, value in filter.items())
+
+    def _index_terms(self, chunk_id: str, term_counts: Dict[str, int]):
+        for term, count in term_counts.items():
+            self._postings[term][chunk_id] = count
+        length = sum(term_counts.values())
+        self._lengths[chunk_id] = length
+        self._total_length += length
+
+    def _unindex(self, chunk_id: str, term_counts: Dict[str, int]):
+        for term in term_counts:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(chunk_id, 0)
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, chunk_ids: List[str], documents: List[Document]):
+        rows = []
+        with self._lock:
+            for chunk_id, document in zip(chunk_ids, documents):
+                if chunk_id in self._lengths:
+                    continue
+                term_counts = dict(Counter(tokenize(document.page_content)))
+                self._index_terms(chunk_id, term_counts)
+                self._set_fields(chunk_id, document.metadata)
+                rows.append(
+                    (
+                        chunk_id,
+                        document.page_content,
+                        json.dumps(document.metadata),
+                        json.dumps(term_counts),
+                    )
+                )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, content, metadata, terms) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def delete(self, chunk_ids: List[str]):
+        with self._lock:
+            for chunk_id in chunk_ids:
+                row = self._conn.execute(
+                    "SELECT terms FROM chunks WHERE id = ?", (chunk_id,)
+                ).fetchone()
+                if row:
+                    self._unindex(chunk_id, json.loads(row[0]))
+                self._fields.pop(chunk_id, None)
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE id = ?",
+                [(chunk_id,) for chunk_id in chunk_ids],
+            )
+            self._conn.commit()
+
+    def search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[str, float]]:
+        """Skor BM25 untuk chunk yang cocok dengan filter (kesamaan field metadata)."""
+        terms = set(tokenize(query))
+        with self._lock:
+            total_docs = len(self._lengths)
+            if not terms or total_docs == 0:
+                return []
+            average_length = self._total_length / total_docs
+            scores: Dict[str, float] = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(
+                    1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                for chunk_id, tf in postings.items():
+                    if filter and not self._matches(chunk_id, filter):
+                        continue
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self._lengths[chunk_id] / average_length
+                    )
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def get_documents(self, chunk_ids: List[str]) -> Dict[str, Document]:
+        if not chunk_ids:
+            return {}
+        placeholders = ",".join("?" * len(chunk_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, content, metadata FROM chunks WHERE id IN ({placeholders})",
+                chunk_ids,
+            ).fetchall()
+        return {
+            chunk_id: Document(page_content=content, metadata=json.loads(metadata))
+            for chunk_id, content, metadata in rows
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[str]], k: int = 60, weights: Optional[List[float]] = None
+) -> List[Tuple[str, float]]:
+    scores: Dict[str, float] = defaultdict(float)
+    for index, ranking in enumerate(rankings):
+        weight = 1.0 if weights is None else weights[index]
+        for rank, key in enumerate(ranking):
+            scores[key] += weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,483 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+from app.config import env_bool, env_float, env_int, env_str
+from app.telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    # openai.RateLimitError dan error HTTP lain dengan status 429
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return type(error).__name__ == "RateLimitError"
+
+
+# Error sementara yang aman diulang: timeout, koneksi putus, dan 5xx.
+# 429 tidak termasuk, itu ditangani ModelLimiter
+TRANSIENT_ERRORS = (
+    "APITimeoutError",
+    "APIConnectionError",
+    "InternalServerError",
+    "ServiceUnavailableError",
+    "ConnectTimeout",
+    "ReadTimeout",
+    "ConnectError",
+)
+
+
+def is_transient_error(error: Exception) -> bool:
+    if is_rate_limit_error(error):
+        return False
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return type(error).__name__ in TRANSIENT_ERRORS
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Rate limiter token bucket: `rate` request per detik dengan burst
+    sebesar `capacity`. Reservasi bisa membuat saldo negatif, sehingga
+    pemanggil yang datang lebih dulu juga dilayani lebih dulu."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Ambil token dan kembalikan berapa detik pemanggil harus menunggu."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+
+class _Waiter:
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+
+class ModelLimiter:
+    """Batasi panggilan ke satu model: jumlah request bersamaan, request per
+    menit (token bucket), cooldown adaptif setelah 429, dan penggabungan
+    prompt identik yang sedang diproses.
+
+    Bisa dipakai dari thread (node sync) dan dari event loop (node async)
+    sekaligus; antrian slot bersifat FIFO untuk keduanya.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        max_concurrency: int = 8,
+        requests_per_minute: float = 0,
+        max_retries: int = 3,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+        coalesce: bool = True,
+    ):
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.bucket = (
+            TokenBucket(requests_per_minute / 60) if requests_per_minute > 0 else None
+        )
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.coalesce = coalesce
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: deque = deque()
+        self._inflight: Dict[str, Future] = {}
+        self._backoff = 0.0
+        self._blocked_until = 0.0
+        self.requests = 0
+        self.rate_limited = 0
+        self.coalesced = 0
+        self.wait_seconds = 0.0
+
+    # Slot concurrency
+
+    def _try_slot(self, waiter: _Waiter) -> bool:
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def _acquire_slot(self):
+        waiter = _Waiter(event=threading.Event())
+        if not self._try_slot(waiter):
+            waiter.event.wait()
+
+    async def _aacquire_slot(self):
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop=loop, future=loop.create_future())
+        if self._try_slot(waiter):
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+                    raise
+            # Slot sudah diberikan; jika future sempat selesai, kembalikan di sini,
+            # jika future dibatalkan _grant yang mengembalikannya
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release_slot()
+            raise
+
+    def _grant(self, future: asyncio.Future):
+        if future.cancelled():
+            self._release_slot()
+        else:
+            future.set_result(None)
+
+    def _release_slot(self):
+        with self._lock:
+            if self._waiters:
+                # Slot langsung diserahkan ke antrian terdepan
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                if waiter.event is not None:
+                    waiter.event.set()
+                else:
+                    waiter.loop.call_soon_threadsafe(self._grant, waiter.future)
+                return
+            self._active -= 1
+
+    # Rate limit dan backoff
+
+    def _delay(self) -> float:
+        delay = self.bucket.reserve() if self.bucket is not None else 0.0
+        with self._lock:
+            return max(delay, self._blocked_until - time.monotonic())
+
+    def _on_rate_limited(self, error: Exception):
+        with self._lock:
+            self.rate_limited += 1
+            self._backoff = min(
+                self.max_backoff_seconds,
+                max(self.backoff_seconds, self._backoff * 2),
+            )
+            wait = _retry_after(error) or self._backoff * random.uniform(0.8, 1.2)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + wait)
+        telemetry.metrics.inc("limiter_rate_limited_total", model=self.model)
+        logger.warning("Rate limit %s, jeda %.1f detik", self.model, wait)
+
+    def _on_success(self):
+        if self._backoff:
+            with self._lock:
+                # Turunkan backoff perlahan agar tidak langsung memicu 429 lagi
+                self._backoff = self._backoff / 2 if self._backoff > 0.1 else 0.0
+
+    def _waited(self, started: float):
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.requests += 1
+            self.wait_seconds += waited
+        telemetry.metrics.observe("limiter_wait_seconds", waited, model=self.model)
+
+    def _run(self, func: Callable, args: Tuple, kwargs: Dict):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            telemetry.metrics.inc("limiter_waiting", model=self.model)
+            try:
+                self._acquire_slot()
+            finally:
+                telemetry.metrics.inc("limiter_waiting", -1, model=self.model)
+            telemetry.metrics.inc("limiter_in_flight", model=self.model)
+            try:
+                delay = self._delay()
+                if delay > 0:
+                    time.sleep(delay)
+                self._waited(started)
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if is_rate_limit_error(e) and attempt < self.max_retries:
+                    self._on_rate_limited(e)
+                    continue
+                raise
+            finally:
+                telemetry.metrics.inc("limiter_in_flight", -1, model=self.model)
+                self._release_slot()
+            self._on_success()
+            return result
+
+    async def _arun(self, afunc: Callable, args: Tuple, kwargs: Dict):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            telemetry.metrics.inc("limiter_waiting", model=self.model)
+            try:
+                await self._aacquire_slot()
+            finally:
+                telemetry.metrics.inc("limiter_waiting", -1, model=self.model)
+            telemetry.metrics.inc("limiter_in_flight", model=self.model)
+            try:
+                delay = self._delay()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._waited(started)
+                result = await afunc(*args, **kwargs)
+            except Exception as e:
+                if is_rate_limit_error(e) and attempt < self.max_retries:
+                    self._on_rate_limited(e)
+                    continue
+                raise
+            finally:
+                telemetry.metrics.inc("limiter_in_flight", -1, model=self.model)
+                self._release_slot()
+            self._on_success()
+            return result
+
+    # Penggabungan prompt identik
+
+    def _join(self, key: Optional[str]) -> Tuple[Optional[Future], bool]:
+        """Kembalikan (future, is_leader). Future sudah berstatus running agar
+        pembatalan salah satu follower tidak membatalkan hasil bersama."""
+        if key is None or not self.coalesce:
+            return None, True
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                telemetry.metrics.inc("limiter_coalesced_total", model=self.model)
+                return future, False
+            future = self._inflight[key] = Future()
+            future.set_running_or_notify_cancel()
+            return future, True
+
+    def _finish(self, key: str, future: Future, result=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def call(
+        self,
+        func: Callable,
+        *args,
+        key: Optional[str] = None,
+        shared: Optional[Callable] = None,
+        **kwargs,
+    ):
+        """Jalankan func di bawah limit. Pemanggil dengan key yang sama selama
+        func masih berjalan menunggu hasil yang sama (diolah lewat shared)."""
+        future, is_leader = self._join(key)
+        if not is_leader:
+            result = future.result()
+            return shared(result) if shared else result
+        if future is None:
+            return self._run(func, args, kwargs)
+        try:
+            result = self._run(func, args, kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def acall(
+        self,
+        afunc: Callable,
+        *args,
+        key: Optional[str] = None,
+        shared: Optional[Callable] = None,
+        **kwargs,
+    ):
+        future, is_leader = self._join(key)
+        if not is_leader:
+            result = await asyncio.wrap_future(future)
+            return shared(result) if shared else result
+        if future is None:
+            return await self._arun(afunc, args, kwargs)
+        try:
+            result = await self._arun(afunc, args, kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "requests_per_minute": self.requests_per_minute,
+                "in_flight": self._active,
+                "waiting": len(self._waiters),
+                "requests": self.requests,
+                "rate_limited": self.rate_limited,
+                "coalesced": self.coalesced,
+                "avg_wait_ms": round(self.wait_seconds / self.requests * 1000, 3)
+                if self.requests
+                else 0.0,
+                "backoff_seconds": round(self._backoff, 3),
+            }
+
+
+def _parse_overrides(value: Optional[str]) -> Dict[str, Tuple[int, float]]:
+    # Format: "gpt-4o=4/500,text-embedding-ada-002=8/3000" (concurrency/rpm)
+    overrides = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        model, limits = item.split("=", 1)
+        concurrency, _, rpm = limits.partition("/")
+        overrides[model.strip()] = (int(concurrency), float(rpm or 0))
+    return overrides
+
+
+_limiters: Dict[str, ModelLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(model: Optional[str], kind: str = "llm") -> ModelLimiter:
+    """Satu limiter per model untuk seluruh proses. Default dari
+    LLM_/EMBEDDING_MAX_CONCURRENCY dan _REQUESTS_PER_MINUTE, bisa di-override
+    per model lewat MODEL_LIMITS."""
+    model = model or "default"
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            prefix = kind.upper()
+            concurrency, rpm = _parse_overrides(env_str("MODEL_LIMITS")).get(
+                model,
+                (
+                    env_int(f"{prefix}_MAX_CONCURRENCY", 8),
+                    env_float(f"{prefix}_REQUESTS_PER_MINUTE", 0),
+                ),
+            )
+            limiter = _limiters[model] = ModelLimiter(
+                model,
+                max_concurrency=concurrency,
+                requests_per_minute=rpm,
+                max_retries=env_int("RATE_LIMIT_RETRIES", 3),
+                backoff_seconds=env_float("RATE_LIMIT_BACKOFF_SECONDS", 1.0),
+                max_backoff_seconds=env_float("RATE_LIMIT_MAX_BACKOFF_SECONDS", 60.0),
+                coalesce=env_bool("COALESCE_REQUESTS", True),
+            )
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.model: limiter.stats() for limiter in limiters}
+
+
+def _prompt_key(model: str, prefix: str, input) -> str:
+    if isinstance(input, str):
+        payload = input
+    else:
+        payload = json.dumps(
+            [
+                (
+                    getattr(message, "type", None),
+                    getattr(message, "content", message),
+                    getattr(message, "tool_calls", None),
+                    getattr(message, "tool_call_id", None),
+                )
+                for message in input
+            ],
+            default=str,
+        )
+    return hashlib.sha256(f"{model}\x00{prefix}\x00{payload}".encode()).hexdigest()
+
+
+def _mark_coalesced(response):
+    # Salinan untuk follower; telemetry tidak menghitung tokennya dua kali
+    if not hasattr(response, "model_copy"):
+        return response
+    metadata = {**getattr(response, "response_metadata", {}), "coalesced": True}
+    return response.model_copy(update={"response_metadata": metadata})
+
+
+class LimitedModel:
+    """Bungkus chat model (atau hasil bind_tools) agar invoke/ainvoke lewat
+    limiter model tersebut. Callback (streaming token, tracing) tetap berjalan
+    karena model asli dipanggil di context yang sama."""
+
+    def __init__(
+        self,
+        model,
+        limiter: Optional[ModelLimiter] = None,
+        model_name: Optional[str] = None,
+        key_prefix: str = "",
+    ):
+        self.model = model
+        self.model_name = model_name or getattr(model, "model_name", None) or "default"
+        self.limiter = limiter or limiter_for(self.model_name)
+        self.key_prefix = key_prefix
+
+    def bind_tools(self, tools, **kwargs) -> "LimitedModel":
+        names = ",".join(sorted(getattr(tool, "name", str(tool)) for tool in tools))
+        return LimitedModel(
+            self.model.bind_tools(tools, **kwargs),
+            self.limiter,
+            self.model_name,
+            f"{self.key_prefix}tools={names};",
+        )
+
+    def _key(self, input, kwargs: Dict) -> Optional[str]:
+        # Panggilan dengan argumen tambahan tidak digabung
+        if kwargs:
+            return None
+        return _prompt_key(self.model_name, self.key_prefix, input)
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.limiter.call(
+            self.model.invoke,
+            input,
+            config,
+            key=self._key(input, kwargs),
+            shared=_mark_coalesced,
+            **kwargs,
+        )
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.limiter.acall(
+            self.model.ainvoke,
+            input,
+            config,
+            key=self._key(input, kwargs),
+            shared=_mark_coalesced,
+            **kwargs,
+        )
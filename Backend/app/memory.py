@@ -1,33 +1,75 @@
-from typing import List
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
-from mem0 import Memory
+
+from app.telemetry import telemetry
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Provider mem0 yang berjalan di dalam proses dan menyimpan data di disk lokal
+EMBEDDED_PROVIDERS = ("chroma", "faiss")
+LOCAL_PROVIDER = "local"
+
+
+class MemoryBackend:
+    """Interface backend memory jangka panjang, dipisah per memory_id."""
+
+    def get_context(self, query: str, memory_id: str) -> str:
+        raise NotImplementedError
+
+    def add_context(self, list_messages: List, memory_id: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
 
-class MemoryControl:
+
+class MemoryControl(MemoryBackend):
     def __init__(
         self,
         memory_provider: str,
-        provider_host: str,
-        provider_port: str,
+        provider_host: Optional[str] = None,
+        provider_port: Optional[str] = None,
+        path: Optional[str] = None,
+        collection_name: str = "memory",
+        top_k: int = 3,
     ) -> None:
-        if not memory_provider or not provider_host or not provider_port:
+        from mem0 import Memory
+
+        if memory_provider in EMBEDDED_PROVIDERS:
+            # Vector store mem0 di disk lokal, tanpa host/port
+            store_config = {
+                "collection_name": collection_name,
+                "path": path or os.path.join("data", "memory"),
+            }
+        elif not memory_provider or not provider_host or not provider_port:
             raise ValueError("All field is required!")
+        else:
+            store_config = {"host": provider_host, "port": provider_port}
 
+        self.top_k = top_k
         self.config = {
-            "vector_store": {
-                "provider": memory_provider,
-                "config": {"host": provider_host, "port": provider_port},
-            }
+            "vector_store": {"provider": memory_provider, "config": store_config}
         }
 
         self.memory = Memory.from_config(self.config)
-        print("Memory Berhasil di setup.")
+        logger.info("Memory Berhasil di setup.")
 
     def get_context(self, query: str, memory_id: str):
-        get_memory = self.memory.search(query=query, user_id=memory_id, limit=3)
+        get_memory = self.memory.search(
+            query=query, user_id=memory_id, limit=self.top_k
+        )
         memories = "\n".join(
             [f"- {entry['memory']}" for entry in get_memory["results"]]
         )
@@ -37,6 +79,358 @@ class MemoryControl:
         return self.memory.add(list_messages, user_id=memory_id)
 
 
+class LocalVectorMemory(MemoryBackend):
+    """Memory lokal di dalam proses: index NumPy flat per memory_id di SQLite.
+
+    Setiap giliran percakapan disimpan apa adanya (tanpa ekstraksi LLM seperti
+    mem0) dan dicari dengan cosine similarity, top_k hasil teratas. Jumlah
+    entri per memory_id dibatasi max_entries, entri terlama dibuang.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        embeddings,
+        top_k: int = 3,
+        max_entries: int = 500,
+    ):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.embeddings = embeddings
+        self.top_k = top_k
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS memories (id TEXT PRIMARY KEY, memory_id TEXT NOT NULL, content TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS memories_memory_id ON memories (memory_id, created_at)"
+        )
+        self._conn.commit()
+        # memory_id -> (ids, isi, matrix vector ternormalisasi)
+        self._indexes: Dict[str, Tuple[List[str], List[str], np.ndarray]] = {}
+
+    def _load(self, memory_id: str):
+        index = self._indexes.get(memory_id)
+        if index is not None:
+            return index
+        rows = self._conn.execute(
+            "SELECT id, content, vector FROM memories WHERE memory_id = ? ORDER BY created_at",
+            (memory_id,),
+        ).fetchall()
+        vectors = [np.frombuffer(row[2], dtype=np.float32) for row in rows]
+        index = (
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32),
+        )
+        self._indexes[memory_id] = index
+        return index
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        array = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(array, axis=-1, keepdims=True)
+        return array / np.clip(norms, 1e-12, None)
+
+    def get_context(self, query: str, memory_id: str) -> str:
+        with self._lock:
+            _, contents, matrix = self._load(memory_id)
+        if not contents:
+            return ""
+        query_vector = self._normalize(self.embeddings.embed_query(query))
+        similarities = matrix @ query_vector
+        top_k = min(self.top_k, len(contents))
+        best = np.argpartition(-similarities, top_k - 1)[:top_k]
+        best = best[np.argsort(-similarities[best])]
+        return "\n".join(f"- {contents[index]}" for index in best)
+
+    def add_context(self, list_messages: List, memory_id: str):
+        # Satu entri per giliran (pesan user dan jawabannya), walau dikirim sekaligus
+        entries: List[List[str]] = []
+        for message in list_messages:
+            if message["role"] == "user" or not entries:
+                entries.append([])
+            entries[-1].append(f"{message['role']}: {message['content']}")
+        contents = ["\n".join(entry) for entry in entries]
+        if not contents:
+            return
+        vectors = self._normalize(self.embeddings.embed_documents(contents))
+        now = time.time()
+        entry_ids = [uuid.uuid4().hex for _ in contents]
+        with self._lock:
+            ids, stored, matrix = self._load(memory_id)
+            self._conn.executemany(
+                "INSERT INTO memories (id, memory_id, content, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (entry_id, memory_id, content, vector.tobytes(), now)
+                    for entry_id, content, vector in zip(entry_ids, contents, vectors)
+                ],
+            )
+            ids = ids + entry_ids
+            stored = stored + contents
+            matrix = np.vstack([matrix, vectors]) if matrix.size else vectors
+            overflow = len(ids) - self.max_entries
+            if overflow > 0:
+                self._conn.executemany(
+                    "DELETE FROM memories WHERE id = ?",
+                    [(old_id,) for old_id in ids[:overflow]],
+                )
+                ids, stored, matrix = (
+                    ids[overflow:],
+                    stored[overflow:],
+                    matrix[overflow:],
+                )
+            self._conn.commit()
+            self._indexes[memory_id] = (ids, stored, matrix)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def make_memory_backend(
+    memory_provider: Optional[str],
+    provider_host: Optional[str] = None,
+    provider_port: Optional[str] = None,
+    path: Optional[str] = None,
+    top_k: int = 3,
+    max_entries: int = 500,
+    embeddings=None,
+) -> MemoryBackend:
+    """Buat backend memory sesuai provider.
+
+    "local" memakai LocalVectorMemory tanpa mem0 dengan `embeddings` (biasanya
+    milik RAGSystem: cache, limiter, dan telemetry yang sama), "chroma"/"faiss"
+    memakai mem0 dengan vector store di disk lokal, provider lain (misal
+    qdrant) membutuhkan host dan port.
+    """
+    path = path or os.path.join("data", "memory")
+    if (memory_provider or "").lower() == LOCAL_PROVIDER:
+        if embeddings is None:
+            from langchain.embeddings import OpenAIEmbeddings
+
+            from app.embeddings import LimitedEmbeddings, TracedEmbeddings
+
+            embeddings = LimitedEmbeddings(TracedEmbeddings(OpenAIEmbeddings()))
+        return LocalVectorMemory(
+            os.path.join(path, "memory.sqlite"),
+            embeddings,
+            top_k=top_k,
+            max_entries=max_entries,
+        )
+    return MemoryControl(
+        memory_provider=memory_provider,
+        provider_host=provider_host,
+        provider_port=provider_port,
+        path=path,
+        top_k=top_k,
+    )
+
+
+class MemoryReadCache:
+    """Cache hasil pencarian memory per (memory_id, query) dengan TTL pendek.
+
+    Setiap invalidate menaikkan generasi memory_id; hasil pencarian yang
+    dibaca sebelum invalidate tidak disimpan (lihat set).
+    """
+
+    def __init__(self, ttl_seconds: float = 30, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, memory_id: str, query: str) -> Optional[str]:
+        key = (memory_id, query.strip().lower())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        telemetry.record_cache("memory", entry is not None)
+        return entry[1] if entry is not None else None
+
+    def generation(self, memory_id: str) -> int:
+        with self._lock:
+            return self._generations.get(memory_id, 0)
+
+    def set(
+        self, memory_id: str, query: str, value: str, generation: Optional[int] = None
+    ):
+        """Simpan hasil pencarian. generation adalah nilai generation() sebelum
+        backend dibaca; jika memory_id sudah di-invalidate sejak itu, hasilnya
+        sudah basi dan tidak disimpan."""
+        key = (memory_id, query.strip().lower())
+        with self._lock:
+            if generation is not None and generation != self._generations.get(
+                memory_id, 0
+            ):
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, memory_id: str):
+        with self._lock:
+            self._generations[memory_id] = self._generations.get(memory_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == memory_id]:
+                del self._entries[key]
+
+
+class BufferedMemory:
+    """Pembungkus MemoryControl: tulis memory di background, baca lewat cache.
+
+    Giliran percakapan dikumpulkan per memory_id lalu ditulis sekaligus oleh
+    satu thread setiap flush_interval detik, atau lebih cepat jika jumlah
+    giliran yang menunggu untuk satu memory_id sudah mencapai max_batch_turns.
+    Giliran yang gagal ditulis dikembalikan ke antrian dan dicoba lagi pada
+    flush berikutnya, paling banyak max_retries kali sebelum dibuang.
+    """
+
+    def __init__(
+        self,
+        memory: MemoryBackend,
+        flush_interval: float = 5.0,
+        max_batch_turns: int = 8,
+        read_cache: Optional[MemoryReadCache] = None,
+        max_retries: int = 3,
+    ):
+        self.memory = memory
+        self.flush_interval = flush_interval
+        self.max_batch_turns = max(1, max_batch_turns)
+        self.read_cache = read_cache
+        self.max_retries = max(0, max_retries)
+        self._pending: Dict[str, List[List]] = {}
+        # Jumlah flush gagal berturut-turut per memory_id
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.flushes = 0
+        self.flushed_turns = 0
+        self.failed_flushes = 0
+        self.dropped_turns = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def get_context(self, query: str, memory_id: str) -> str:
+        if self.read_cache is not None:
+            cached = self.read_cache.get(memory_id, query)
+            if cached is not None:
+                return cached
+            generation = self.read_cache.generation(memory_id)
+        context = self.memory.get_context(query=query, memory_id=memory_id)
+        if self.read_cache is not None:
+            self.read_cache.set(memory_id, query, context, generation)
+        return context
+
+    def add_context(self, list_messages: List, memory_id: str):
+        with self._lock:
+            turns = self._pending.setdefault(memory_id, [])
+            turns.append(list_messages)
+            if len(turns) >= self.max_batch_turns:
+                self._wakeup.set()
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return sum(len(turns) for turns in self._pending.values())
+
+    def flush(self, final: bool = False):
+        """Tulis semua giliran yang menunggu. final=True (saat close) tidak
+        mengantrikan ulang giliran yang gagal karena tidak ada flush lagi."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for memory_id, turns in pending.items():
+            messages = [message for turn in turns for message in turn]
+            started = time.perf_counter()
+            try:
+                self.memory.add_context(messages, memory_id)
+                self.flushed_turns += len(turns)
+                with self._lock:
+                    self._attempts.pop(memory_id, None)
+            except Exception as e:
+                self.failed_flushes += 1
+                self._retry_later(memory_id, turns, e, final)
+            finally:
+                elapsed = time.perf_counter() - started
+                self.flushes += 1
+                self.last_flush_seconds = elapsed
+                self.total_flush_seconds += elapsed
+            # Memory user ini berubah, hasil pencarian lama tidak berlaku lagi
+            if self.read_cache is not None:
+                self.read_cache.invalidate(memory_id)
+
+    def _retry_later(
+        self, memory_id: str, turns: List[List], error: Exception, final: bool
+    ):
+        with self._lock:
+            attempts = self._attempts.get(memory_id, 0) + 1
+            if not final and attempts <= self.max_retries:
+                # Giliran lama di depan agar urutan percakapan tetap terjaga
+                self._attempts[memory_id] = attempts
+                self._pending[memory_id] = turns + self._pending.get(memory_id, [])
+                logger.warning(
+                    "Gagal menyimpan memory untuk %s (percobaan %s), dicoba lagi: %s",
+                    memory_id,
+                    attempts,
+                    error,
+                )
+                return
+            self._attempts.pop(memory_id, None)
+            self.dropped_turns += len(turns)
+        logger.error(
+            "Gagal menyimpan memory untuk %s, %s giliran dibuang: %s",
+            memory_id,
+            len(turns),
+            error,
+        )
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._worker.join()
+        self.flush(final=True)
+        self.memory.close()
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "flushes": self.flushes,
+            "flushed_turns": self.flushed_turns,
+            "failed_flushes": self.failed_flushes,
+            "dropped_turns": self.dropped_turns,
+            "last_flush_seconds": round(self.last_flush_seconds, 4),
+            "avg_flush_seconds": (
+                round(self.total_flush_seconds / self.flushes, 4)
+                if self.flushes
+                else 0.0
+            ),
+            "read_cache_hits": self.read_cache.hits if self.read_cache else 0,
+            "read_cache_misses": self.read_cache.misses if self.read_cache else 0,
+        }
+
+
 if __name__ == "__main__":
     memory = MemoryControl("qdrant", "localhost", "6333")
     print(memory.get_context("Siapakah nama saya?", "default"))
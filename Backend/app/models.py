@@ -1,18 +1,39 @@
 from typing import Annotated, Any, Optional, Sequence
 
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import BaseMessage, HumanMessage
 from langgraph.graph import add_messages
 from pydantic import BaseModel, Field
 
+from app.config import env_int
+
+MAX_HISTORY_MESSAGES = env_int("MAX_HISTORY_MESSAGES", 40)
+
+
+def trim_history(messages: Sequence[BaseMessage], max_messages: int):
+    if max_messages <= 0 or len(messages) <= max_messages:
+        return messages
+    # Potong tepat di awal giliran user agar tool call tidak terpisah dari hasilnya
+    for start in range(len(messages) - max_messages, len(messages)):
+        if isinstance(messages[start], HumanMessage):
+            return messages[start:]
+    return messages
+
+
+def add_messages_window(left, right):
+    return trim_history(add_messages(left, right), MAX_HISTORY_MESSAGES)
+
 
 class AgentState(BaseModel):
-    messages: Annotated[Sequence[BaseMessage], add_messages]
+    messages: Annotated[Sequence[BaseMessage], add_messages_window]
     user_message: Optional[str] = "none"
     response: Optional[str] = "none"
     is_include_document: bool = False
     document_name: Optional[str] = "none"
     document_content: Optional[str] = "none"
     document_type: Optional[str] = "none"
+    # sha256 isi file yang dihitung saat upload, agar ingestion tidak hashing ulang
+    document_hash: Optional[str] = None
     # can_answer: bool = False
     reason: Optional[str] = "none"
     document_description: Optional[str] = "none"
+    is_cached_answer: bool = False
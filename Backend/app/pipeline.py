@@ -0,0 +1,393 @@
+import logging
+import mmap
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from app.ingestion import hash_bytes, hash_text, make_chunk_id
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_TYPES = ("pdf", "txt")
+
+
+@contextmanager
+def open_mapped(file_path: str):
+    """Buka file sebagai mmap read-only: hashing dan parsing membaca langsung
+    dari page cache tanpa menyalin isi file ke memori proses."""
+    with open(file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # File kosong tidak bisa di-mmap
+            yield b""
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def _process_context():
+    """Context process worker tanpa fork: fork dari proses uvicorn yang
+    multithread bisa mewarisi lock yang sedang dipegang thread lain."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Preload modul ini saja, bukan __main__ (app FastAPI)
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _extract_pages(reader, start: int, end: int) -> List[Tuple[int, str]]:
+    return [(index, reader.pages[index].extract_text()) for index in range(start, end)]
+
+
+def _read_pdf_pages(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    # Dijalankan di process worker, harus berada di level modul agar bisa di-pickle
+    from pypdf import PdfReader
+
+    with open_mapped(file_path) as buffer:
+        return _extract_pages(PdfReader(buffer), start, end)
+
+
+class PipelineStats:
+    def __init__(self):
+        self.files = 0
+        self.skipped_files = 0
+        self.pages = 0
+        self.chunks = 0
+        self.embedded = 0
+        self.removed = 0
+        self.parse_seconds = 0.0
+        self.split_seconds = 0.0
+        self.embed_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    @staticmethod
+    def _rate(count: int, seconds: float) -> float:
+        return round(count / seconds, 2) if seconds > 0 else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "files": self.files,
+            "skipped_files": self.skipped_files,
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "embedded": self.embedded,
+            "removed": self.removed,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "pages_per_second": self._rate(self.pages, self.parse_seconds),
+            "chunks_per_second": self._rate(self.chunks, self.split_seconds),
+            "embeddings_per_second": self._rate(self.embedded, self.embed_seconds),
+        }
+
+
+class IngestionPipeline:
+    """Pipeline ingestion: parsing paralel -> splitting -> embedding per batch.
+
+    Halaman PDF diparsing di process pool per rentang halaman dan dialirkan
+    berurutan ke splitter. Chunk baru dikumpulkan per batch dan di-embed oleh
+    thread terpisah; antrian batch dibatasi sehingga parsing menunggu jika
+    embedding tertinggal.
+    """
+
+    def __init__(
+        self,
+        rag,
+        max_workers: Optional[int] = None,
+        pages_per_task: int = 16,
+        embed_batch_size: int = 256,
+        max_pending_batches: int = 2,
+    ):
+        self.rag = rag
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.pages_per_task = pages_per_task
+        self.embed_batch_size = embed_batch_size
+        self.max_pending_batches = max_pending_batches
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Ingest ke collection yang sama berjalan berurutan (manifest konsisten),
+        # tanpa menahan rag._lock selama parsing dan embedding
+        self._ingest_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=_process_context()
+                )
+            return self._executor
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _iter_pdf_pages(self, file_path: str, buffer) -> Iterator[Document]:
+        from pypdf import PdfReader
+
+        reader = PdfReader(buffer)
+        total_pages = len(reader.pages)
+        ranges = [
+            (start, min(start + self.pages_per_task, total_pages))
+            for start in range(0, total_pages, self.pages_per_task)
+        ]
+        if len(ranges) <= 1:
+            # Dokumen kecil diekstrak dari reader yang sama, tanpa parsing ulang
+            results = iter([_extract_pages(reader, 0, total_pages)])
+        else:
+            results = self._map_bounded(file_path, ranges)
+        for pages in results:
+            for index, text in pages:
+                yield Document(
+                    page_content=text,
+                    metadata={
+                        "source": file_path,
+                        "page": index,
+                        "total_pages": total_pages,
+                    },
+                )
+
+    def _map_bounded(self, file_path: str, ranges: List[Tuple[int, int]]):
+        # Batasi task yang berjalan agar halaman tidak menumpuk di memori
+        executor = self._get_executor()
+        pending = []
+        max_in_flight = self.max_workers * 2
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < max_in_flight:
+                start, end = ranges[next_range]
+                pending.append(executor.submit(_read_pdf_pages, file_path, start, end))
+                next_range += 1
+            yield pending.pop(0).result()
+
+    def _iter_text_pages(self, file_path: str, buffer) -> Iterator[Document]:
+        text = str(buffer, "utf-8", "replace")
+        yield Document(page_content=text, metadata={"source": file_path})
+
+    def iter_pages(
+        self, file_path: str, file_type: Optional[str] = None, buffer=None
+    ) -> Iterator[Document]:
+        """Parsing halaman dari buffer (mmap/bytes) yang sudah dibuka, atau
+        membuka file sebagai mmap jika buffer tidak diberikan."""
+        if buffer is None:
+            return self._iter_mapped(file_path, file_type)
+        file_type = file_type or file_path.rsplit(".", 1)[-1].lower()
+        if file_type == "pdf":
+            return self._iter_pdf_pages(file_path, buffer)
+        return self._iter_text_pages(file_path, buffer)
+
+    def _iter_mapped(
+        self, file_path: str, file_type: Optional[str]
+    ) -> Iterator[Document]:
+        with open_mapped(file_path) as buffer:
+            yield from self.iter_pages(file_path, file_type, buffer)
+
+    def _embed_worker(self, batches: queue.Queue, stats: PipelineStats, errors: List):
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            if errors:
+                continue
+            try:
+                started = time.perf_counter()
+                # Lock hanya selama satu batch ditulis, query tidak menunggu ingest
+                if item[0] == "upsert":
+                    _, chunks, chunk_ids = item
+                    with self.rag._lock:
+                        self.rag._upsert_chunks(chunks, chunk_ids)
+                    stats.embedded += len(chunks)
+                    stats.embed_seconds += time.perf_counter() - started
+                else:
+                    _, source, file_hash, chunk_ids, stale_ids = item
+                    with self.rag._lock:
+                        if stale_ids:
+                            self.rag._delete_chunks(stale_ids)
+                        self.rag.manifest.update_file(source, file_hash, chunk_ids)
+                    stats.removed += len(stale_ids)
+            except Exception as e:
+                errors.append(e)
+
+    def _put(self, batches: queue.Queue, item, errors: List):
+        if errors:
+            raise errors[0]
+        batches.put(item)
+
+    def _ingest_file(
+        self,
+        file_path: str,
+        batches: queue.Queue,
+        stats: PipelineStats,
+        errors: List,
+        on_page: Optional[Callable[[Document], None]],
+        file_type: Optional[str],
+        metadata: Optional[Dict],
+        file_hash: Optional[str],
+    ):
+        # File dibuka sekali: hash (jika belum dihitung saat upload) dan
+        # parsing membaca mmap yang sama
+        with open_mapped(file_path) as buffer:
+            self._ingest_buffer(
+                file_path,
+                buffer,
+                file_hash or hash_bytes(buffer),
+                batches,
+                stats,
+                errors,
+                on_page,
+                file_type,
+                metadata,
+            )
+
+    def _ingest_buffer(
+        self,
+        file_path: str,
+        buffer,
+        file_hash: str,
+        batches: queue.Queue,
+        stats: PipelineStats,
+        errors: List,
+        on_page: Optional[Callable[[Document], None]],
+        file_type: Optional[str],
+        metadata: Optional[Dict],
+    ):
+        unchanged = self.rag.manifest.is_unchanged(file_path, file_hash)
+        if unchanged and on_page is None:
+            stats.skipped_files += 1
+            logger.info("Dokumen %s tidak berubah, dilewati", file_path)
+            return
+
+        previous_ids = set(self.rag.manifest.get_chunk_ids(file_path))
+        chunk_ids: List[str] = []
+        seen = set()
+        batch_chunks: List[Document] = []
+        batch_ids: List[str] = []
+
+        pages = self.iter_pages(file_path, file_type, buffer)
+        while True:
+            started = time.perf_counter()
+            page = next(pages, None)
+            stats.parse_seconds += time.perf_counter() - started
+            if page is None:
+                break
+            stats.pages += 1
+            if on_page is not None:
+                on_page(page)
+            if unchanged:
+                continue
+
+            started = time.perf_counter()
+            for chunk in self.rag.text_splitter.split_documents([page]):
+                chunk_id = make_chunk_id(file_path, hash_text(chunk.page_content))
+                if chunk_id in seen:
+                    continue
+                seen.add(chunk_id)
+                chunk_ids.append(chunk_id)
+                if metadata:
+                    chunk.metadata.update(metadata)
+                stats.chunks += 1
+                if chunk_id in previous_ids:
+                    continue
+                batch_chunks.append(chunk)
+                batch_ids.append(chunk_id)
+            stats.split_seconds += time.perf_counter() - started
+
+            if len(batch_chunks) >= self.embed_batch_size:
+                self._put(batches, ("upsert", batch_chunks, batch_ids), errors)
+                batch_chunks, batch_ids = [], []
+
+        if unchanged:
+            stats.skipped_files += 1
+            return
+        if batch_chunks:
+            self._put(batches, ("upsert", batch_chunks, batch_ids), errors)
+        stale_ids = list(previous_ids - seen)
+        self._put(
+            batches, ("finalize", file_path, file_hash, chunk_ids, stale_ids), errors
+        )
+        stats.files += 1
+
+    def ingest(
+        self,
+        file_paths: List[str],
+        on_page: Optional[Callable[[Document], None]] = None,
+        file_type: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        file_hashes: Optional[Dict[str, str]] = None,
+    ) -> PipelineStats:
+        """Index file ke vector store milik RAGSystem.
+
+        Jika on_page diberikan, setiap halaman juga diteruskan ke callback
+        tersebut (file yang tidak berubah tetap diparsing tapi tidak di-embed).
+        metadata (misalnya tenant_id) ditambahkan ke setiap chunk.
+        file_hashes berisi hash yang sudah dihitung (misalnya saat upload)
+        sehingga file tidak perlu dibaca ulang untuk hashing.
+        """
+        stats = PipelineStats()
+        errors: List[Exception] = []
+        batches: queue.Queue = queue.Queue(maxsize=self.max_pending_batches)
+        started = time.perf_counter()
+
+        with self._ingest_lock:
+            worker = threading.Thread(
+                target=self._embed_worker, args=(batches, stats, errors), daemon=True
+            )
+            worker.start()
+            try:
+                for file_path in file_paths:
+                    self._ingest_file(
+                        file_path,
+                        batches,
+                        stats,
+                        errors,
+                        on_page,
+                        file_type,
+                        metadata,
+                        (file_hashes or {}).get(file_path),
+                    )
+            finally:
+                batches.put(None)
+                worker.join()
+                with self.rag._lock:
+                    self.rag.manifest.save()
+            if errors:
+                raise errors[0]
+            with self.rag._lock:
+                if (
+                    stats.embedded or stats.removed
+                ) and self.rag.vectorstore is not None:
+                    self.rag.vectorstore.persist()
+
+        stats.wall_seconds = time.perf_counter() - started
+        logger.info("Statistik ingestion: %s", stats.as_dict())
+        return stats
+
+    def ingest_directory(
+        self, directory_path: str, file_types: Optional[List[str]] = None
+    ) -> PipelineStats:
+        file_types = file_types or list(SUPPORTED_TYPES)
+        file_paths = []
+        for root, _, file_names in os.walk(directory_path):
+            for file_name in sorted(file_names):
+                if file_name.rsplit(".", 1)[-1].lower() in file_types:
+                    file_paths.append(os.path.join(root, file_name))
+        return self.ingest(file_paths)
+
+
+if __name__ == "__main__":
+    from app.RAG import get_rag_system
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else "documents"
+    rag = get_rag_system("data", "my_collections")
+    pipeline = IngestionPipeline(rag)
+    try:
+        pipeline.ingest_directory(directory)
+    finally:
+        pipeline.close()
@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+
+from app.ingestion import hash_text
+from app.tokens import count_message_tokens, message_text
+
+
+def _message_key(message: BaseMessage) -> str:
+    return hash_text(f"{message.type}\x00{message_text(message)}")
+
+
+class PrefixCacheTracker:
+    """Ukur berapa token di awal prompt yang bisa di-cache oleh provider.
+
+    Prefix yang bisa di-cache adalah segmen statis di awal prompt, diperpanjang
+    dengan bagian yang sama persis dengan prompt sebelumnya dari node dan
+    thread yang sama. Token yang benar-benar di-cache provider (jika dilaporkan
+    di usage_metadata) juga dicatat sebagai pembanding.
+    """
+
+    def __init__(
+        self, max_threads: int = 1000, history_size: int = 100, model: str = "gpt-4o"
+    ):
+        self.max_threads = max_threads
+        self.model = model
+        # (node, thread_id) -> hash pesan prompt terakhir
+        self._previous: "OrderedDict[tuple, List[str]]" = OrderedDict()
+        self._recent = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cacheable_tokens = 0
+        self.provider_cached_tokens = 0
+
+    def record(
+        self,
+        node: str,
+        thread_id: Optional[str],
+        messages: Sequence[BaseMessage],
+        static_messages: int = 1,
+        response: Optional[BaseMessage] = None,
+    ) -> Dict:
+        keys = [_message_key(message) for message in messages]
+        with self._lock:
+            previous = self._previous.pop((node, thread_id), [])
+            self._previous[(node, thread_id)] = keys
+            while len(self._previous) > self.max_threads:
+                self._previous.popitem(last=False)
+
+        common = 0
+        for key, previous_key in zip(keys, previous):
+            if key != previous_key:
+                break
+            common += 1
+        # Pesan terakhir (pertanyaan user) tidak pernah dihitung sebagai prefix
+        prefix_messages = min(max(static_messages, common), len(messages) - 1)
+
+        total_tokens = count_message_tokens(messages, self.model)
+        cacheable_tokens = count_message_tokens(messages[:prefix_messages], self.model)
+        provider_cached = _provider_cached_tokens(response)
+        measurement = {
+            "node": node,
+            "thread_id": thread_id,
+            "prompt_tokens": total_tokens,
+            "cacheable_prefix_tokens": cacheable_tokens,
+            "cacheable_ratio": (
+                round(cacheable_tokens / total_tokens, 3) if total_tokens else 0.0
+            ),
+            "provider_cached_tokens": provider_cached,
+        }
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += total_tokens
+            self.cacheable_tokens += cacheable_tokens
+            self.provider_cached_tokens += provider_cached or 0
+            self._recent.append(measurement)
+        return measurement
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cacheable_prefix_tokens": self.cacheable_tokens,
+                "cacheable_ratio": (
+                    round(self.cacheable_tokens / self.prompt_tokens, 3)
+                    if self.prompt_tokens
+                    else 0.0
+                ),
+                "provider_cached_tokens": self.provider_cached_tokens,
+                "recent": list(self._recent)[-10:],
+            }
+
+
+def _provider_cached_tokens(response: Optional[BaseMessage]) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    return details.get("cache_read")
@@ -1,41 +1,22 @@
-from typing import Optional
+import asyncio
+import logging
+from typing import List, Optional
 
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 
-from app.memory import MemoryControl
+from app.config import env_bool, env_float, env_int, env_str
+from app.memory import BufferedMemory, MemoryReadCache, make_memory_backend
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-class AgentPromptControl:
-    def __init__(
-        self,
-        is_include_memory: bool = False,
-        memory_provider: Optional[str] = "",
-        provider_host: Optional[str] = "",
-        provider_port: Optional[str] = "",
-        memory_id: Optional[str] = "default",
-    ):
-        self.is_include_memory = is_include_memory
-        if self.is_include_memory:
-            self.memory = MemoryControl(
-                memory_provider=memory_provider,
-                provider_host=provider_host,
-                provider_port=provider_port,
-            )
-            self.memory_id = memory_id
-
-    def main_agent(self, user_message: str):
-        previous_context = "tidak ada."
-        if self.is_include_memory:
-            previous_context = self.memory.get_context(
-                query=user_message, memory_id=self.memory_id
-            )
-            print(f"===========PREVIOUS CONTEXT=============\n{previous_context}")
-        return [
-            SystemMessage(
-                content=f"""
+# Segmen statis dibuat sekali dan selalu berada di awal prompt, sehingga
+# prefix prompt identik antar request dan bisa di-cache oleh provider LLM.
+# Konten yang berubah (memory, hasil tool, dokumen) selalu ditaruh di akhir.
+MAIN_AGENT_SYSTEM = SystemMessage(
+    content="""
 Kamu adalah asisten pribadi.
 Pastikan kamu mengingat state history messages sebelumnya sebelum menggunakan tool.
 Kamu memiliki akses ke tool berikut:
@@ -48,47 +29,178 @@ Instruksi:
 
 Perlu diingat bahwa jangan terlalu mengandalkan tool untuk menjawab, melainkan kamu bisa menggukanan state messages history untuk menjawab pertanyaan.
 Gunakan tool seperlunya saja.
-
+"""
+)
+MAIN_AGENT_MEMORY_TEMPLATE = """
 percakapan sebelumnya:
 {previous_context}
 """
-            ),
-            HumanMessage(content=user_message),
-        ]
 
-    def agent_describe_document(self, user_message: str, document: str):
-        return [
-            SystemMessage(
-                content="""
+DESCRIBE_DOCUMENT_SYSTEM = SystemMessage(
+    content="""
 Kamu adalah agent yang bertugas untuk mendeskripsikan document yang telah diberikan oleh pengguna.
 Instruksi:
 1. Deskripsikan document dari pengguna dengan jelas dan singkat.
 2. Pastikan deskripsi tersebut sesuai dengan instruksi pengguna(jika ada).
 """
-            ),
-            HumanMessage(
-                content=f"""
+)
+DESCRIBE_DOCUMENT_TEMPLATE = """
 instruksi:{user_message}
 Berikut adalah isi dokumen yang harus kamu deskripsikan:
 {document}
 """
-            ),
-        ]
 
-    def agent_answer_rag_question(self, user_message: str, tool_message: str):
-        return [
-            SystemMessage(
-                content=f"""
+ANSWER_RAG_SYSTEM = SystemMessage(
+    content="""
 Kamu adalah agent yang bertugas untuk menjelaskan hasil pencarian dari agent sebelumnya mengenai document RAG.
+Pastikan kamu menjawab pertanyaan pengguna berdasarkan hasil pencarian document yang diberikan.
+"""
+)
+ANSWER_RAG_TEMPLATE = """
 Berikut adalah hasil pencarian document RAG:
 {tool_message}
-Pastikan kamu menjawab pertanyaan pengguna berdasarkan hasil pencarian document tersebut.
+"""
+
+SUMMARIZE_DOCUMENT_SYSTEM = SystemMessage(
+    content="""
+Kamu adalah agent yang bertugas meringkas bagian dari sebuah dokumen panjang.
+Instruksi:
+1. Ringkas bagian dokumen berikut dengan padat dan jelas.
+2. Pertahankan poin utama, istilah penting, nama, dan angka.
+3. Jangan menambahkan informasi yang tidak ada di dokumen.
+"""
+)
+
+SUMMARIZE_HISTORY_SYSTEM = SystemMessage(
+    content="""
+Kamu adalah agent yang bertugas meringkas percakapan antara pengguna dan asisten.
+Instruksi:
+1. Gabungkan ringkasan sebelumnya dengan percakapan baru menjadi satu ringkasan singkat.
+2. Pertahankan fakta penting: nama, preferensi, dokumen yang dibahas, dan jawaban penting.
+3. Jangan menambahkan informasi yang tidak ada di percakapan.
+"""
+)
+SUMMARIZE_HISTORY_TEMPLATE = """
+ringkasan sebelumnya:
+{previous_summary}
 
+percakapan baru:
+{conversation}
 """
+
+
+class AgentPromptControl:
+    def __init__(
+        self,
+        is_include_memory: bool = False,
+        memory_provider: Optional[str] = "",
+        provider_host: Optional[str] = "",
+        provider_port: Optional[str] = "",
+        memory_id: Optional[str] = "default",
+        embeddings=None,
+    ):
+        self.is_include_memory = is_include_memory
+        if self.is_include_memory:
+            self.memory = make_memory_backend(
+                memory_provider,
+                provider_host=provider_host,
+                provider_port=provider_port,
+                path=env_str("MEMORY_PATH", "data/memory"),
+                top_k=env_int("MEMORY_TOP_K", 3),
+                max_entries=env_int("MEMORY_LOCAL_MAX_ENTRIES", 500),
+                embeddings=embeddings,
+            )
+            if env_bool("MEMORY_WRITE_BEHIND", True):
+                # Penulisan mem0 (ekstraksi LLM + upsert) tidak menahan jawaban
+                self.memory = BufferedMemory(
+                    self.memory,
+                    flush_interval=env_float("MEMORY_FLUSH_INTERVAL_SECONDS", 5.0),
+                    max_batch_turns=env_int("MEMORY_FLUSH_MAX_TURNS", 8),
+                    max_retries=env_int("MEMORY_FLUSH_RETRIES", 3),
+                    read_cache=MemoryReadCache(
+                        ttl_seconds=env_float("MEMORY_READ_CACHE_TTL_SECONDS", 30),
+                        max_entries=env_int("MEMORY_READ_CACHE_SIZE", 256),
+                    ),
+                )
+        # memory_id default, dipakai jika request tidak membawa user/thread id
+        self.memory_id = memory_id
+
+    def memory_stats(self):
+        if not self.is_include_memory or not isinstance(self.memory, BufferedMemory):
+            return None
+        return self.memory.stats()
+
+    def close(self):
+        if self.is_include_memory:
+            self.memory.close()
+
+    def main_agent(self, user_message: str, memory_id: Optional[str] = None):
+        """Prompt main agent: [system statis, konteks memory (opsional), user]."""
+        prompt = [MAIN_AGENT_SYSTEM]
+        if self.is_include_memory:
+            previous_context = (
+                self.memory.get_context(
+                    query=user_message, memory_id=memory_id or self.memory_id
+                )
+                or "tidak ada."
+            )
+            logger.debug("Konteks memory sebelumnya: %s", previous_context)
+            prompt.append(
+                SystemMessage(
+                    content=MAIN_AGENT_MEMORY_TEMPLATE.format(
+                        previous_context=previous_context
+                    )
+                )
+            )
+        prompt.append(HumanMessage(content=user_message))
+        return prompt
+
+    async def amain_agent(self, user_message: str, memory_id: Optional[str] = None):
+        # Pencarian mem0 blocking (LLM + vector store), jalankan di thread lain
+        return await asyncio.to_thread(self.main_agent, user_message, memory_id)
+
+    @staticmethod
+    def compose(prompt: List[BaseMessage], history: List[BaseMessage]):
+        """Sisipkan history setelah segmen statis dan sebelum konten variabel.
+
+        History bertambah di akhir antar giliran, jadi prefix [system + history]
+        tetap sama dengan request sebelumnya di thread yang sama.
+        """
+        return prompt[:1] + history + prompt[1:]
+
+    def agent_describe_document(self, user_message: str, document: str):
+        return [
+            DESCRIBE_DOCUMENT_SYSTEM,
+            HumanMessage(
+                content=DESCRIBE_DOCUMENT_TEMPLATE.format(
+                    user_message=user_message, document=document
+                )
+            ),
+        ]
+
+    def agent_answer_rag_question(self, user_message: str, tool_message: str):
+        return [
+            ANSWER_RAG_SYSTEM,
+            SystemMessage(
+                content=ANSWER_RAG_TEMPLATE.format(tool_message=tool_message)
             ),
             HumanMessage(content=user_message),
         ]
 
+    def summarize_document_chunk(self, chunk: str):
+        return [SUMMARIZE_DOCUMENT_SYSTEM, HumanMessage(content=chunk)]
+
+    def summarize_history(self, previous_summary: str, conversation: str):
+        return [
+            SUMMARIZE_HISTORY_SYSTEM,
+            HumanMessage(
+                content=SUMMARIZE_HISTORY_TEMPLATE.format(
+                    previous_summary=previous_summary or "tidak ada.",
+                    conversation=conversation,
+                )
+            ),
+        ]
+
 
 if __name__ == "__main__":
     prompt = AgentPromptControl(is_include_memory=False)
@@ -0,0 +1,258 @@
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from app.ingestion import hash_text
+from app.lexical import tokenize
+from app.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+RERANKERS = ("none", "lexical", "cross-encoder")
+
+
+def _shingles(text: str, size: int = 5) -> Set[Tuple[str, ...]]:
+    words = tokenize(text)
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def _containment(left: Set, right: Set) -> float:
+    if not left or not right:
+        return 0.0
+    return len(left & right) / min(len(left), len(right))
+
+
+class LexicalReranker:
+    """Re-ranker ringan: gabungan skor awal dengan cakupan kata query di chunk."""
+
+    def __init__(self, weight: float = 0.5):
+        self.weight = weight
+
+    def rerank(
+        self, query: str, candidates: List[Tuple[Document, float]]
+    ) -> List[Tuple[Document, float]]:
+        terms = set(tokenize(query))
+        if not terms:
+            return candidates
+        scored = []
+        for document, score in candidates:
+            coverage = len(terms & set(tokenize(document.page_content))) / len(terms)
+            scored.append(
+                (document, (1 - self.weight) * score + self.weight * coverage)
+            )
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored
+
+
+class CrossEncoderReranker:
+    """Re-ranker cross-encoder lokal (butuh paket sentence-transformers)."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name)
+
+    def rerank(
+        self, query: str, candidates: List[Tuple[Document, float]]
+    ) -> List[Tuple[Document, float]]:
+        if not candidates:
+            return candidates
+        scores = self.model.predict(
+            [(query, document.page_content) for document, _ in candidates]
+        )
+        scored = [
+            (document, float(score)) for (document, _), score in zip(candidates, scores)
+        ]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored
+
+
+def make_reranker(name: str, cross_encoder_model: Optional[str] = None):
+    name = (name or "none").lower()
+    if name not in RERANKERS:
+        raise ValueError(f"RETRIEVAL_RERANKER harus salah satu dari {RERANKERS}")
+    if name == "lexical":
+        return LexicalReranker()
+    if name == "cross-encoder":
+        try:
+            return CrossEncoderReranker(
+                cross_encoder_model or "cross-encoder/ms-marco-MiniLM-L-6-v2"
+            )
+        except ImportError:
+            logger.warning(
+                "sentence-transformers belum terinstall, memakai re-ranker lexical"
+            )
+            return LexicalReranker()
+    return None
+
+
+class RetrievalPipeline:
+    """Pipeline retrieval: over-fetch -> cutoff skor -> MMR dan buang chunk
+    yang hampir sama -> re-rank (opsional) -> packing ke budget token.
+
+    Skor cutoff dan MMR memakai cosine similarity embedding; vector chunk
+    dibaca dari vector store sehingga tidak ada panggilan embedding tambahan.
+    """
+
+    def __init__(
+        self,
+        rag,
+        k: int = 4,
+        fetch_k: int = 12,
+        max_tokens: int = 1500,
+        score_threshold: float = 0.0,
+        mmr_lambda: float = 0.7,
+        duplicate_threshold: float = 0.5,
+        reranker=None,
+    ):
+        self.rag = rag
+        self.k = k
+        self.fetch_k = fetch_k
+        self.max_tokens = max_tokens
+        self.score_threshold = score_threshold
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.reranker = reranker
+
+    def _unique(
+        self, candidates: List[Tuple[Document, float]]
+    ) -> List[Tuple[Document, float]]:
+        seen = set()
+        unique = []
+        for document, score in candidates:
+            content_hash = hash_text(document.page_content)
+            if content_hash in seen:
+                continue
+            seen.add(content_hash)
+            unique.append((document, score))
+        return unique
+
+    def _with_similarity(
+        self, query: str, candidates: List[Tuple[Document, float]]
+    ) -> Tuple[List[Tuple[Document, float]], Optional[np.ndarray]]:
+        query_vector = np.asarray(
+            self.rag.embeddings.embed_query(query), dtype=np.float32
+        )
+        # Vector chunk diambil dari vector store, bukan di-embed ulang
+        vectors = self.rag.chunk_vectors([document for document, _ in candidates])
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+        similarities = vectors @ query_vector
+        keep = [
+            index
+            for index, similarity in enumerate(similarities)
+            if similarity >= self.score_threshold
+        ]
+        return (
+            [(candidates[index][0], float(similarities[index])) for index in keep],
+            vectors[keep],
+        )
+
+    def _is_duplicate(self, shingles: Set, selected_shingles: List[Set]) -> bool:
+        return any(
+            _containment(shingles, other) >= self.duplicate_threshold
+            for other in selected_shingles
+        )
+
+    def _select(
+        self,
+        candidates: List[Tuple[Document, float]],
+        vectors: Optional[np.ndarray],
+        limit: int,
+    ) -> List[Tuple[Document, float]]:
+        # MMR: pilih chunk relevan yang paling berbeda dari chunk yang sudah dipilih
+        selected: List[int] = []
+        selected_shingles: List[Set] = []
+        remaining = list(range(len(candidates)))
+        shingles = [_shingles(document.page_content) for document, _ in candidates]
+        while remaining and len(selected) < limit:
+            best_index = None
+            best_score = None
+            for index in remaining:
+                score = candidates[index][1]
+                if vectors is not None and selected:
+                    redundancy = float(np.max(vectors[selected] @ vectors[index]))
+                    score = self.mmr_lambda * score - (1 - self.mmr_lambda) * redundancy
+                if best_score is None or score > best_score:
+                    best_index, best_score = index, score
+            remaining.remove(best_index)
+            if self._is_duplicate(shingles[best_index], selected_shingles):
+                continue
+            selected.append(best_index)
+            selected_shingles.append(shingles[best_index])
+        return [candidates[index] for index in selected]
+
+    def _pack(
+        self, candidates: List[Tuple[Document, float]], k: int, max_tokens: int
+    ) -> List[Document]:
+        documents = []
+        used_tokens = 0
+        for document, score in candidates:
+            tokens = count_tokens(document.page_content)
+            if documents and used_tokens + tokens > max_tokens:
+                continue
+            used_tokens += tokens
+            documents.append(
+                Document(
+                    page_content=document.page_content,
+                    metadata={**document.metadata, "score": float(score)},
+                )
+            )
+            if len(documents) >= k:
+                break
+        return documents
+
+    def run(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        fetch_k: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        filter: Optional[Dict[str, str]] = None,
+    ) -> List[Document]:
+        k = k or self.k
+        fetch_k = max(fetch_k or self.fetch_k, k)
+        max_tokens = max_tokens or self.max_tokens
+
+        vectors = None
+        candidates = self._unique(
+            self.rag.keyword_search(query, k=fetch_k, filter=filter)
+        )
+        if candidates:
+            # Query kata kunci dijawab BM25 tanpa embedding, jadi cutoff
+            # similarity dan MMR dilewati. Skor BM25 dinormalisasi ke 0..1
+            top_score = candidates[0][1]
+            candidates = [
+                (document, score / top_score) for document, score in candidates
+            ]
+        else:
+            candidates = self._unique(
+                self.rag.hybrid_search(query, k=fetch_k, filter=filter)
+            )
+            if not candidates:
+                return []
+            candidates, vectors = self._with_similarity(query, candidates)
+
+        # Sisakan kandidat cadangan untuk re-ranker dan packing
+        candidates = self._select(candidates, vectors, limit=k * 2)
+        if self.reranker is not None:
+            candidates = self.reranker.rerank(query, candidates)
+        return self._pack(candidates, k, max_tokens)
+
+
+class PipelineRetriever(BaseRetriever):
+    """Retriever LangChain yang memakai RetrievalPipeline (untuk RetrievalQA)."""
+
+    pipeline: Any
+    filter: Optional[Dict[str, str]] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.pipeline.run(query, filter=self.filter)
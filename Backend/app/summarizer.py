@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import List, Optional
+
+from app.ingestion import hash_text
+from app.telemetry import telemetry
+from app.tokens import count_tokens, split_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_CONFIG = {"tags": ["nostream"], "run_name": "summarize_document"}
+
+
+class DocumentSummarizer:
+    """Meringkas dokumen besar secara map-reduce.
+
+    Dokumen dipecah berdasarkan budget token, tiap bagian diringkas secara
+    paralel (dengan batas konkurensi), lalu ringkasan digabung dan diringkas
+    lagi bertingkat sampai muat di max_input_tokens. Ringkasan tiap bagian
+    di-cache berdasarkan hash isinya.
+    """
+
+    def __init__(
+        self,
+        llm,
+        prompts,
+        chunk_tokens: int = 3000,
+        max_input_tokens: int = 6000,
+        max_concurrency: int = 4,
+        cache_size: int = 1024,
+        model: str = "gpt-3.5-turbo",
+    ):
+        self.llm = llm
+        self.prompts = prompts
+        self.chunk_tokens = chunk_tokens
+        self.max_input_tokens = max(max_input_tokens, chunk_tokens)
+        self.max_concurrency = max(1, max_concurrency)
+        self.cache_size = cache_size
+        self.model = model
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            summary = self._cache.get(key)
+            if summary is not None:
+                self._cache.move_to_end(key)
+            return summary
+
+    def _cache_set(self, key: str, summary: str):
+        with self._lock:
+            self._cache[key] = summary
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _fits(self, text: str) -> bool:
+        return count_tokens(text, self.model) <= self.max_input_tokens
+
+    def _split(self, text: str) -> List[str]:
+        return split_tokens(text, self.chunk_tokens, self.model)
+
+    def _reduce_level(self, text: str, summaries: List[str], level: int) -> str:
+        reduced = "\n\n".join(summaries)
+        logger.debug("Ringkasan level %s: %s bagian", level, len(summaries))
+        if count_tokens(reduced, self.model) >= count_tokens(text, self.model):
+            # Ringkasan tidak memendekkan teks, potong agar loop berhenti
+            return truncate_tokens(reduced, self.max_input_tokens, self.model)
+        return reduced
+
+    def _summarize_chunk(self, chunk: str) -> str:
+        key = hash_text(chunk)
+        summary = self._cache_get(key)
+        if summary is None:
+            response = self.llm.invoke(
+                self.prompts.summarize_document_chunk(chunk), config=SUMMARY_CONFIG
+            )
+            telemetry.record_llm(getattr(self.llm, "model_name", None), response)
+            summary = response.content
+            self._cache_set(key, summary)
+        return summary
+
+    async def _asummarize_chunk(self, chunk: str, semaphore: asyncio.Semaphore) -> str:
+        key = hash_text(chunk)
+        summary = self._cache_get(key)
+        if summary is None:
+            async with semaphore:
+                response = await self.llm.ainvoke(
+                    self.prompts.summarize_document_chunk(chunk),
+                    config=SUMMARY_CONFIG,
+                )
+            telemetry.record_llm(getattr(self.llm, "model_name", None), response)
+            summary = response.content
+            self._cache_set(key, summary)
+        return summary
+
+    def condense(self, text: str) -> str:
+        """Kembalikan teks yang muat di max_input_tokens (teks asli jika sudah muat)."""
+        if self._fits(text):
+            return text
+        level = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while not self._fits(text):
+                chunks = self._split(text)
+                # Context disalin per chunk agar span telemetry ikut ke thread
+                contexts = [copy_context() for _ in chunks]
+                summaries = list(
+                    executor.map(
+                        lambda context, chunk: context.run(
+                            self._summarize_chunk, chunk
+                        ),
+                        contexts,
+                        chunks,
+                    )
+                )
+                level += 1
+                text = self._reduce_level(text, summaries, level)
+        return text
+
+    async def acondense(self, text: str) -> str:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        level = 0
+        while not self._fits(text):
+            chunks = self._split(text)
+            summaries = await asyncio.gather(
+                *(self._asummarize_chunk(chunk, semaphore) for chunk in chunks)
+            )
+            level += 1
+            text = self._reduce_level(text, summaries, level)
+        return text
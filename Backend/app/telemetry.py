@@ -0,0 +1,284 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from app.config import env_bool, env_int, env_str
+
+# Harga per 1 juta token dalam USD: (input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-3.5-turbo-instruct": (1.5, 2.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "text-embedding-ada-002": (0.1, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICS = {
+    "node_duration_seconds": ("histogram", "Wall time per node graph"),
+    "node_errors_total": ("counter", "Jumlah node yang gagal"),
+    "llm_requests_total": ("counter", "Jumlah panggilan LLM"),
+    "llm_prompt_tokens_total": ("counter", "Token prompt yang dikirim ke LLM"),
+    "llm_completion_tokens_total": ("counter", "Token jawaban dari LLM"),
+    "llm_cached_prompt_tokens_total": (
+        "counter",
+        "Token prompt yang dilaporkan di-cache oleh provider",
+    ),
+    "llm_cost_usd_total": ("counter", "Perkiraan biaya LLM dalam USD"),
+    "embedding_requests_total": ("counter", "Jumlah panggilan API embedding"),
+    "embedding_texts_total": ("counter", "Jumlah teks yang di-embed oleh provider"),
+    "embedding_duration_seconds": ("histogram", "Durasi panggilan API embedding"),
+    "embedding_batch_retries_total": (
+        "counter",
+        "Batch embedding yang dikirim ulang setelah gagal",
+    ),
+    "search_duration_seconds": ("histogram", "Durasi query ke vector store dan BM25"),
+    "cache_requests_total": ("counter", "Hit dan miss per cache"),
+    "limiter_wait_seconds": (
+        "histogram",
+        "Waktu tunggu di antrian limiter sebelum request dikirim",
+    ),
+    "limiter_in_flight": ("gauge", "Request yang sedang berjalan per model"),
+    "limiter_waiting": ("gauge", "Request yang menunggu slot per model"),
+    "limiter_rate_limited_total": ("counter", "Jumlah respons 429 per model"),
+    "limiter_coalesced_total": (
+        "counter",
+        "Request yang memakai hasil prompt identik yang sedang berjalan",
+    ),
+}
+
+_current_span: ContextVar[Optional[Dict]] = ContextVar("current_span", default=None)
+
+
+def model_price(model: Optional[str]) -> Tuple[float, float]:
+    # Nama model dari provider memakai suffix tanggal, cocokkan prefix terpanjang
+    matches = [name for name in MODEL_PRICES if model and model.startswith(name)]
+    if not matches:
+        return (0.0, 0.0)
+    return MODEL_PRICES[max(matches, key=len)]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple, extra: str = "") -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class MetricsRegistry:
+    """Counter, gauge, dan histogram sederhana dengan format teks Prometheus.
+
+    Gauge diubah lewat inc dengan nilai positif atau negatif."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # nama -> label -> nilai (counter) atau [bucket..., sum, count] (histogram)
+        self._values: Dict[str, Dict[Tuple, object]] = {name: {} for name in METRICS}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, (kind, help_text) in METRICS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in self._values[name].items():
+                    if kind != "histogram":
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                        continue
+                    bounds = [f'le="{bound}"' for bound in self.buckets]
+                    for bound, count in zip(
+                        bounds + ['le="+Inf"'], value[:-2] + [value[-1]]
+                    ):
+                        lines.append(
+                            f"{name}_bucket{_format_labels(labels, bound)} {count}"
+                        )
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value[-2]}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+class Telemetry:
+    """Span per node, token, biaya, embedding, query Chroma, dan hit cache.
+
+    Span aktif disimpan di ContextVar sehingga pemanggilan di dalam node
+    (termasuk lewat asyncio.to_thread) otomatis tercatat untuk thread_id yang
+    sama. Label Prometheus tidak memakai thread_id agar jumlah seri tetap
+    kecil; rincian per thread tersedia lewat thread_stats dan span log JSON.
+    """
+
+    def __init__(
+        self,
+        span_log: bool = False,
+        span_log_path: Optional[str] = None,
+        max_threads: int = 1000,
+    ):
+        self.metrics = MetricsRegistry()
+        self.max_threads = max_threads
+        self._threads: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.span_logger = self._setup_span_logger(span_log_path) if span_log else None
+
+    @staticmethod
+    def _setup_span_logger(path: Optional[str]):
+        span_logger = logging.getLogger("app.spans")
+        span_logger.setLevel(logging.INFO)
+        span_logger.propagate = False
+        if not span_logger.handlers:
+            handler = logging.FileHandler(path) if path else logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            span_logger.addHandler(handler)
+        return span_logger
+
+    @contextmanager
+    def span(self, name: str, thread_id: Optional[str] = None, **attributes):
+        span = {"span": name, "thread_id": thread_id, **attributes}
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span["error"] = type(e).__name__
+            self.metrics.inc("node_errors_total", node=name)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            _current_span.reset(token)
+            self.metrics.observe("node_duration_seconds", duration, node=name)
+            self._add_thread_totals(
+                thread_id, {f"{name}_seconds": duration, "nodes": 1}
+            )
+            if self.span_logger is not None:
+                span["duration_ms"] = round(duration * 1000, 3)
+                span["timestamp"] = time.time()
+                self.span_logger.info(json.dumps(span, default=str))
+
+    def _add_thread_totals(self, thread_id: Optional[str], values: Dict[str, float]):
+        if thread_id is None:
+            return
+        with self._lock:
+            totals = self._threads.pop(thread_id, None) or {}
+            self._threads[thread_id] = totals
+            for key, value in values.items():
+                totals[key] = totals.get(key, 0) + value
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def _record(self, values: Dict[str, float]):
+        span = _current_span.get()
+        if span is None:
+            return
+        with self._lock:
+            for key, value in values.items():
+                span[key] = span.get(key, 0) + value
+        self._add_thread_totals(span.get("thread_id"), values)
+
+    def record_llm(self, model: Optional[str], response) -> Dict[str, float]:
+        usage = getattr(response, "usage_metadata", None) or {}
+        metadata = getattr(response, "response_metadata", None) or {}
+        if metadata.get("coalesced"):
+            # Hasil bersama dari prompt identik, token sudah dicatat oleh pemanggil
+            # pertama
+            return {}
+        model = metadata.get("model_name") or model or "unknown"
+        prompt_tokens = usage.get("input_tokens", 0)
+        completion_tokens = usage.get("output_tokens", 0)
+        cached_tokens = (usage.get("input_token_details") or {}).get("cache_read") or 0
+        input_price, output_price = model_price(model)
+        cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1e6
+
+        span = _current_span.get()
+        node = span["span"] if span else "other"
+        labels = {"node": node, "model": model}
+        self.metrics.inc("llm_requests_total", **labels)
+        self.metrics.inc("llm_prompt_tokens_total", prompt_tokens, **labels)
+        self.metrics.inc("llm_completion_tokens_total", completion_tokens, **labels)
+        self.metrics.inc("llm_cached_prompt_tokens_total", cached_tokens, **labels)
+        self.metrics.inc("llm_cost_usd_total", cost, **labels)
+        values = {
+            "llm_calls": 1,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_prompt_tokens": cached_tokens,
+            "cost_usd": cost,
+        }
+        self._record(values)
+        return values
+
+    def record_embedding(self, model: Optional[str], texts: int, seconds: float):
+        model = model or "unknown"
+        self.metrics.inc("embedding_requests_total", model=model)
+        self.metrics.inc("embedding_texts_total", texts, model=model)
+        self.metrics.observe("embedding_duration_seconds", seconds, model=model)
+        self._record({"embedding_calls": 1, "embedding_texts": texts})
+
+    def record_cache(self, cache: str, hit: bool, count: int = 1):
+        if count <= 0:
+            return
+        result = "hit" if hit else "miss"
+        self.metrics.inc("cache_requests_total", count, cache=cache, result=result)
+        self._record({f"{cache}_cache_{result}": count})
+
+    @contextmanager
+    def timed_search(self, backend: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            self.metrics.observe("search_duration_seconds", duration, backend=backend)
+            self._record({f"{backend}_query_seconds": duration})
+
+    def thread_stats(self, thread_id: str) -> Optional[Dict[str, float]]:
+        with self._lock:
+            totals = self._threads.get(thread_id)
+            return dict(totals) if totals is not None else None
+
+
+def configure_logging():
+    """Level log aplikasi diatur lewat LOG_LEVEL; log per request ada di level
+    DEBUG. Library pihak ketiga tetap di WARNING."""
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    level = env_str("LOG_LEVEL", "INFO").upper()
+    for name in ("app", "main", "__main__"):
+        logging.getLogger(name).setLevel(level)
+
+
+telemetry = Telemetry(
+    span_log=env_bool("SPAN_LOG", False),
+    span_log_path=env_str("SPAN_LOG_PATH"),
+    max_threads=env_int("TELEMETRY_MAX_THREADS", 1000),
+)
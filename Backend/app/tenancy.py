@@ -0,0 +1,94 @@
+import os
+from typing import Dict, Optional
+
+from app.ingestion import hash_text
+
+# "none": semua user memakai satu collection dan satu folder dokumen
+# "filter": satu collection, chunk diberi metadata tenant_id dan setiap query
+#           difilter di dalam Chroma/BM25
+# "collection": satu collection (beserta index BM25 dan manifest) per tenant
+TENANT_MODES = ("none", "filter", "collection")
+
+
+def tenant_key(tenant_id: str) -> str:
+    # Aman untuk nama folder dan nama collection Chroma ([a-zA-Z0-9._-])
+    return hash_text(tenant_id)[:16]
+
+
+def tenant_directory(
+    directory_path: str, tenant_id: Optional[str], mode: str = "none"
+) -> str:
+    """Folder upload milik tenant; mode "none" memakai folder bersama."""
+    if mode == "none" or not tenant_id:
+        return directory_path
+    return os.path.join(directory_path, tenant_key(tenant_id))
+
+
+class TenantScope:
+    """Tentukan collection, folder upload, metadata, dan filter retrieval
+    untuk satu request berdasarkan configurable dari graph.
+
+    Tenant adalah user_id, atau thread_id jika request tanpa user (dokumen
+    dipisah per sesi). document_name di configurable membatasi retrieval ke
+    satu dokumen milik tenant tersebut.
+    """
+
+    def __init__(
+        self,
+        directory_path: str,
+        chromadb_path: str,
+        collection_name: str,
+        mode: str = "none",
+    ):
+        mode = (mode or "none").lower()
+        if mode not in TENANT_MODES:
+            raise ValueError(f"TENANT_MODE harus salah satu dari {TENANT_MODES}")
+        self.directory_path = directory_path
+        self.chromadb_path = chromadb_path
+        self.collection_name = collection_name
+        self.mode = mode
+
+    def tenant_id(self, config: Dict) -> Optional[str]:
+        if self.mode == "none":
+            return None
+        configurable = config.get("configurable", {})
+        return configurable.get("user_id") or configurable.get("thread_id")
+
+    def is_scoped(self, config: Dict) -> bool:
+        return self.tenant_id(config) is not None or bool(
+            config.get("configurable", {}).get("document_name")
+        )
+
+    def collection(self, config: Dict) -> str:
+        tenant_id = self.tenant_id(config)
+        if self.mode != "collection" or tenant_id is None:
+            return self.collection_name
+        return f"{self.collection_name}_{tenant_key(tenant_id)}"
+
+    def rag(self, config: Dict):
+        """Context manager: RAGSystem untuk collection request ini."""
+        from app.RAG import use_rag_system
+
+        return use_rag_system(self.chromadb_path, self.collection(config))
+
+    def directory(self, config: Dict) -> str:
+        return tenant_directory(self.directory_path, self.tenant_id(config), self.mode)
+
+    def document_path(self, config: Dict, document_name: str) -> str:
+        return os.path.join(self.directory(config), document_name)
+
+    def metadata(self, config: Dict) -> Optional[Dict[str, str]]:
+        """Metadata tambahan untuk setiap chunk saat ingestion."""
+        tenant_id = self.tenant_id(config)
+        if self.mode != "filter" or tenant_id is None:
+            return None
+        return {"tenant_id": tenant_id}
+
+    def search_filter(self, config: Dict) -> Optional[Dict[str, str]]:
+        """Filter metadata untuk retrieval: tenant (mode filter) dan dokumen."""
+        search_filter = dict(self.metadata(config) or {})
+        document_name = config.get("configurable", {}).get("document_name")
+        if document_name:
+            # Metadata source berisi path file saat diindex
+            search_filter["source"] = self.document_path(config, document_name)
+        return search_filter or None
@@ -0,0 +1,80 @@
+import logging
+from functools import lru_cache
+from typing import List, Sequence
+
+from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o"
+# Perkiraan overhead format chat per pesan (role, pemisah)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Tanpa file encoding (misal offline) pakai perkiraan 4 karakter per token
+        logger.warning("tiktoken tidak tersedia, memakai perkiraan jumlah token: %s", e)
+        return None
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    # Konten multimodal: ambil bagian teksnya saja
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in content
+    )
+
+
+def count_message_tokens(
+    messages: Sequence[BaseMessage], model: str = DEFAULT_MODEL
+) -> int:
+    total = 0
+    for message in messages:
+        total += MESSAGE_OVERHEAD_TOKENS + count_tokens(message_text(message), model)
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            total += count_tokens(str(tool_call.get("args", "")), model)
+    return total
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    encoding = _get_encoding(model)
+    if encoding is None:
+        max_chars = max_tokens * 4
+        return text if len(text) <= max_chars else text[:max_chars]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def split_tokens(text: str, chunk_tokens: int, model: str = DEFAULT_MODEL) -> List[str]:
+    encoding = _get_encoding(model)
+    if encoding is None:
+        size = chunk_tokens * 4
+        return [text[i : i + size] for i in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [
+        encoding.decode(tokens[i : i + chunk_tokens])
+        for i in range(0, len(tokens), chunk_tokens)
+    ]
@@ -1,37 +1,92 @@
-from app.RAG import RAGSystem
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Optional
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
+
+from app.config import env_int, env_str
+from app.RAG import get_rag_system
+from app.tenancy import TenantScope
+
+logger = logging.getLogger(__name__)
+
+# "retrieval": tool hanya mengembalikan chunk, jawaban dibuat oleh agent berikutnya
+# "qa": tool menjalankan RetrievalQA (satu panggilan LLM tambahan)
+TOOL_MODES = ("retrieval", "qa")
 
 
 class AgentTools:
-    def __init__(self, chromadb_path: str, collection_name: str):
+    def __init__(
+        self,
+        chromadb_path: str,
+        collection_name: str,
+        mode: Optional[str] = None,
+        tenancy: Optional[TenantScope] = None,
+    ):
         self.chromadb_path = chromadb_path
         self.collection_name = collection_name
-        self.rag = RAGSystem(self.chromadb_path, self.collection_name)
+        self.tenancy = tenancy
+        self.mode = (mode or env_str("RAG_TOOL_MODE", "retrieval")).lower()
+        if self.mode not in TOOL_MODES:
+            raise ValueError(f"RAG_TOOL_MODE harus salah satu dari {TOOL_MODES}")
+        self.retrieval_k = env_int("RETRIEVAL_K", 4)
+        self.retrieval_max_tokens = env_int("RETRIEVAL_MAX_TOKENS", 1500)
+        self.rag = get_rag_system(self.chromadb_path, self.collection_name)
+        self.get_document_tool = StructuredTool.from_function(
+            func=self.get_document,
+            coroutine=self.aget_document,
+            name="get_document",
+        )
+
+    @contextmanager
+    def _scope(self, config: Optional[RunnableConfig]):
+        if self.tenancy is None or config is None:
+            yield self.rag, None
+            return
+        with self.tenancy.rag(config) as rag:
+            yield rag, self.tenancy.search_filter(config)
 
-    def get_document(self, query: str):
+    def get_document(self, query: str, config: RunnableConfig = None):
         """Gunakan tool untuk mencari informasi dokumen yang telah diberikan oleh pengguna."""
+        # config diisi otomatis oleh LangChain dan tidak terlihat oleh LLM
         try:
-            get_document = self.rag.query(query)
-            if not get_document:
-                list_docs = []
-                documents = self.rag.similarity_search(query)
-                for document in documents:
-                    detail_doc = {
-                        "source": document.metadata["source"],
-                        "page": document.metadata["page"],
-                        "content": document.page_content,
-                    }
-                    list_docs.append(detail_doc)
-
-                get_document = "Berikut adalah hasil search dari document:"
-                for item in list_docs:
-                    get_document += f"\n**PAGE {item['page']}**\n- source: {item['source']}\n-content: {item['content']}\n"
-
-                print(get_document)
-            return get_document
+            with self._scope(config) as (rag, search_filter):
+                return self._get_document(rag, query, search_filter)
         except Exception as e:
-            print(f"Terjadi kesalahan di tool get_document: {e}")
+            logger.error("Terjadi kesalahan di tool get_document: %s", e)
             return f"Terjadi kesalahan saat query ke document {e}"
 
+    def _get_document(self, rag, query: str, search_filter):
+        get_document = False
+        if self.mode == "qa":
+            get_document = rag.query(query, filter=search_filter)
+        if not get_document:
+            documents = rag.retrieve(
+                query,
+                k=self.retrieval_k,
+                max_tokens=self.retrieval_max_tokens,
+                filter=search_filter,
+            )
+            get_document = self._format_documents(documents)
+        return get_document
+
+    def _format_documents(self, documents) -> str:
+        if not documents:
+            return "Tidak ditemukan bagian dokumen yang relevan."
+        get_document = "Berikut adalah hasil search dari document:"
+        for document in documents:
+            page = document.metadata.get("page", "-")
+            source = document.metadata.get("source", "-")
+            get_document += f"\n**PAGE {page}**\n- source: {source}\n-content: {document.page_content}\n"
+        return get_document
+
+    async def aget_document(self, query: str, config: RunnableConfig = None):
+        """Gunakan tool untuk mencari informasi dokumen yang telah diberikan oleh pengguna."""
+        # Query Chroma dan RetrievalQA masih blocking
+        return await asyncio.to_thread(self.get_document, query, config)
+
 
 if __name__ == "__main__":
     tool = AgentTools()
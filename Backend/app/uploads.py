@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Field form selain file (message, thread_id, user_id) cukup kecil
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+class UploadTooLarge(InvalidUpload):
+    pass
+
+
+@dataclass
+class UploadedFile:
+    filename: str
+    content_type: Optional[str]
+    temp_path: str
+    sha256: str
+    size: int
+
+
+@dataclass
+class _FilePart:
+    filename: str
+    content_type: Optional[str]
+    temp_path: str
+    output: object
+    digest: object
+    size: int = 0
+
+
+def discard_upload(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class MultipartUpload:
+    """Parse body multipart/form-data langsung dari request.stream().
+
+    Isi file ditulis ke file sementara di temp_directory sambil dihitung
+    sha256, dan batas ukuran dicek saat byte datang, jadi body tidak pernah
+    di-spool utuh lebih dulu (juga untuk upload chunked tanpa Content-Length).
+    Hanya satu file dari field file_field yang disimpan.
+    """
+
+    def __init__(
+        self,
+        content_type: str,
+        temp_directory: str,
+        max_file_bytes: int,
+        file_field: str = "file",
+    ):
+        _, options = parse_options_header(content_type)
+        boundary = options.get(b"boundary")
+        if not boundary:
+            raise InvalidUpload("Boundary multipart tidak ditemukan")
+        self.temp_directory = temp_directory
+        self.max_file_bytes = max_file_bytes
+        self.file_field = file_field
+        self.fields: Dict[str, str] = {}
+        self.file: Optional[UploadedFile] = None
+        self._events = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        # Part yang sedang dibaca: (name, bytearray) untuk field, _FilePart,
+        # atau "skip" untuk file lain yang diabaikan
+        self._part = None
+        self._parser = MultipartParser(
+            boundary,
+            callbacks={
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+            },
+        )
+
+    # Callback parser bersifat sync; event diproses async setelah setiap chunk
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        self._events.append(("begin", self._headers))
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        self._events.append(("data", data[start:end]))
+
+    def _on_part_end(self):
+        self._events.append(("end", None))
+
+    async def parse(
+        self, stream: AsyncIterator[bytes]
+    ) -> Tuple[Dict[str, str], Optional[UploadedFile]]:
+        try:
+            async for chunk in stream:
+                self._parser.write(chunk)
+                await self._process()
+            self._parser.finalize()
+            await self._process()
+            if self._part is not None:
+                raise InvalidUpload("Body multipart tidak lengkap")
+        except BaseException:
+            await asyncio.to_thread(self._discard)
+            raise
+        return self.fields, self.file
+
+    async def _process(self):
+        events, self._events = self._events, []
+        for kind, value in events:
+            if kind == "begin":
+                await self._begin_part(value)
+            elif kind == "data":
+                await self._part_data(value)
+            else:
+                await self._end_part()
+
+    async def _begin_part(self, headers: Dict[bytes, bytes]):
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" not in options:
+            self._part = (name, bytearray())
+            return
+        if name != self.file_field or self.file is not None:
+            self._part = "skip"
+            return
+        temp_path = os.path.join(self.temp_directory, f".{uuid.uuid4().hex}.part")
+        self._part = _FilePart(
+            filename=options[b"filename"].decode("utf-8", "replace"),
+            content_type=headers.get(b"content-type", b"").decode("latin-1") or None,
+            temp_path=temp_path,
+            output=await asyncio.to_thread(open, temp_path, "wb"),
+            digest=hashlib.sha256(),
+        )
+
+    async def _part_data(self, data: bytes):
+        part = self._part
+        if isinstance(part, tuple):
+            part[1].extend(data)
+            if len(part[1]) > MAX_FIELD_BYTES:
+                raise InvalidUpload(f"Field {part[0]} terlalu besar")
+        elif isinstance(part, _FilePart):
+            part.size += len(data)
+            if part.size > self.max_file_bytes:
+                raise UploadTooLarge("Ukuran file terlalu besar")
+            part.digest.update(data)
+            await asyncio.to_thread(part.output.write, data)
+
+    async def _end_part(self):
+        part, self._part = self._part, None
+        if isinstance(part, tuple):
+            self.fields[part[0]] = part[1].decode("utf-8", "replace")
+        elif isinstance(part, _FilePart):
+            await asyncio.to_thread(part.output.close)
+            self.file = UploadedFile(
+                part.filename,
+                part.content_type,
+                part.temp_path,
+                part.digest.hexdigest(),
+                part.size,
+            )
+
+    def _discard(self):
+        if isinstance(self._part, _FilePart):
+            self._part.output.close()
+            discard_upload(self._part.temp_path)
+        if self.file is not None:
+            discard_upload(self.file.temp_path)
@@ -0,0 +1,661 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from app.lexical import FILTER_FIELDS
+
+logger = logging.getLogger(__name__)
+
+VECTOR_STORES = ("chroma", "numpy")
+QUANTIZATION_MODES = ("none", "int8")
+# Jumlah baris int8 yang diubah ke float32 sekaligus saat scan
+SCAN_BLOCK_ROWS = 4096
+
+
+class VectorStore:
+    """Interface vector store di belakang RAGSystem.
+
+    Skor hasil search adalah jarak L2 kuadrat (default Chroma): semakin kecil
+    semakin relevan. filter berbentuk {field: nilai} dan dicocokkan persis.
+    """
+
+    name = "vector"
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def add(self, documents: List[Document], ids: List[str]) -> List[str]:
+        """Tambah chunk yang id-nya belum ada; kembalikan id yang ditambahkan."""
+        existing = self.existing_ids(ids)
+        new_items = [
+            (chunk_id, document)
+            for chunk_id, document in zip(ids, documents)
+            if chunk_id not in existing
+        ]
+        if new_items:
+            self.upsert(
+                [document for _, document in new_items],
+                [chunk_id for chunk_id, _ in new_items],
+            )
+        return [chunk_id for chunk_id, _ in new_items]
+
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        raise NotImplementedError
+
+    def upsert(self, documents: List[Document], ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def search(
+        self, vector: List[float], k: int, filter: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[Document, float]]:
+        raise NotImplementedError
+
+    def get_all(self) -> Tuple[List[str], List[Document]]:
+        raise NotImplementedError
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Vector tersimpan per id; id yang tidak ada tidak dikembalikan."""
+        return {}
+
+    def persist(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def chroma_where(filter: Optional[Dict[str, str]]) -> Optional[Dict]:
+    """Ubah filter {field: nilai} ke format where Chroma."""
+    if not filter:
+        return None
+    if len(filter) == 1:
+        return dict(filter)
+    return {"$and": [{key: value} for key, value in filter.items()]}
+
+
+class ChromaVectorStore(VectorStore):
+    """Collection Chroma lewat wrapper LangChain (backend default)."""
+
+    name = "chroma"
+
+    def __init__(self, persist_directory: str, collection_name: str, embeddings):
+        from langchain.vectorstores import Chroma
+
+        self.store = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=embeddings,
+            collection_name=collection_name,
+        )
+
+    def count(self) -> int:
+        return self.store._collection.count()
+
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        if not ids:
+            return set()
+        return set(self.store._collection.get(ids=ids, include=[])["ids"])
+
+    def upsert(self, documents: List[Document], ids: List[str]) -> None:
+        # Chroma melakukan upsert berdasarkan ID
+        self.store.add_documents(documents, ids=ids)
+
+    def delete(self, ids: List[str]) -> None:
+        self.store.delete(ids=ids)
+
+    def search(
+        self, vector: List[float], k: int, filter: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[Document, float]]:
+        # Filter dijalankan di dalam query Chroma, bukan setelah hasil diambil
+        return self.store.similarity_search_by_vector_with_relevance_scores(
+            vector, k=k, filter=chroma_where(filter)
+        )
+
+    def get_all(self) -> Tuple[List[str], List[Document]]:
+        data = self.store.get(include=["documents", "metadatas"])
+        documents = [
+            Document(page_content=content, metadata=metadata or {})
+            for content, metadata in zip(data["documents"], data["metadatas"])
+        ]
+        return data["ids"], documents
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        if not ids:
+            return {}
+        data = self.store._collection.get(ids=ids, include=["embeddings"])
+        return {
+            chunk_id: np.asarray(vector, dtype=np.float32)
+            for chunk_id, vector in zip(data["ids"], data["embeddings"])
+        }
+
+    def persist(self) -> None:
+        self.store.persist()
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Scalar quantization simetris per baris: x ~ scale * code, code int8."""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _top_indices(distances: np.ndarray, valid: Optional[np.ndarray], k: int):
+    if valid is not None:
+        distances = np.where(valid, distances, np.inf)
+    k = min(k, len(distances))
+    if k == 0:
+        return np.empty(0, dtype=np.int64), distances
+    top = np.argpartition(distances, k - 1)[:k]
+    return top[np.argsort(distances[top])], distances
+
+
+def _load_hnswlib():
+    try:
+        import hnswlib
+
+        return hnswlib
+    except ImportError:
+        return None
+
+
+class NumpyVectorStore(VectorStore):
+    """Vector store embedded: matriks float32 di file memory-mapped, isi dan
+    metadata chunk di SQLite.
+
+    Pencarian brute-force memakai satu perkalian matriks (numpy) atas baris
+    yang aktif. Jika hnsw=True dan hnswlib terpasang, collection dengan
+    minimal hnsw_min_rows baris dicari lewat index HNSW. Filter metadata
+    memakai inverted index untuk FILTER_FIELDS; subset kecil dicari exact.
+    Baris yang dihapus dipakai ulang oleh chunk berikutnya.
+
+    quantization="int8" menyimpan salinan int8 (plus satu scale per baris)
+    yang dipakai untuk scan brute-force: memory yang disentuh per query
+    sekitar 4x lebih kecil. rescore_factor * k kandidat teratas lalu dihitung
+    ulang dengan vector float32 asli sehingga urutan akhir tetap exact.
+    """
+
+    name = "numpy"
+    # Hasil filter sebanyak ini atau kurang dicari exact walaupun ada HNSW
+    exact_rows = 10000
+
+    def __init__(
+        self,
+        persist_directory: str,
+        collection_name: str,
+        embeddings,
+        hnsw: bool = False,
+        hnsw_min_rows: int = 20000,
+        hnsw_ef: int = 128,
+        quantization: str = "none",
+        rescore_factor: int = 4,
+    ):
+        quantization = (quantization or "none").lower()
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Quantization harus salah satu dari {QUANTIZATION_MODES}")
+        self.directory = os.path.join(persist_directory, f"{collection_name}_vectors")
+        os.makedirs(self.directory, exist_ok=True)
+        self.embeddings = embeddings
+        self.hnsw_min_rows = hnsw_min_rows
+        self.hnsw_ef = hnsw_ef
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        self._hnswlib = _load_hnswlib() if hnsw else None
+        if hnsw and self._hnswlib is None:
+            logger.warning("hnswlib tidak terpasang, memakai pencarian brute-force")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            os.path.join(self.directory, "chunks.sqlite"), check_same_thread=False
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, row INTEGER NOT NULL, content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._matrix_path = os.path.join(self.directory, "vectors.f32")
+        self._codes_path = os.path.join(self.directory, "vectors.i8")
+        self._scales_path = os.path.join(self.directory, "scales.f32")
+        self._hnsw_path = os.path.join(self.directory, "hnsw.bin")
+        self.dim: Optional[int] = None
+        self._matrix: Optional[np.memmap] = None
+        self._codes: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._valid = np.zeros(0, dtype=bool)
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._high = 0
+        self._fields: Dict[Tuple[str, str], Set[int]] = defaultdict(set)
+        self._row_fields: Dict[int, List[Tuple[str, str]]] = {}
+        self._hnsw = None
+        # Naik setiap ada perubahan, untuk mendeteksi file HNSW yang basi
+        self._version = 0
+        self._load()
+
+    # Penyimpanan
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    def _load(self):
+        dim = self._meta("dim")
+        if dim is None:
+            return
+        self.dim = int(dim)
+        self._version = int(self._meta("version") or 0)
+        self._open_matrix()
+        rows = self._conn.execute("SELECT id, row, metadata FROM chunks").fetchall()
+        self._high = max((row for _, row, _ in rows), default=-1) + 1
+        self._valid = np.zeros(self._capacity(), dtype=bool)
+        for chunk_id, row, metadata in rows:
+            self._rows[chunk_id] = row
+            self._valid[row] = True
+            self._index_fields(row, json.loads(metadata))
+        self._free = [row for row in range(self._high) if not self._valid[row]]
+        self._norms = np.zeros(self._capacity(), dtype=np.float32)
+        if self._high:
+            self._norms[: self._high] = self._row_norms(0, self._high)
+        if self._codes is not None and self._meta("quantized_version") != str(
+            self._version
+        ):
+            self._rebuild_quantized()
+        self._load_hnsw()
+
+    def _capacity(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    @staticmethod
+    def _open_memmap(path: str, dtype, rows: int, columns: Optional[int]):
+        size = rows * (columns or 1) * np.dtype(dtype).itemsize
+        if not os.path.exists(path) or os.path.getsize(path) < size:
+            with open(path, "ab") as file:
+                file.truncate(size)
+        shape = (rows, columns) if columns else (rows,)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _open_matrix(self, rows: Optional[int] = None):
+        if rows is None:
+            size = (
+                os.path.getsize(self._matrix_path)
+                if os.path.exists(self._matrix_path)
+                else 0
+            )
+            rows = size // (self.dim * 4)
+        if rows == 0:
+            self._matrix = self._codes = self._scales = None
+            return
+        self._matrix = self._open_memmap(self._matrix_path, np.float32, rows, self.dim)
+        if self.quantization == "int8":
+            self._codes = self._open_memmap(self._codes_path, np.int8, rows, self.dim)
+            self._scales = self._open_memmap(self._scales_path, np.float32, rows, None)
+
+    def _rebuild_quantized(self):
+        # Collection lama, atau mode int8 baru diaktifkan: quantize dari float32
+        for start in range(0, self._high, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, self._high)
+            codes, scales = quantize_int8(np.asarray(self._matrix[start:end]))
+            self._codes[start:end] = codes
+            self._scales[start:end] = scales
+        self._set_meta("quantized_version", self._version)
+        self._conn.commit()
+        logger.info("Salinan int8 dibangun untuk %s baris", self._high)
+
+    def _ensure_capacity(self, rows: int):
+        capacity = self._capacity()
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 1024)
+        self._flush()
+        # Pembaca yang masih memegang memmap lama tetap aman, file hanya membesar
+        self._open_matrix(new_capacity)
+        self._valid = np.concatenate(
+            [self._valid, np.zeros(new_capacity - len(self._valid), dtype=bool)]
+        )
+        self._norms = np.concatenate(
+            [self._norms, np.zeros(new_capacity - len(self._norms), dtype=np.float32)]
+        )
+        if self._hnsw is not None:
+            self._hnsw.resize_index(new_capacity)
+
+    def _row_norms(self, start: int, end: int) -> np.ndarray:
+        block = np.asarray(self._matrix[start:end])
+        return np.einsum("ij,ij->i", block, block)
+
+    def _index_fields(self, row: int, metadata: Dict):
+        fields = [
+            (field, str(metadata[field]))
+            for field in FILTER_FIELDS
+            if field in metadata
+        ]
+        for field in fields:
+            self._fields[field].add(row)
+        if fields:
+            self._row_fields[row] = fields
+
+    def _unindex_fields(self, row: int):
+        for field in self._row_fields.pop(row, []):
+            self._fields[field].discard(row)
+
+    # HNSW
+
+    def _hnsw_enabled(self) -> bool:
+        return self._hnswlib is not None and self.count() >= self.hnsw_min_rows
+
+    def _load_hnsw(self):
+        if not self._hnsw_enabled():
+            return
+        saved_version = self._meta("hnsw_version")
+        if os.path.exists(self._hnsw_path) and saved_version == str(self._version):
+            try:
+                index = self._hnswlib.Index(space="l2", dim=self.dim)
+                index.load_index(self._hnsw_path, max_elements=self._capacity())
+                index.set_ef(self.hnsw_ef)
+                self._hnsw = index
+                return
+            except Exception as e:
+                logger.warning("Index HNSW tidak bisa dibaca, dibangun ulang: %s", e)
+        self._build_hnsw()
+
+    def _build_hnsw(self):
+        index = self._hnswlib.Index(space="l2", dim=self.dim)
+        index.init_index(max_elements=self._capacity(), ef_construction=200, M=16)
+        rows = np.flatnonzero(self._valid[: self._high])
+        if len(rows):
+            index.add_items(np.asarray(self._matrix[rows]), rows)
+        index.set_ef(self.hnsw_ef)
+        self._hnsw = index
+        logger.info("Index HNSW dibangun untuk %s vector", len(rows))
+
+    # Operasi
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        with self._lock:
+            return {chunk_id for chunk_id in ids if chunk_id in self._rows}
+
+    def upsert(self, documents: List[Document], ids: List[str]) -> None:
+        if not documents:
+            return
+        # ID ganda dalam satu batch: yang terakhir dipakai, satu baris per ID
+        latest = {chunk_id: index for index, chunk_id in enumerate(ids)}
+        if len(latest) < len(ids):
+            documents = [documents[index] for index in latest.values()]
+            ids = list(latest)
+        vectors = np.asarray(
+            self.embeddings.embed_documents(
+                [document.page_content for document in documents]
+            ),
+            dtype=np.float32,
+        )
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._set_meta("dim", self.dim)
+            rows = []
+            for chunk_id in ids:
+                row = self._rows.get(chunk_id)
+                if row is None:
+                    row = self._free.pop() if self._free else self._next_row()
+                rows.append(row)
+            self._ensure_capacity(self._high)
+            rows_array = np.asarray(rows)
+            self._matrix[rows_array] = vectors
+            if self._codes is not None:
+                self._codes[rows_array], self._scales[rows_array] = quantize_int8(
+                    vectors
+                )
+            self._norms[rows_array] = np.einsum("ij,ij->i", vectors, vectors)
+            # Vector ditulis ke disk sebelum commit metadata yang menunjuk ke barisnya
+            self._flush()
+            for chunk_id, row, document in zip(ids, rows, documents):
+                self._unindex_fields(row)
+                self._index_fields(row, document.metadata)
+                self._rows[chunk_id] = row
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, row, content, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        chunk_id,
+                        row,
+                        document.page_content,
+                        json.dumps(document.metadata),
+                    )
+                    for chunk_id, row, document in zip(ids, rows, documents)
+                ],
+            )
+            self._bump_version()
+            # Baris baru baru terlihat oleh search setelah vector dan isi tersimpan
+            self._valid[rows_array] = True
+            if self._hnsw is not None:
+                # Label = nomor baris; baris bekas chunk terhapus di-update di tempat
+                self._hnsw.add_items(vectors, rows_array)
+            elif self._hnsw_enabled():
+                self._build_hnsw()
+
+    def _bump_version(self):
+        self._version += 1
+        self._set_meta("version", self._version)
+        if self._codes is not None:
+            self._set_meta("quantized_version", self._version)
+        self._conn.commit()
+
+    def _flush(self):
+        for array in (self._matrix, self._codes, self._scales):
+            if array is not None:
+                array.flush()
+
+    def _next_row(self) -> int:
+        row = self._high
+        self._high += 1
+        return row
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            rows = [
+                self._rows.pop(chunk_id) for chunk_id in ids if chunk_id in self._rows
+            ]
+            if not rows:
+                return
+            self._valid[rows] = False
+            for row in rows:
+                self._unindex_fields(row)
+                if self._hnsw is not None:
+                    self._hnsw.mark_deleted(row)
+            self._free.extend(rows)
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in ids]
+            )
+            self._bump_version()
+
+    def _candidate_rows(self, filter: Optional[Dict[str, str]]) -> Optional[np.ndarray]:
+        if not filter:
+            return None
+        sets = []
+        for key, value in filter.items():
+            if key not in FILTER_FIELDS:
+                raise ValueError(f"Filter hanya mendukung field {FILTER_FIELDS}")
+            sets.append(self._fields.get((key, str(value)), set()))
+        rows = set.intersection(*sets) if sets else set()
+        return np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+
+    def _snapshot(self, rows: Optional[np.ndarray]):
+        # Array bisa diganti saat kapasitas bertambah; referensi lama tetap valid.
+        # Isi baris tetap bisa berubah: search mengecek _version setelah scan
+        if rows is None:
+            high = self._high
+            rows = np.arange(high)
+            part = slice(0, high)
+            valid = self._valid[:high].copy()
+        else:
+            part = rows
+            valid = None
+        quantized = None
+        if self._codes is not None:
+            quantized = (self._codes[part], self._scales[part])
+        return self._matrix, part, rows, quantized, self._norms[part], valid
+
+    def _scan(
+        self,
+        query: np.ndarray,
+        matrix: np.ndarray,
+        part,
+        rows: np.ndarray,
+        quantized: Optional[Tuple[np.ndarray, np.ndarray]],
+        norms: np.ndarray,
+        valid: Optional[np.ndarray],
+        k: int,
+    ) -> List[Tuple[int, float]]:
+        # |q - x|^2 = |x|^2 - 2 q.x + |q|^2, satu perkalian matriks untuk semua baris
+        squared = float(query @ query)
+        if quantized is None or len(rows) <= k * self.rescore_factor:
+            distances = norms - 2 * (np.asarray(matrix[part]) @ query) + squared
+        else:
+            codes, scales = quantized
+            dots = np.empty(len(rows), dtype=np.float32)
+            for start in range(0, len(rows), SCAN_BLOCK_ROWS):
+                block = np.asarray(codes[start : start + SCAN_BLOCK_ROWS], np.float32)
+                dots[start : start + len(block)] = block @ query
+            approximate = norms - 2 * scales * dots + squared
+            # Kandidat dari skor int8 dihitung ulang dengan vector float32 asli
+            candidates, _ = _top_indices(approximate, valid, k * self.rescore_factor)
+            distances = np.full(len(rows), np.inf, dtype=np.float32)
+            distances[candidates] = (
+                norms[candidates]
+                - 2 * (np.asarray(matrix[rows[candidates]]) @ query)
+                + squared
+            )
+        top, distances = _top_indices(distances, valid, k)
+        return [
+            (int(rows[index]), float(max(distances[index], 0.0)))
+            for index in top
+            if np.isfinite(distances[index])
+        ]
+
+    def _approximate(
+        self, query: np.ndarray, rows: Optional[np.ndarray], k: int
+    ) -> List[Tuple[int, float]]:
+        allowed = None if rows is None else set(rows.tolist())
+        k = min(k, self.count() if allowed is None else len(allowed))
+        if k == 0:
+            return []
+        labels, distances = self._hnsw.knn_query(
+            query,
+            k=k,
+            filter=None if allowed is None else (lambda label: label in allowed),
+        )
+        return [
+            (int(row), float(distance))
+            for row, distance in zip(labels[0], distances[0])
+        ]
+
+    def search(
+        self, vector: List[float], k: int, filter: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[Document, float]]:
+        if self.dim is None or not self._rows:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            rows = self._candidate_rows(filter)
+            # Subset kecil hasil filter lebih cepat (dan exact) tanpa HNSW
+            if self._hnsw is not None and (rows is None or len(rows) > self.exact_rows):
+                return self._documents(self._approximate(query, rows, k))
+            snapshot = self._snapshot(rows)
+            version = self._version
+        # Perkalian matriks di luar lock agar search paralel tidak saling tunggu
+        hits = self._scan(query, *snapshot, k)
+        with self._lock:
+            if self._version != version:
+                # Ada upsert/delete selama scan: baris bisa sudah dipakai chunk
+                # lain, jadi scan diulang sambil memegang lock
+                rows = self._candidate_rows(filter)
+                hits = self._scan(query, *self._snapshot(rows), k)
+            return self._documents(hits)
+
+    def _documents(self, hits: List[Tuple[int, float]]) -> List[Tuple[Document, float]]:
+        if not hits:
+            return []
+        placeholders = ",".join("?" * len(hits))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT row, content, metadata FROM chunks WHERE row IN ({placeholders})",
+                [row for row, _ in hits],
+            ).fetchall()
+        by_row = {
+            row: Document(page_content=content, metadata=json.loads(metadata))
+            for row, content, metadata in rows
+        }
+        return [(by_row[row], distance) for row, distance in hits if row in by_row]
+
+    def get_all(self) -> Tuple[List[str], List[Document]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, content, metadata FROM chunks"
+            ).fetchall()
+        return [row[0] for row in rows], [
+            Document(page_content=content, metadata=json.loads(metadata))
+            for _, content, metadata in rows
+        ]
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            found = [
+                (chunk_id, self._rows[chunk_id])
+                for chunk_id in ids
+                if chunk_id in self._rows
+            ]
+            if not found:
+                return {}
+            # Fancy index menyalin baris, aman dipakai setelah lock dilepas
+            vectors = self._matrix[np.asarray([row for _, row in found])]
+        return {chunk_id: vector for (chunk_id, _), vector in zip(found, vectors)}
+
+    def memory_stats(self) -> Dict:
+        """Ukuran data vector yang di-scan per query, float32 vs int8."""
+        rows = self._high
+        float_bytes = rows * (self.dim or 0) * 4
+        scan_bytes = float_bytes
+        if self._codes is not None:
+            # Kode int8 per elemen plus satu scale float32 per baris
+            scan_bytes = rows * ((self.dim or 0) + 4)
+        return {
+            "rows": self.count(),
+            "dim": self.dim,
+            "quantization": self.quantization,
+            "float32_mb": round(float_bytes / 1024 / 1024, 2),
+            "scan_mb": round(scan_bytes / 1024 / 1024, 2),
+            "saved_mb": round((float_bytes - scan_bytes) / 1024 / 1024, 2),
+        }
+
+    def persist(self) -> None:
+        with self._lock:
+            self._flush()
+            if self._hnsw is not None:
+                self._hnsw.save_index(self._hnsw_path)
+                self._set_meta("hnsw_version", self._version)
+                self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self.persist()
+            self._conn.close()
@@ -1,20 +1,44 @@
+import asyncio
+import logging
 import os
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, START, StateGraph
 from langgraph.prebuilt import ToolNode
 
+from app.answer_cache import SemanticAnswerCache
+from app.checkpoint import make_checkpointer
+from app.config import env_bool, env_float, env_int, env_str
+from app.context import ContextAssembler
+from app.limits import LimitedModel
 from app.models import AgentState
+from app.prompt_cache import PrefixCacheTracker
 from app.prompts import AgentPromptControl
-from app.RAG import RAGSystem
+from app.RAG import get_rag_system
+from app.summarizer import DocumentSummarizer
+from app.telemetry import telemetry
+from app.tenancy import TenantScope
 from app.tools import AgentTools
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+STREAM_NODES = (
+    "check_answer_cache",
+    "main_agent",
+    "get_document",
+    "answer_rag_question",
+    "load_document",
+    "describe_document",
+)
+
 
 class Workflow:
     def __init__(
@@ -26,35 +50,110 @@ class Workflow:
     ):
         self.chromadb_path = chromadb_path
         self.collection_name = collection_name
-        self.llm_for_reasoning = ChatOpenAI(model="gpt-4o")
-        self.llm_for_explanation = ChatOpenAI(model="gpt-3.5-turbo")
+        # stream_usage agar jumlah token tetap tercatat saat jawaban di-stream.
+        # Semua panggilan lewat limiter per model yang dipakai bersama antar request
+        self.llm_for_reasoning = LimitedModel(
+            ChatOpenAI(model="gpt-4o", stream_usage=True)
+        )
+        self.llm_for_explanation = LimitedModel(
+            ChatOpenAI(model="gpt-3.5-turbo", stream_usage=True)
+        )
         self.memory_provider = os.environ.get("MEMORY_PROVIDER")
         self.provider_host = os.environ.get("PROVIDER_HOST")
         self.provider_port = os.environ.get("PROVIDER_PORT")
+        # Instance yang sama dengan milik AgentTools, jadi QA chain langsung terlihat
+        self.rag = get_rag_system(self.chromadb_path, self.collection_name)
         self.prompts = AgentPromptControl(
             is_include_memory=include_memory,
             memory_provider=self.memory_provider,
             provider_host=self.provider_host,
             provider_port=self.provider_port,
+            # Memory lokal memakai embedding RAG: cache, limiter, dan telemetry
+            embeddings=self.rag.embeddings,
+        )
+        self.context = ContextAssembler(
+            self.llm_for_explanation,
+            self.prompts,
+            max_tokens=env_int("CONTEXT_MAX_TOKENS", 3000),
+            tool_message_tokens=env_int("CONTEXT_TOOL_MESSAGE_TOKENS", 200),
+        )
+        self.summarizer = DocumentSummarizer(
+            self.llm_for_explanation,
+            self.prompts,
+            chunk_tokens=env_int("SUMMARY_CHUNK_TOKENS", 3000),
+            max_input_tokens=env_int("SUMMARY_MAX_INPUT_TOKENS", 6000),
+            max_concurrency=env_int("SUMMARY_MAX_CONCURRENCY", 4),
+        )
+        self.prompt_cache = PrefixCacheTracker()
+        # Pool bersama untuk pencarian memory di jalur sync, dipakai semua turn
+        self._memory_executor = (
+            ThreadPoolExecutor(
+                max_workers=env_int("MEMORY_PREFETCH_WORKERS", 8),
+                thread_name_prefix="memory-prefetch",
+            )
+            if self.prompts.is_include_memory
+            else None
+        )
+        self.memory = make_checkpointer()
+        self.tenancy = TenantScope(
+            directory_path,
+            chromadb_path,
+            collection_name,
+            mode=env_str("TENANT_MODE", "none"),
+        )
+        self.tools = AgentTools(
+            self.chromadb_path, self.collection_name, tenancy=self.tenancy
         )
-        self.memory = MemorySaver()
-        self.tools = AgentTools(self.chromadb_path, self.collection_name)
         self.build = self._build_workflow()
-        self.rag = RAGSystem(self.chromadb_path, self.collection_name)
+        self.answer_cache = self._setup_answer_cache()
         self.directiory_path = directory_path
 
+    def _setup_answer_cache(self):
+        if not env_bool("ANSWER_CACHE", True):
+            return None
+        return SemanticAnswerCache(
+            os.path.join(
+                self.chromadb_path, f"{self.collection_name}_answer_cache.sqlite"
+            ),
+            threshold=env_float("ANSWER_CACHE_THRESHOLD", 0.95),
+            ttl_seconds=env_int("ANSWER_CACHE_TTL_SECONDS", 86400),
+            max_entries=env_int("ANSWER_CACHE_MAX_ENTRIES", 1000),
+        )
+
     def _build_workflow(self):
         graph = StateGraph(AgentState)
-        graph.add_node("main_agent", self._main_agent)
-        graph.add_node("get_document", ToolNode(tools=[self.tools.get_document]))
-        graph.add_node("answer_rag_question", self._agent_answer_rag_question)
-        graph.add_node("load_document", self._load_document)
-        graph.add_node("describe_document", self._agent_describe_document)
+        # Setiap node punya versi sync (invoke) dan async (ainvoke), dan
+        # dibungkus span telemetry yang ditandai dengan thread_id
+        tool_node = ToolNode(tools=[self.tools.get_document_tool])
+        nodes = {
+            "check_answer_cache": (
+                self._check_answer_cache,
+                self._acheck_answer_cache,
+            ),
+            "main_agent": (self._main_agent, self._amain_agent),
+            "get_document": (tool_node.invoke, tool_node.ainvoke),
+            "answer_rag_question": (
+                self._agent_answer_rag_question,
+                self._aagent_answer_rag_question,
+            ),
+            "load_document": (self._load_document, self._aload_document),
+            "describe_document": (
+                self._agent_describe_document,
+                self._aagent_describe_document,
+            ),
+        }
+        for name, (func, afunc) in nodes.items():
+            graph.add_node(name, _traced(name, func, afunc))
 
         graph.add_conditional_edges(
             START,
             self._checking_message_type,
-            {"describe_document": "load_document", "main_agent": "main_agent"},
+            {"describe_document": "load_document", "main_agent": "check_answer_cache"},
+        )
+        graph.add_conditional_edges(
+            "check_answer_cache",
+            self._is_cached_answer,
+            {"hit": END, "miss": "main_agent"},
         )
         graph.add_edge("load_document", "describe_document")
         graph.add_edge("describe_document", END)
@@ -69,35 +168,136 @@ class Workflow:
 
         return graph.compile(checkpointer=self.memory)
 
-    def _checking_message_type(self, state: AgentState):
+    def _checking_message_type(self, state: AgentState, config: RunnableConfig):
         if state.is_include_document and os.path.exists(
-            f"{self.directiory_path}/{state.document_name}"
+            self.tenancy.document_path(config, state.document_name)
         ):
             return "describe_document"
         return "main_agent"
 
-    def _load_document(self, state: AgentState):
-        if not os.path.exists(self.directiory_path + "/"):
-            os.makedirs(self.directiory_path, exist_ok=True)
-        documents = self.rag.load_document(self.directiory_path)
-        self.rag.add_document(documents=documents)
+    def _lookup_answer(self, question: str):
+        if self.answer_cache is None:
+            return None
+        corpus_version = self.rag.corpus_version()
+        # Tanpa entri untuk versi corpus ini tidak perlu menghitung embedding
+        if self.answer_cache.is_empty(corpus_version):
+            return None
+        vector = self.rag.embeddings.embed_query(question)
+        return self.answer_cache.lookup(vector, corpus_version)
 
-        get_single_docs = self.rag.load_one_document(
-            self.directiory_path, state.document_name, state.document_type
+    def _is_cacheable(self, history: List, config: RunnableConfig) -> bool:
+        """Cache jawaban hanya untuk turn yang tidak bergantung konteks: tanpa
+        history percakapan, tanpa memory user, dan tanpa scope tenant/dokumen
+        (cache dipakai bersama satu collection)."""
+        return (
+            self.answer_cache is not None
+            and not history
+            and not self.prompts.is_include_memory
+            and not self.tenancy.is_scoped(config)
         )
-        document = "".join([item.page_content for item in get_single_docs])
 
-        if not os.path.exists(f"{self.directiory_path}/{state.document_name}"):
-            document = "not found."
+    def _store_answer(self, state: AgentState, answer: str, config: RunnableConfig):
+        # History sebelum pesan user turn ini (setelahnya: tool call dan hasilnya)
+        turn_start = max(
+            (
+                index
+                for index, message in enumerate(state.messages)
+                if isinstance(message, HumanMessage)
+            ),
+            default=0,
+        )
+        if not self._is_cacheable(state.messages[:turn_start], config):
+            return
+        question = state.user_message
+        try:
+            vector = self.rag.embeddings.embed_query(question)
+            self.answer_cache.store(question, vector, answer, self.rag.corpus_version())
+        except Exception as e:
+            logger.warning("Gagal menyimpan jawaban ke cache: %s", e)
+
+    def _check_answer_cache(self, state: AgentState, config: RunnableConfig):
+        if not self._is_cacheable(state.messages, config):
+            return {"is_cached_answer": False}
+        try:
+            answer = self._lookup_answer(state.user_message)
+        except Exception as e:
+            logger.warning("Gagal membaca cache jawaban: %s", e)
+            answer = None
+        if self.answer_cache is not None:
+            telemetry.record_cache("answer", answer is not None)
+        if answer is None:
+            return {"is_cached_answer": False}
+        logger.debug("Jawaban diambil dari cache: %s", answer)
+        return {
+            "messages": state.messages
+            + [HumanMessage(content=state.user_message), AIMessage(content=answer)],
+            "response": answer,
+            "is_cached_answer": True,
+        }
+
+    async def _acheck_answer_cache(self, state: AgentState, config: RunnableConfig):
+        return await asyncio.to_thread(self._check_answer_cache, state, config)
+
+    def _is_cached_answer(self, state: AgentState):
+        return "hit" if state.is_cached_answer else "miss"
+
+    def _load_document(self, state: AgentState, config: RunnableConfig):
+        directory_path = self.tenancy.directory(config)
+        os.makedirs(directory_path, exist_ok=True)
+        # Hanya file yang diupload yang diproses, manifest melewati chunk lama.
+        # Halaman yang sama dipakai untuk indexing dan untuk deskripsi dokumen.
+        file_path = os.path.join(directory_path, state.document_name)
+        if not os.path.exists(file_path):
+            return {"document_content": "not found."}
+        pages = []
+        try:
+            with self.tenancy.rag(config) as rag:
+                rag.ingest_files(
+                    [file_path],
+                    on_page=pages.append,
+                    file_type=state.document_type,
+                    metadata=self.tenancy.metadata(config),
+                    file_hashes=(
+                        {file_path: state.document_hash}
+                        if state.document_hash
+                        else None
+                    ),
+                )
+        except Exception as e:
+            # Jangan lanjut ke describe_document dengan dokumen setengah jadi;
+            # error diteruskan agar job ingestion tercatat gagal
+            logger.error("Error saat ingest dokumen %s: %s", file_path, e)
+            raise
+
+        document = "".join([item.page_content for item in pages])
 
         return {"document_content": document}
 
-    def _agent_describe_document(self, state: AgentState):
-        prompt = self.prompts.agent_describe_document(
-            state.user_message, state.document_content
-        )
+    async def _aload_document(self, state: AgentState, config: RunnableConfig):
+        # Parsing PDF dan operasi Chroma masih blocking, jalankan di thread lain
+        return await asyncio.to_thread(self._load_document, state, config)
+
+    def _agent_describe_document(self, state: AgentState, config: RunnableConfig):
+        # Dokumen besar diringkas map-reduce dulu agar muat di context window
+        document = self.summarizer.condense(state.document_content)
+        prompt = self.prompts.agent_describe_document(state.user_message, document)
         llm = self.llm_for_explanation
         response = llm.invoke(prompt)
+        self._record_llm("describe_document", config, prompt, llm, response)
+        return self._describe_document_update(state, response)
+
+    async def _aagent_describe_document(
+        self, state: AgentState, config: RunnableConfig
+    ):
+        document = await self.summarizer.acondense(state.document_content)
+        prompt = self.prompts.agent_describe_document(state.user_message, document)
+        response = await self.llm_for_explanation.ainvoke(prompt)
+        self._record_llm(
+            "describe_document", config, prompt, self.llm_for_explanation, response
+        )
+        return self._describe_document_update(state, response)
+
+    def _describe_document_update(self, state: AgentState, response: AIMessage):
         return {
             "messages": state.messages + [response],
             "response": response.content,
@@ -118,22 +318,75 @@ class Workflow:
                 formatted.append(data)
         return formatted
 
-    def _main_agent(self, state: AgentState) -> Dict[str, Any]:
-        prompt = self.prompts.main_agent(state.user_message)
-        messages = [prompt[0]] + state.messages + [prompt[1]]
-        llm = self.llm_for_reasoning.bind_tools([self.tools.get_document])
+    def _remember_turn(self, user_message: str, response: AIMessage, memory_id: str):
+        message = [
+            HumanMessage(content=user_message),
+            AIMessage(content=response.content),
+        ]
+        formatted_message = self._formatted_message(message)
+        self.prompts.memory.add_context(formatted_message, memory_id)
+
+    def _main_agent(self, state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+        memory_id = self._memory_id(config)
+        if self._memory_executor is not None:
+            # Pencarian memory berjalan bersamaan dengan penyusunan history.
+            # Context disalin agar span telemetry ikut ke thread pool
+            prompt_future = self._memory_executor.submit(
+                copy_context().run,
+                self.prompts.main_agent,
+                state.user_message,
+                memory_id,
+            )
+            history = self.context.assemble(state.messages, _thread_id(config))
+            prompt = prompt_future.result()
+        else:
+            prompt = self.prompts.main_agent(state.user_message, memory_id)
+            history = self.context.assemble(state.messages, _thread_id(config))
+        messages = self.prompts.compose(prompt, history)
+        llm = self.llm_for_reasoning.bind_tools([self.tools.get_document_tool])
         response = llm.invoke(messages)
+        self._record_llm(
+            "main_agent", config, messages, self.llm_for_reasoning, response
+        )
+        if self.prompts.is_include_memory:
+            self._remember_turn(state.user_message, response, memory_id)
+        return self._main_agent_update(state, response)
+
+    async def _amain_agent(
+        self, state: AgentState, config: RunnableConfig
+    ) -> Dict[str, Any]:
+        memory_id = self._memory_id(config)
+        prompt, history = await asyncio.gather(
+            self.prompts.amain_agent(state.user_message, memory_id),
+            self.context.aassemble(state.messages, _thread_id(config)),
+        )
+        messages = self.prompts.compose(prompt, history)
+        llm = self.llm_for_reasoning.bind_tools([self.tools.get_document_tool])
+        response = await llm.ainvoke(messages)
+        self._record_llm(
+            "main_agent", config, messages, self.llm_for_reasoning, response
+        )
         if self.prompts.is_include_memory:
-            message = [
-                HumanMessage(content=state.user_message),
-                AIMessage(content=response.content),
-            ]
-            formatted_message = self._formatted_message(message)
-            print(formatted_message)
-            self.prompts.memory.add_context(formatted_message, self.prompts.memory_id)
-
-        print(f"AI: {response.content}")
-        print(f"state: {state.messages} ")
+            await asyncio.to_thread(
+                self._remember_turn, state.user_message, response, memory_id
+            )
+        return self._main_agent_update(state, response)
+
+    def _memory_id(self, config: RunnableConfig) -> str:
+        # Memory jangka panjang dipisah per user, atau per thread jika tanpa user
+        configurable = config.get("configurable", {})
+        return (
+            configurable.get("user_id")
+            or configurable.get("thread_id")
+            or self.prompts.memory_id
+        )
+
+    def _record_llm(self, node: str, config: RunnableConfig, messages, llm, response):
+        self.prompt_cache.record(node, _thread_id(config), messages, response=response)
+        telemetry.record_llm(llm.model_name, response)
+
+    def _main_agent_update(self, state: AgentState, response: AIMessage):
+        logger.debug("AI: %s", response.content)
         return {
             "messages": state.messages
             + [HumanMessage(content=state.user_message)]
@@ -147,21 +400,124 @@ class Workflow:
             return "tool_call"
         return "end"
 
-    def _agent_answer_rag_question(self, state: AgentState):
+    def _agent_answer_rag_question(self, state: AgentState, config: RunnableConfig):
         tool_message = state.messages[-1].content
         prompt = self.prompts.agent_answer_rag_question(
             state.user_message, tool_message
         )
+        history = self.context.assemble(state.messages, _thread_id(config))
+        messages = self.prompts.compose(prompt, history)
         llm = self.llm_for_explanation
-        response = llm.invoke([prompt[0]] + state.messages + [prompt[1]])
-        print(f"response: {response.content}")
+        response = llm.invoke(messages)
+        self._record_llm("answer_rag_question", config, messages, llm, response)
+        logger.debug("response: %s", response.content)
+        self._store_answer(state, response.content, config)
         return {"messages": state.messages + [response], "response": response.content}
 
-    def run(self, state: Dict, thread_id: str):
-        return self.build.invoke(
-            state,
-            config={"configurable": {"thread_id": thread_id}},
+    async def _aagent_answer_rag_question(
+        self, state: AgentState, config: RunnableConfig
+    ):
+        tool_message = state.messages[-1].content
+        prompt = self.prompts.agent_answer_rag_question(
+            state.user_message, tool_message
         )
+        history = await self.context.aassemble(state.messages, _thread_id(config))
+        messages = self.prompts.compose(prompt, history)
+        response = await self.llm_for_explanation.ainvoke(messages)
+        self._record_llm(
+            "answer_rag_question",
+            config,
+            messages,
+            self.llm_for_explanation,
+            response,
+        )
+        logger.debug("response: %s", response.content)
+        await asyncio.to_thread(self._store_answer, state, response.content, config)
+        return {"messages": state.messages + [response], "response": response.content}
+
+    def close(self):
+        if self._memory_executor is not None:
+            self._memory_executor.shutdown(wait=True)
+        # Kirim sisa antrian memory sebelum proses berhenti
+        self.prompts.close()
+
+    def run(
+        self,
+        state: Dict,
+        thread_id: str,
+        user_id: Optional[str] = None,
+        document_name: Optional[str] = None,
+    ):
+        config = _run_config(thread_id, user_id, document_name)
+        return self.build.invoke(state, config=config)
+
+    async def arun(
+        self,
+        state: Dict,
+        thread_id: str,
+        user_id: Optional[str] = None,
+        document_name: Optional[str] = None,
+    ):
+        config = _run_config(thread_id, user_id, document_name)
+        return await self.build.ainvoke(state, config=config)
+
+    async def astream(
+        self,
+        state: Dict,
+        thread_id: str,
+        user_id: Optional[str] = None,
+        document_name: Optional[str] = None,
+    ) -> AsyncIterator[Dict]:
+        """Jalankan graph dan hasilkan event perpindahan node dan token jawaban."""
+        config = _run_config(thread_id, user_id, document_name)
+        async for event in self.build.astream_events(
+            state, config=config, version="v2"
+        ):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+            if kind == "on_chain_start" and event["name"] in STREAM_NODES:
+                yield {"type": "node", "node": event["name"]}
+            elif kind == "on_chat_model_stream" and "nostream" not in event.get(
+                "tags", []
+            ):
+                content = event["data"]["chunk"].content
+                if content:
+                    yield {"type": "token", "node": node, "content": content}
+
+        final_state = await self.build.aget_state(config)
+        yield {
+            "type": "done",
+            "user_message": final_state.values.get("user_message"),
+            "response": final_state.values.get("response"),
+        }
+
+
+def _run_config(
+    thread_id: str, user_id: Optional[str] = None, document_name: Optional[str] = None
+) -> Dict:
+    configurable = {"thread_id": thread_id}
+    if user_id:
+        configurable["user_id"] = user_id
+    if document_name:
+        # Batasi retrieval ke satu dokumen yang sudah diupload
+        configurable["document_name"] = document_name
+    return {"configurable": configurable}
+
+
+def _thread_id(config: RunnableConfig):
+    return config.get("configurable", {}).get("thread_id")
+
+
+def _traced(node: str, func, afunc) -> RunnableLambda:
+    def run(state, config: RunnableConfig):
+        with telemetry.span(node, _thread_id(config)):
+            return func(state, config)
+
+    async def arun(state, config: RunnableConfig):
+        with telemetry.span(node, _thread_id(config)):
+            return await afunc(state, config)
+
+    return RunnableLambda(run, afunc=arun)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+"""Ukur waktu import, waktu warmup, dan resident memory (RSS) saat startup.
+
+Setiap target diukur di proses Python baru agar cache import tidak ikut terhitung.
+Jalankan dari folder Backend:
+
+    python -m benchmarks.bench_startup --repeat 5
+    python -m benchmarks.bench_startup --warmup --importtime 15
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_TARGETS = ["app", "main"]
+
+MEASURE_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+module = __import__({target!r}, fromlist=["_"])
+import_seconds = time.perf_counter() - started
+warmup_seconds = None
+if {warmup!r}:
+    started = time.perf_counter()
+    module.agent.warmup()
+    warmup_seconds = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss_kb //= 1024
+print(json.dumps({{
+    "import_seconds": import_seconds,
+    "warmup_seconds": warmup_seconds,
+    "max_rss_mb": rss_kb / 1024,
+    "modules_loaded": len(sys.modules),
+}}))
+"""
+
+
+def _run(target, warmup):
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_SCRIPT.format(target=target, warmup=warmup)],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    ).stdout
+    # Baris terakhir berisi hasil, baris sebelumnya log dari aplikasi
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _slowest_imports(target, limit):
+    # -X importtime menulis "self | cumulative | module" ke stderr
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True,
+        text=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|", 2)
+        rows.append(
+            {
+                "module": module.strip(),
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            }
+        )
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def _summary(values):
+    return {
+        "mean": round(statistics.mean(values), 3),
+        "p50": round(statistics.median(values), 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def run(targets, repeat, warmup=False, importtime=0):
+    report = {}
+    for target in targets:
+        # Warmup hanya berlaku untuk modul yang punya objek agent (main)
+        with_warmup = warmup and target == "main"
+        results = [_run(target, with_warmup) for _ in range(repeat)]
+        entry = {
+            "runs": repeat,
+            "import_seconds": _summary([r["import_seconds"] for r in results]),
+            "max_rss_mb": _summary([r["max_rss_mb"] for r in results]),
+            "modules_loaded": results[-1]["modules_loaded"],
+        }
+        if with_warmup:
+            entry["warmup_seconds"] = _summary([r["warmup_seconds"] for r in results])
+        if importtime:
+            entry["slowest_imports"] = _slowest_imports(target, importtime)
+        report[target] = entry
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target", action="append", dest="targets")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--warmup", action="store_true", help="ukur juga agent.warmup() pada main"
+    )
+    parser.add_argument(
+        "--importtime",
+        type=int,
+        default=0,
+        help="tampilkan N modul dengan waktu import kumulatif terbesar",
+    )
+    args = parser.parse_args()
+    print(
+        json.dumps(
+            run(
+                args.targets or DEFAULT_TARGETS,
+                args.repeat,
+                args.warmup,
+                args.importtime,
+            ),
+            indent=2,
+        )
+    )
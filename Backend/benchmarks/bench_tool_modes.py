@@ -0,0 +1,74 @@
+"""Bandingkan latency end-to-end tool get_document mode "retrieval" dan "qa".
+
+Jalankan dari folder Backend (butuh OPENAI_API_KEY dan collection yang sudah terisi):
+
+    python -m benchmarks.bench_tool_modes --question "Apa itu RPL?" --repeat 3
+"""
+
+import argparse
+import json
+import statistics
+import time
+import uuid
+
+from app.workflow import Workflow
+
+DEFAULT_QUESTIONS = ["Cari di dokumen: apa itu RPL?"]
+
+
+def _summary(latencies):
+    ordered = sorted(latencies)
+    return {
+        "runs": len(ordered),
+        "mean_seconds": round(statistics.mean(ordered), 3),
+        "p50_seconds": round(statistics.median(ordered), 3),
+        "min_seconds": round(ordered[0], 3),
+        "max_seconds": round(ordered[-1], 3),
+    }
+
+
+def run(questions, repeat, directory_path, chromadb_path, collection_name):
+    workflow = Workflow(directory_path, chromadb_path, collection_name)
+    report = {}
+    for mode in ("retrieval", "qa"):
+        workflow.tools.mode = mode
+        latencies = []
+        tool_calls = 0
+        for _ in range(repeat):
+            for question in questions:
+                started = time.perf_counter()
+                # Thread baru agar history percakapan tidak ikut memengaruhi latency
+                result = workflow.run(
+                    {"user_message": question}, thread_id=uuid.uuid4().hex
+                )
+                latencies.append(time.perf_counter() - started)
+                tool_calls += any(
+                    getattr(message, "tool_calls", None)
+                    for message in result["messages"]
+                )
+        report[mode] = {**_summary(latencies), "turns_with_tool_call": tool_calls}
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--question", action="append", dest="questions")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--directory", default="documents")
+    parser.add_argument("--chromadb", default="data")
+    parser.add_argument("--collection", default="my_collections")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    report = run(
+        args.questions or DEFAULT_QUESTIONS,
+        args.repeat,
+        args.directory,
+        args.chromadb,
+        args.collection,
+    )
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
@@ -0,0 +1,260 @@
+"""Bandingkan backend vector store (Chroma, NumPy brute-force, NumPy + int8,
+NumPy + HNSW) pada corpus vector sintetis yang sama: waktu build, waktu buka
+ulang, latency query dengan dan tanpa filter tenant, recall@k terhadap hasil
+exact, RSS, ukuran di disk, dan memory scan yang dihemat quantization.
+
+Setiap backend diukur di proses Python baru agar memory tidak tercampur.
+Jalankan dari folder Backend:
+
+    python -m benchmarks.bench_vectorstore --chunks 20000 --dim 1536
+    python -m benchmarks.bench_vectorstore --backend numpy --backend numpy_int8
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.run import percentiles
+
+BACKENDS = ("chroma", "numpy", "numpy_int8", "numpy_hnsw")
+
+
+class LookupEmbeddings:
+    """Embedding yang sudah dihitung sebelumnya, dicari berdasarkan teks.
+    Biaya embedding tidak ikut terukur sehingga yang dibandingkan hanya
+    vector store-nya."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            rss_kb //= 1024
+        return rss_kb / 1024
+
+
+def _directory_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1024 / 1024
+
+
+def _dataset(chunks: int, queries: int, dim: int, tenants: int, seed: int = 0):
+    # Vector berkelompok (bukan uniform) agar mirip embedding teks sungguhan
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, chunks // 50), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=chunks)]
+    vectors += 0.5 * rng.standard_normal((chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = rng.integers(chunks, size=queries)
+    query_vectors = vectors[picks] + 0.3 * rng.standard_normal((queries, dim)).astype(
+        np.float32
+    )
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    tenant_ids = [f"tenant_{index % tenants}" for index in range(chunks)]
+    return vectors, query_vectors, tenant_ids
+
+
+def _make_store(backend: str, directory: str, embeddings, args):
+    from app.vectorstores import ChromaVectorStore, NumpyVectorStore
+
+    if backend == "chroma":
+        return ChromaVectorStore(directory, "bench_vectors", embeddings)
+    return NumpyVectorStore(
+        directory,
+        "bench_vectors",
+        embeddings,
+        hnsw=backend == "numpy_hnsw",
+        hnsw_min_rows=0,
+        hnsw_ef=args.hnsw_ef,
+        quantization="int8" if backend == "numpy_int8" else "none",
+        rescore_factor=args.rescore_factor,
+    )
+
+
+def _exact_top_k(vectors, query, k, rows=None):
+    candidates = vectors if rows is None else vectors[rows]
+    distances = ((candidates - query) ** 2).sum(axis=1)
+    top = np.argsort(distances)[:k]
+    return set(top if rows is None else rows[top])
+
+
+def worker(backend: str, args) -> dict:
+    from langchain.schema import Document
+
+    vectors, query_vectors, tenant_ids = _dataset(
+        args.chunks, args.queries, args.dim, args.tenants
+    )
+    texts = [f"chunk {index}" for index in range(args.chunks)]
+    query_texts = [f"query {index}" for index in range(args.queries)]
+    lookup = dict(zip(texts, vectors.tolist()))
+    lookup.update(zip(query_texts, query_vectors.tolist()))
+    embeddings = LookupEmbeddings(lookup)
+    directory = tempfile.mkdtemp(prefix=f"bench_vs_{backend}_")
+    try:
+        rss_before = _rss_mb()
+        started = time.perf_counter()
+        store = _make_store(backend, directory, embeddings, args)
+        for start in range(0, args.chunks, args.batch_size):
+            end = min(start + args.batch_size, args.chunks)
+            store.upsert(
+                [
+                    Document(
+                        page_content=texts[index],
+                        metadata={
+                            "source": f"doc_{index % 100}",
+                            "tenant_id": tenant_ids[index],
+                        },
+                    )
+                    for index in range(start, end)
+                ],
+                [f"id_{index}" for index in range(start, end)],
+            )
+        store.persist()
+        build_seconds = time.perf_counter() - started
+        rss_built = _rss_mb()
+        store.close()
+        del store
+
+        started = time.perf_counter()
+        store = _make_store(backend, directory, embeddings, args)
+        store.count()
+        reopen_seconds = time.perf_counter() - started
+
+        index_of = {text: index for index, text in enumerate(texts)}
+        tenant_rows = np.flatnonzero(np.array(tenant_ids) == "tenant_0")
+        results = {}
+        for name, search_filter in (
+            ("search", None),
+            ("search_filtered", {"tenant_id": "tenant_0"}),
+        ):
+            latencies = []
+            recalls = []
+            for query_text, query in zip(query_texts, query_vectors):
+                vector = embeddings.embed_query(query_text)
+                started = time.perf_counter()
+                hits = store.search(vector, k=args.k, filter=search_filter)
+                latencies.append(time.perf_counter() - started)
+                found = {index_of[document.page_content] for document, _ in hits}
+                expected = _exact_top_k(
+                    vectors,
+                    query,
+                    args.k,
+                    None if search_filter is None else tenant_rows,
+                )
+                recalls.append(len(found & expected) / len(expected))
+            results[name] = {
+                **percentiles(latencies),
+                f"recall_at_{args.k}": round(float(np.mean(recalls)), 4),
+            }
+        memory = store.memory_stats() if hasattr(store, "memory_stats") else {}
+        store.close()
+        return {
+            "build_seconds": round(build_seconds, 3),
+            "reopen_seconds": round(reopen_seconds, 3),
+            "rss_growth_mb": round(rss_built - rss_before, 1),
+            "rss_after_queries_mb": round(_rss_mb(), 1),
+            "disk_mb": round(_directory_mb(directory), 1),
+            "scan_mb": memory.get("scan_mb"),
+            "scan_saved_mb": memory.get("saved_mb"),
+            **results,
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _run_worker(backend: str, argv) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_vectorstore", "--worker", backend]
+        + argv,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1:]}
+    # Baris terakhir berisi hasil, baris sebelumnya log dari aplikasi
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run(args, argv) -> dict:
+    from app.vectorstores import _load_hnswlib
+
+    report = {
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("worker", "backends")
+        },
+        "backends": {},
+    }
+    for backend in args.backends or BACKENDS:
+        if backend == "numpy_hnsw" and _load_hnswlib() is None:
+            report["backends"][backend] = {"skipped": "hnswlib tidak terpasang"}
+            continue
+        print(f"Mengukur backend {backend}...", file=sys.stderr)
+        report["backends"][backend] = _run_worker(backend, argv)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", action="append", dest="backends", choices=BACKENDS)
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--hnsw-ef", type=int, default=128)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--output", help="file JSON hasil (default: stdout)")
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args)))
+        sys.exit(0)
+
+    # Parameter dataset yang sama diteruskan ke setiap proses worker
+    argv = []
+    for key in (
+        "chunks",
+        "dim",
+        "queries",
+        "k",
+        "tenants",
+        "batch_size",
+        "hnsw_ef",
+        "rescore_factor",
+    ):
+        argv += ["--" + key.replace("_", "-"), str(getattr(args, key))]
+    report = run(args, argv)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+        print(f"Hasil benchmark disimpan di {args.output}", file=sys.stderr)
+    else:
+        print(output)
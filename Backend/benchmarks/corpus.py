@@ -0,0 +1,147 @@
+"""Generator corpus sintetis (TXT dan PDF) untuk benchmark.
+
+    python -m benchmarks.corpus --output /tmp/corpus --files 4 --pages 50
+"""
+
+import argparse
+import os
+import random
+from typing import List
+
+WORDS = (
+    "dokumen sistem data analisis laporan proyek jaringan aplikasi pengguna server "
+    "keamanan basis model proses desain metode hasil evaluasi kebutuhan modul "
+    "perangkat lunak rekayasa pengujian integrasi arsitektur layanan kinerja biaya "
+    "jadwal risiko kualitas standar prosedur informasi teknologi manajemen tim"
+).split()
+CODES = ["RPL", "API", "SQL", "HTTP", "UML", "CPU", "RAM", "SLA"]
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 18))]
+    if rng.random() < 0.3:
+        words[rng.randrange(len(words))] = f"{rng.choice(CODES)}-{rng.randint(1, 99)}"
+    sentence = " ".join(words)
+    return sentence[0].upper() + sentence[1:] + "."
+
+
+def make_pages(pages: int, words_per_page: int = 300, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    result = []
+    for _ in range(pages):
+        sentences = []
+        count = 0
+        while count < words_per_page:
+            sentence = _sentence(rng)
+            sentences.append(sentence)
+            count += len(sentence.split())
+        result.append(" ".join(sentences))
+    return result
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text: str, width: int = 90) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    if line:
+        lines.append(line)
+    return lines
+
+
+def write_pdf(file_path: str, pages: List[str]):
+    """Tulis PDF sederhana (font Helvetica, teks bisa diekstrak pypdf)."""
+    objects = []
+    page_ids = []
+    font_id = 3
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(b"")  # /Pages diisi setelah semua halaman diketahui
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for text in pages:
+        lines = [f"({_pdf_escape(line)}) Tj T*" for line in _wrap(text)]
+        stream = ("BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(lines) + " ET").encode(
+            "latin-1", "replace"
+        )
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+        content_id = len(objects)
+        objects.append(
+            (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                f"/Resources << /Font << /F1 {font_id} 0 R >> >> "
+                f"/Contents {content_id} 0 R >>"
+            ).encode()
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    with open(file_path, "wb") as file:
+        file.write(output)
+
+
+def generate_corpus(
+    directory: str,
+    files: int = 2,
+    pages: int = 20,
+    words_per_page: int = 300,
+    file_type: str = "pdf",
+    seed: int = 0,
+) -> List[str]:
+    """Buat `files` dokumen dengan `pages` halaman masing-masing, deterministik
+    untuk seed yang sama. Mengembalikan daftar path file."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(files):
+        content = make_pages(pages, words_per_page, seed=seed + index)
+        file_path = os.path.join(directory, f"synthetic_{index}.{file_type}")
+        if file_type == "pdf":
+            write_pdf(file_path, content)
+        else:
+            with open(file_path, "w", encoding="utf-8") as file:
+                file.write("\n\n".join(content))
+        paths.append(file_path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument(
+        "--type", dest="file_type", choices=["pdf", "txt"], default="pdf"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for path in generate_corpus(
+        args.output,
+        args.files,
+        args.pages,
+        args.words_per_page,
+        args.file_type,
+        args.seed,
+    ):
+        print(path)
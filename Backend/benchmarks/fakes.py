@@ -0,0 +1,215 @@
+"""Pengganti ChatOpenAI, OpenAI dan OpenAIEmbeddings untuk benchmark offline.
+
+Semua hasil deterministik dan latency bisa diatur, jadi benchmark bisa
+dijalankan tanpa OPENAI_API_KEY dan hasilnya bisa dibandingkan antar commit.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.language_models.llms import LLM
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+# Pesan yang mengandung kata ini membuat fake chat memanggil tool get_document
+TOOL_TRIGGER = "dokumen"
+
+
+class FakeEmbeddings(Embeddings):
+    """Embedding bag-of-words dengan hashing: teks yang kata-katanya mirip
+    menghasilkan vector yang mirip, tanpa model sungguhan."""
+
+    def __init__(
+        self,
+        size: int = 256,
+        latency_ms: float = 0.0,
+        per_text_latency_ms: float = 0.0,
+    ):
+        self.size = size
+        self.model = f"fake-embedding-{size}"
+        self.latency_ms = latency_ms
+        self.per_text_latency_ms = per_text_latency_ms
+        self.calls = 0
+        self.texts = 0
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(token.encode("utf-8")).digest()[:8], "big")
+        return np.random.default_rng(seed).standard_normal(self.size)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            vector += self._token_vector(token)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).astype(np.float32).tolist()
+
+    def _delay(self, count: int) -> float:
+        return (self.latency_ms + self.per_text_latency_ms * count) / 1000
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        time.sleep(self._delay(len(texts)))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        await asyncio.sleep(self._delay(len(texts)))
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model palsu dengan latency tetap dan jawaban deterministik."""
+
+    model_name: str = "fake-chat"
+    latency_ms: float = 0.0
+    tools_bound: bool = False
+
+    def __init__(self, model: Optional[str] = None, **kwargs: Any):
+        kwargs.setdefault("latency_ms", float(os.environ.get("FAKE_LLM_LATENCY_MS", 0)))
+        kwargs.pop("stream_usage", None)
+        super().__init__(model_name=model or "fake-chat", **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return FakeChatModel(
+            model=self.model_name, latency_ms=self.latency_ms, tools_bound=True
+        )
+
+    def _respond(self, messages) -> AIMessage:
+        text = str(messages[-1].content)
+        prompt_tokens = sum(_estimate_tokens(str(m.content)) for m in messages)
+        if self.tools_bound and TOOL_TRIGGER in text.lower():
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": "get_document", "args": {"query": text}, "id": "call_1"}
+                ],
+            )
+        else:
+            message = AIMessage(content=f"Jawaban {self.model_name} untuk: {text[:80]}")
+        completion_tokens = _estimate_tokens(message.content or "tool")
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return message
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        for chunk in self._chunks(self._respond(messages)):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency_ms / 1000)
+        for chunk in self._chunks(self._respond(messages)):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    def _chunks(self, message: AIMessage):
+        if message.tool_calls:
+            call = message.tool_calls[0]
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {
+                            "name": call["name"],
+                            "args": f'{{"query": "{call["args"]["query"]}"}}',
+                            "id": call["id"],
+                            "index": 0,
+                        }
+                    ],
+                )
+            )
+        else:
+            for word in message.content.split(" "):
+                yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+        # Seperti stream_usage OpenAI: usage dikirim di chunk terakhir
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=message.usage_metadata)
+        )
+
+
+class FakeLLM(LLM):
+    """Pengganti completion LLM OpenAI yang dipakai RetrievalQA (mode "qa")."""
+
+    latency_ms: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-llm"
+
+    def _call(self, prompt: str, stop=None, run_manager=None, **kwargs) -> str:
+        time.sleep(self.latency_ms / 1000)
+        return f"Jawaban QA untuk prompt {_estimate_tokens(prompt)} token"
+
+
+def install(
+    llm_latency_ms: float = 0.0,
+    embedding_latency_ms: float = 0.0,
+    embedding_per_text_latency_ms: float = 0.0,
+    embedding_size: int = 256,
+):
+    """Ganti client OpenAI di modul aplikasi dengan versi palsu.
+
+    Harus dipanggil sebelum Workflow/RAGSystem dibuat.
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(llm_latency_ms)
+
+    import langchain.embeddings
+    import langchain.llms
+
+    import app.RAG
+    import app.workflow
+
+    def make_embeddings(*args, **kwargs):
+        return FakeEmbeddings(
+            size=embedding_size,
+            latency_ms=embedding_latency_ms,
+            per_text_latency_ms=embedding_per_text_latency_ms,
+        )
+
+    app.RAG.OpenAIEmbeddings = make_embeddings
+    app.workflow.ChatOpenAI = FakeChatModel
+    # Diimport secara lazy di dalam fungsi, jadi di-patch di modul asalnya
+    langchain.embeddings.OpenAIEmbeddings = make_embeddings
+    langchain.llms.OpenAI = lambda *args, **kwargs: FakeLLM(latency_ms=llm_latency_ms)
@@ -0,0 +1,273 @@
+"""Benchmark suite offline: ingestion, retrieval, satu giliran graph, dan
+throughput API secara concurrent. Semua client OpenAI diganti versi palsu
+(benchmarks.fakes), jadi tidak butuh API key dan hasilnya bisa dibandingkan
+antar commit.
+
+Jalankan dari folder Backend:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --scenario retrieval --pages 200 --llm-latency-ms 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from benchmarks import fakes
+from benchmarks.corpus import WORDS, generate_corpus
+
+SCENARIOS = ("ingestion", "retrieval", "graph", "api")
+
+
+def percentiles(latencies):
+    ordered = sorted(latencies)
+    if not ordered:
+        return {}
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+        "p50_ms": round(pick(0.5) * 1000, 3),
+        "p90_ms": round(pick(0.9) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _queries(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 7)))
+        for _ in range(count)
+    ]
+
+
+def _new_rag(workspace):
+    from app.RAG import get_rag_system
+
+    return get_rag_system(os.path.join(workspace, "data"), "bench_collection")
+
+
+def bench_ingestion(workspace, args):
+    paths = generate_corpus(
+        os.path.join(workspace, "corpus"),
+        files=args.files,
+        pages=args.pages,
+        words_per_page=args.words_per_page,
+        file_type=args.file_type,
+    )
+    rag = _new_rag(workspace)
+    started = time.perf_counter()
+    stats = rag.ingest_files(paths)
+    first = time.perf_counter() - started
+    # Ingest ulang file yang sama: seharusnya dilewati oleh manifest
+    started = time.perf_counter()
+    rag.ingest_files(paths)
+    second = time.perf_counter() - started
+    return {
+        **stats.as_dict(),
+        "first_run_seconds": round(first, 3),
+        "unchanged_rerun_seconds": round(second, 3),
+    }
+
+
+def bench_retrieval(workspace, args):
+    rag = _new_rag(workspace)
+    queries = _queries(args.queries)
+    results = {}
+    for name, search in (
+        ("retrieve", lambda query: rag.retrieve(query)),
+        ("similarity_search", lambda query: rag.similarity_search(query, k=4)),
+        ("hybrid_search", lambda query: rag.hybrid_search(query, k=8)),
+    ):
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            latencies.append(time.perf_counter() - started)
+        results[name] = percentiles(latencies)
+    return results
+
+
+def _turn_messages(count, seed=2):
+    # Campuran pertanyaan biasa dan pertanyaan yang memicu tool get_document
+    rng = random.Random(seed)
+    messages = []
+    for query in _queries(count, seed):
+        if rng.random() < 0.5:
+            messages.append(f"Cari di dokumen: {query}")
+        else:
+            messages.append(query)
+    return messages
+
+
+def bench_graph(workspace, args):
+    from app.workflow import Workflow
+
+    workflow = Workflow(
+        os.path.join(workspace, "corpus"),
+        os.path.join(workspace, "data"),
+        "bench_collection",
+    )
+    results = {}
+    for name, thread_for in (
+        ("new_thread", lambda index: uuid.uuid4().hex),
+        ("same_thread", lambda index: "bench-thread"),
+    ):
+        latencies = []
+        for message in _turn_messages(args.turns):
+            started = time.perf_counter()
+            workflow.run({"user_message": message}, thread_id=thread_for(message))
+            latencies.append(time.perf_counter() - started)
+        results[name] = percentiles(latencies)
+    return results
+
+
+async def _api_load(app, messages, concurrency):
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120
+    ) as client:
+
+        async def one(message):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/agent",
+                    json={"message": message, "thread_id": uuid.uuid4().hex},
+                )
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(message) for message in messages))
+        wall = time.perf_counter() - started
+    return latencies, errors, wall
+
+
+def bench_api(workspace, args):
+    import main
+
+    # Agent di main dibuat lazy, arahkan ke collection benchmark sebelum dipakai
+    main.agent.directory_path = os.path.join(workspace, "corpus")
+    main.agent.chromadb_path = os.path.join(workspace, "data")
+    main.agent.collection_name = "bench_collection"
+    results = {}
+    for concurrency in args.concurrency:
+        messages = _turn_messages(args.requests, seed=concurrency)
+        latencies, errors, wall = asyncio.run(
+            _api_load(main.app, messages, concurrency)
+        )
+        results[f"concurrency_{concurrency}"] = {
+            **percentiles(latencies),
+            "errors": errors,
+            "wall_seconds": round(wall, 3),
+            "requests_per_second": round(len(messages) / wall, 2) if wall else 0.0,
+        }
+    main.agent.close()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(args):
+    fakes.install(
+        llm_latency_ms=args.llm_latency_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+        embedding_per_text_latency_ms=args.embedding_per_text_latency_ms,
+        embedding_size=args.embedding_size,
+    )
+    # Cache jawaban dimatikan agar yang diukur adalah jalur graph sebenarnya
+    os.environ.setdefault("ANSWER_CACHE", "false")
+    os.environ.setdefault("INCLUDE_MEMORY", "false")
+
+    scenarios = args.scenarios or list(SCENARIOS)
+    workspace = tempfile.mkdtemp(prefix="bench_")
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                key: value for key, value in vars(args).items() if key != "output"
+            },
+        },
+        "scenarios": {},
+    }
+    try:
+        # Retrieval, graph, dan API butuh collection yang sudah terisi
+        if "ingestion" not in scenarios:
+            bench_ingestion(workspace, args)
+        for name in SCENARIOS:
+            if name in scenarios:
+                print(f"Menjalankan skenario {name}...", file=sys.stderr)
+                report["scenarios"][name] = globals()[f"bench_{name}"](workspace, args)
+    finally:
+        from app.RAG import close_rag_systems
+
+        close_rag_systems()
+        shutil.rmtree(workspace, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--scenario", action="append", dest="scenarios", choices=SCENARIOS
+    )
+    parser.add_argument("--output", help="file JSON hasil (default: stdout)")
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument(
+        "--type", dest="file_type", choices=["pdf", "txt"], default="pdf"
+    )
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--embedding-latency-ms", type=float, default=20)
+    parser.add_argument("--embedding-per-text-latency-ms", type=float, default=0.5)
+    parser.add_argument("--embedding-size", type=int, default=256)
+    args = parser.parse_args()
+
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+        print(f"Hasil benchmark disimpan di {args.output}", file=sys.stderr)
+    else:
+        print(output)
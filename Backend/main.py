@@ -1,16 +1,86 @@
+import asyncio
+import json
+import logging
 import os
-import shutil
+import uuid
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
 
 import uvicorn
 from app import Agent
+from app.config import env_bool, env_int, env_str
+from app.jobs import IngestionJobQueue, JobStore, SQLiteJobStore
+from app.limits import limiter_stats
+from app.telemetry import configure_logging, telemetry
+from app.tenancy import tenant_directory
+from app.uploads import InvalidUpload, MultipartUpload, UploadTooLarge, discard_upload
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 load_dotenv()
+configure_logging()
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+JOB_STAGES = {"load_document": "indexing", "describe_document": "describing"}
+UPLOAD_PATH = "/api/agent/document"
+# Ruang untuk boundary multipart dan field form lain di luar isi file
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+max_upload_bytes = env_int("MAX_UPLOAD_MB", 25) * 1024 * 1024
+
+
+async def _run_ingestion_job(job: Dict, set_stage: Callable[[str], None]):
+    payload = job["payload"]
+    result = {}
+    async for event in agent.astream(
+        payload["state"],
+        thread_id=payload["thread_id"],
+        user_id=payload.get("user_id"),
+    ):
+        if event["type"] == "node" and event["node"] in JOB_STAGES:
+            set_stage(JOB_STAGES[event["node"]])
+        elif event["type"] == "done":
+            result = {
+                "user_message": event["user_message"],
+                "response": event["response"],
+                "thread_id": payload["thread_id"],
+            }
+    return result
+
+
+def _make_job_store() -> JobStore:
+    # Status job yang sudah selesai disimpan sementara untuk dipolling client
+    retention = {
+        "ttl_seconds": env_int("JOB_RETENTION_SECONDS", 3600),
+        "max_finished": env_int("JOB_MAX_FINISHED", 1000),
+    }
+    if env_str("JOB_QUEUE", "memory").lower() == "sqlite":
+        return SQLiteJobStore(env_str("JOB_DB_PATH", "data/jobs.sqlite"), **retention)
+    return JobStore(**retention)
+
+
+job_queue = IngestionJobQueue(
+    _run_ingestion_job,
+    store=_make_job_store(),
+    max_concurrency=env_int("JOB_MAX_CONCURRENCY", 2),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if env_bool("WARMUP_ON_STARTUP", False):
+        # Bangun workflow sekarang agar request pertama tidak menanggung biayanya
+        await asyncio.to_thread(agent.warmup)
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await asyncio.to_thread(agent.close)
+
+
+app = FastAPI(lifespan=lifespan)
 origins = ["*"]
 app.add_middleware(
     CORSMiddleware,
@@ -21,17 +91,40 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Tolak upload besar dari header Content-Length sebelum body dibaca
+    if request.url.path == UPLOAD_PATH:
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > max_upload_bytes + UPLOAD_FORM_OVERHEAD:
+            return JSONResponse(
+                status_code=413, content={"detail": "Ukuran file terlalu besar"}
+            )
+    return await call_next(request)
+
+
 class UserMessage(BaseModel):
     message: str
+    thread_id: Optional[str] = None
+    # Pemilik memory jangka panjang; tanpa user_id memory dipisah per thread
+    user_id: Optional[str] = None
+    # Batasi pencarian ke satu dokumen yang sudah diupload
+    document_name: Optional[str] = None
+
 
+def _resolve_thread_id(thread_id: Optional[str]) -> str:
+    # Client mengirim thread_id miliknya, jika belum ada server membuatkan yang baru
+    return thread_id or uuid.uuid4().hex
 
-# include_memory = bool(os.environ.get("INCLUDE_MEMORY"))
-include_memory = True if os.environ.get("INCLUDE_MEMORY").lower() == "true" else False
+
+# Agent dibuat lazy: workflow baru dibangun saat request pertama atau warmup
+include_memory = env_bool("INCLUDE_MEMORY", False)
+tenant_mode = env_str("TENANT_MODE", "none").lower()
 agent = Agent("documents", "data", "my_collections", include_memory=include_memory)
 
 
 @app.post("/api/agent")
-def executeAgent(request: Request, message: UserMessage):
+async def executeAgent(request: Request, message: UserMessage):
     # Cek dulu content type
     content_type = request.headers.get("content-type")
     if not content_type or "application/json" not in content_type:
@@ -41,47 +134,188 @@ def executeAgent(request: Request, message: UserMessage):
         )
     if not message.message:
         return {"response": "Message is required."}
+    thread_id = _resolve_thread_id(message.thread_id)
     try:
-        result = agent.execute(
-            {"user_message": message.message}, thread_id="thread_123"
+        result = await agent.aexecute(
+            {"user_message": message.message},
+            thread_id=thread_id,
+            user_id=message.user_id,
+            document_name=message.document_name,
         )
         human_message = result["user_message"]
         response = result["response"]
-        return {"user_message": human_message, "response": response}
+        return {
+            "user_message": human_message,
+            "response": response,
+            "thread_id": thread_id,
+        }
     except Exception as e:
-        print(f"Error saat execute agent: {e}")
-        return {"user_message": message, "response": "Maaf sepertinya kesalahan."}
+        logger.exception("Error saat execute agent: %s", e)
+        return {
+            "user_message": message,
+            "response": "Maaf sepertinya kesalahan.",
+            "thread_id": thread_id,
+        }
+
+
+@app.post("/api/agent/stream")
+async def streamAgent(message: UserMessage):
+    if not message.message:
+        return {"response": "Message is required."}
+    thread_id = _resolve_thread_id(message.thread_id)
+
+    async def event_stream():
+        yield f"event: thread\ndata: {json.dumps({'thread_id': thread_id})}\n\n"
+        try:
+            async for event in agent.astream(
+                {"user_message": message.message},
+                thread_id=thread_id,
+                user_id=message.user_id,
+                document_name=message.document_name,
+            ):
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logger.exception("Error saat stream agent: %s", e)
+            error = {"type": "error", "response": "Maaf sepertinya kesalahan."}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+UPLOAD_FORM_SCHEMA = {
+    "type": "object",
+    "required": ["message", "file"],
+    "properties": {
+        "message": {"type": "string"},
+        "file": {"type": "string", "format": "binary"},
+        "thread_id": {"type": "string"},
+        "user_id": {"type": "string"},
+    },
+}
 
 
-@app.post("/api/agent/document")
-async def withDocument(message: str = Form(...), file: UploadFile = File(...)):
-    directory_path = "documents"
-    if not os.path.exists(directory_path):
-        os.makedirs(directory_path, exist_ok=True)
+async def _receive_upload(request: Request):
+    """Parse form upload langsung dari body request (tanpa spool Starlette)."""
+    content_type = request.headers.get("content-type", "")
+    if "multipart/form-data" not in content_type:
+        raise HTTPException(
+            status_code=415, detail="Hanya menerima multipart/form-data"
+        )
+    # File sementara di folder upload utama: filesystem sama, jadi bisa di-rename
+    await asyncio.to_thread(os.makedirs, agent.directory_path, exist_ok=True)
+    try:
+        upload = MultipartUpload(content_type, agent.directory_path, max_upload_bytes)
+        fields, file = await upload.parse(request.stream())
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if file is None or not fields.get("message"):
+        if file is not None:
+            await asyncio.to_thread(discard_upload, file.temp_path)
+        raise HTTPException(status_code=422, detail="Field message dan file wajib")
+    return fields, file
 
-    file_path = os.path.join(directory_path, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+
+@app.post(
+    UPLOAD_PATH,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"multipart/form-data": {"schema": UPLOAD_FORM_SCHEMA}},
+        }
+    },
+)
+async def withDocument(request: Request):
+    fields, file = await _receive_upload(request)
+    message = fields["message"]
+    user_id = fields.get("user_id") or None
+    thread_id = _resolve_thread_id(fields.get("thread_id"))
     try:
-        result = agent.execute(
-            {
+        # Folder upload dipisah per tenant (user, atau thread jika tanpa user)
+        directory_path = tenant_directory(
+            agent.directory_path, user_id or thread_id, tenant_mode
+        )
+        if not os.path.exists(directory_path):
+            os.makedirs(directory_path, exist_ok=True)
+
+        # basename: nama file dari client tidak boleh keluar dari folder upload
+        file_name = os.path.basename(file.filename)
+        if not file_name:
+            raise HTTPException(status_code=400, detail="Nama file tidak valid")
+        file_path = os.path.join(directory_path, file_name)
+        # Rename atomik: job ingestion tidak pernah membaca file setengah jadi
+        await asyncio.to_thread(os.replace, file.temp_path, file_path)
+    except BaseException:
+        await asyncio.to_thread(discard_upload, file.temp_path)
+        raise
+    document_hash = file.sha256
+
+    # Parsing, embedding dan deskripsi dokumen dikerjakan di background
+    job = job_queue.submit(
+        {
+            "state": {
                 "user_message": message,
                 "is_include_document": True,
-                "document_name": file.filename,
+                "document_name": file_name,
                 "document_type": "pdf"
                 if file.content_type == "application/pdf"
                 else "txt",
+                "document_hash": document_hash,
             },
-            "thread_123",
-        )
-        await file.close()
-        human_message = result["user_message"]
-        response = result["response"]
-        print(f"============RESULT==========\n{result}")
-        return {"user_message": human_message, "response": response}
-    except Exception as e:
-        print(f"Error saat execute agent: {e}")
-        return {"user_message": message, "response": "Maaf sepertinya kesalahan."}
+            "thread_id": thread_id,
+            "user_id": user_id,
+        }
+    )
+    return JSONResponse(status_code=202, content={**job, "thread_id": thread_id})
+
+
+@app.get("/api/memory/stats")
+async def memoryStats():
+    # Jangan bangun workflow hanya untuk membaca statistik
+    stats = agent.workflow.prompts.memory_stats() if agent.initialized else None
+    return {"enabled": stats is not None, **(stats or {})}
+
+
+@app.get("/api/prompt-cache/stats")
+async def promptCacheStats():
+    if not agent.initialized:
+        return {"requests": 0}
+    return agent.workflow.prompt_cache.stats()
+
+
+@app.get("/api/limits/stats")
+async def limitsStats():
+    # Antrian, request berjalan, 429, dan prompt yang digabung per model
+    return limiter_stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    # Format teks Prometheus
+    return PlainTextResponse(
+        telemetry.metrics.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/api/metrics/threads/{thread_id}")
+async def threadMetrics(thread_id: str):
+    stats = telemetry.thread_stats(thread_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Thread tidak ditemukan")
+    return {"thread_id": thread_id, **stats}
+
+
+@app.get("/api/documents/{job_id}")
+async def documentJobStatus(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan")
+    return job
 
 
 if __name__ == "__main__":
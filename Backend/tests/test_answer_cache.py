@@ -0,0 +1,78 @@
+import pytest
+
+from app import answer_cache
+from app.answer_cache import SemanticAnswerCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache.time, "time", clock.time)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    return SemanticAnswerCache(str(tmp_path / "answers.sqlite"), **kwargs)
+
+
+def test_similar_question_hits(tmp_path, clock):
+    cache = make_cache(tmp_path, threshold=0.95)
+    cache.store("apa itu RAG?", [1.0, 0.0, 0.0], "jawaban", "v1")
+
+    assert cache.lookup([2.0, 0.01, 0.0], "v1") == "jawaban"
+    assert cache.lookup([0.0, 1.0, 0.0], "v1") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_corpus_version_invalidates_entries(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.store("q", [1.0, 0.0], "lama", "v1")
+    assert not cache.is_empty("v1")
+
+    assert cache.lookup([1.0, 0.0], "v2") is None
+    assert cache.is_empty("v2")
+    # Entri versi lama sudah dihapus, tidak kembali saat versi lama dipakai lagi
+    assert cache.lookup([1.0, 0.0], "v1") is None
+
+    cache.store("q", [1.0, 0.0], "baru", "v2")
+    reopened = make_cache(tmp_path)
+    assert reopened.lookup([1.0, 0.0], "v2") == "baru"
+
+
+def test_expired_entries_are_dropped(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache.store("q1", [1.0, 0.0], "satu", "v1")
+    clock.now += 30
+    cache.store("q2", [0.0, 1.0], "dua", "v1")
+    assert cache.lookup([1.0, 0.0], "v1") == "satu"
+
+    clock.now += 40
+    assert cache.lookup([1.0, 0.0], "v1") is None
+    assert cache.lookup([0.0, 1.0], "v1") == "dua"
+    assert cache.stats()["entries"] == 1
+
+    reopened = make_cache(tmp_path, ttl_seconds=60)
+    assert reopened.lookup([1.0, 0.0], "v1") is None
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.store("a", [1.0, 0.0, 0.0], "a", "v1")
+    cache.store("b", [0.0, 1.0, 0.0], "b", "v1")
+    # a dipakai lagi sehingga b yang paling lama tidak dipakai
+    assert cache.lookup([1.0, 0.0, 0.0], "v1") == "a"
+    cache.store("c", [0.0, 0.0, 1.0], "c", "v1")
+
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup([0.0, 1.0, 0.0], "v1") is None
+    assert cache.lookup([1.0, 0.0, 0.0], "v1") == "a"
+    assert cache.lookup([0.0, 0.0, 1.0], "v1") == "c"
@@ -0,0 +1,65 @@
+from typing import TypedDict
+
+import pytest
+from langgraph.graph import END, START, StateGraph
+
+from app import checkpoint
+from app.checkpoint import BoundedMemorySaver, make_checkpointer
+
+
+class State(TypedDict):
+    n: int
+
+
+def build(saver):
+    graph = StateGraph(State)
+    graph.add_node("a", lambda state: {"n": state["n"] + 1})
+    graph.add_node("b", lambda state: {"n": state["n"] + 1})
+    graph.add_edge(START, "a")
+    graph.add_edge("a", "b")
+    graph.add_edge("b", END)
+    return graph.compile(checkpointer=saver)
+
+
+def config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_memory_saver_evicts_least_recent_thread():
+    saver = BoundedMemorySaver(max_threads=2, ttl_seconds=0)
+    graph = build(saver)
+    for thread_id in ("t1", "t2", "t3"):
+        assert graph.invoke({"n": 0}, config(thread_id)) == {"n": 2}
+    assert saver.thread_count() == 2
+    assert graph.get_state(config("t1")).values == {}
+    assert graph.get_state(config("t3")).values == {"n": 2}
+
+
+def test_sqlite_saver_trims_checkpoints_and_threads(tmp_path, monkeypatch):
+    pytest.importorskip("langgraph.checkpoint.sqlite")
+    monkeypatch.setattr(checkpoint, "SQLITE_PRUNE_INTERVAL_SECONDS", 0)
+    saver = checkpoint._sqlite_saver(
+        str(tmp_path / "checkpoints.sqlite"),
+        max_threads=2,
+        ttl_seconds=0,
+        max_checkpoints_per_thread=3,
+    )
+    graph = build(saver)
+    for thread_id in ("t1", "t2", "t3"):
+        for _ in range(3):
+            graph.invoke({"n": 0}, config(thread_id))
+    counts = dict(
+        saver.conn.execute(
+            "SELECT thread_id, COUNT(*) FROM checkpoints GROUP BY thread_id"
+        ).fetchall()
+    )
+    assert counts == {"t2": 3, "t3": 3}
+    assert graph.get_state(config("t3")).values == {"n": 2}
+
+
+def test_make_checkpointer_sqlite(tmp_path, monkeypatch):
+    pytest.importorskip("langgraph.checkpoint.sqlite")
+    monkeypatch.setenv("CHECKPOINTER", "sqlite")
+    monkeypatch.setenv("CHECKPOINT_DB_PATH", str(tmp_path / "data" / "c.sqlite"))
+    graph = build(make_checkpointer())
+    assert graph.invoke({"n": 0}, config("t1")) == {"n": 2}
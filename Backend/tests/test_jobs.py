@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app import RAG
+from app.jobs import DONE, FAILED, IngestionJobQueue, JobStore
+from benchmarks import fakes
+
+
+async def run_job(handler, payload):
+    queue = IngestionJobQueue(handler, store=JobStore())
+    await queue.start()
+    try:
+        job = queue.submit(payload)
+        for _ in range(500):
+            job = queue.get(job["job_id"])
+            if job["status"] in (DONE, FAILED):
+                break
+            await asyncio.sleep(0.01)
+        return job
+    finally:
+        await queue.stop()
+
+
+def test_job_records_handler_result():
+    async def handler(job, set_stage):
+        set_stage("indexing")
+        return {"response": job["payload"]["message"]}
+
+    job = asyncio.run(run_job(handler, {"message": "halo"}))
+    assert job["status"] == DONE
+    assert job["result"] == {"response": "halo"}
+    assert "payload" not in job
+
+
+def test_job_records_handler_error():
+    async def handler(job, set_stage):
+        raise RuntimeError("gagal index")
+
+    job = asyncio.run(run_job(handler, {}))
+    assert job["status"] == FAILED
+    assert job["error"] == "gagal index"
+    assert "payload" not in job
+
+
+@pytest.fixture
+def workflow(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE", "false")
+    monkeypatch.setenv("VECTOR_STORE", "numpy")
+    monkeypatch.setenv("TENANT_MODE", "none")
+    monkeypatch.setenv("CHECKPOINTER", "memory")
+    fakes.install()
+    from app.workflow import Workflow
+
+    documents = tmp_path / "documents"
+    documents.mkdir()
+    (documents / "catatan.txt").write_text("Isi catatan kuliah RPL.")
+    workflow = Workflow(str(documents), str(tmp_path / "data"), "coll")
+    yield workflow
+    workflow.close()
+    RAG.close_rag_systems()
+
+
+def test_ingest_error_fails_job_without_describing(workflow, monkeypatch):
+    described = []
+
+    def fail_ingest(self, *args, **kwargs):
+        raise RuntimeError("vector store penuh")
+
+    async def describe(state, config):
+        described.append(state.document_content)
+        return {"response": "deskripsi"}
+
+    monkeypatch.setattr(RAG.RAGSystem, "ingest_files", fail_ingest)
+    monkeypatch.setattr(workflow, "_aagent_describe_document", describe)
+
+    async def handler(job, set_stage):
+        payload = job["payload"]
+        async for _ in workflow.astream(payload["state"], payload["thread_id"]):
+            pass
+        return {}
+
+    state = {
+        "user_message": "Jelaskan dokumen ini",
+        "is_include_document": True,
+        "document_name": "catatan.txt",
+        "document_type": "txt",
+    }
+    job = asyncio.run(run_job(handler, {"state": state, "thread_id": "t1"}))
+    assert job["status"] == FAILED
+    assert "vector store penuh" in job["error"]
+    assert described == []
@@ -0,0 +1,120 @@
+from langchain.schema import Document
+
+from app.lexical import (
+    BM25Index,
+    is_keyword_query,
+    lexical_weight,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+
+def make_index(tmp_path):
+    return BM25Index(str(tmp_path / "bm25.sqlite"))
+
+
+def add(index, chunks):
+    index.add(
+        list(chunks),
+        [
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in chunks.values()
+        ],
+    )
+
+
+CHUNKS = {
+    "1": ("Kode error ERR_404 muncul saat file tidak ditemukan", {"tenant_id": "a"}),
+    "2": ("Panduan instalasi server dan konfigurasi database", {"tenant_id": "a"}),
+    "3": (
+        "Server database memakai replikasi, server cadangan siap",
+        {"tenant_id": "b"},
+    ),
+}
+
+
+def test_tokenize():
+    assert tokenize("Server ERR_404, v2.1!") == ["server", "err_404", "v2", "1"]
+
+
+def test_search_ranks_by_bm25(tmp_path):
+    index = make_index(tmp_path)
+    add(index, CHUNKS)
+    assert len(index) == 3
+
+    hits = index.search("server database", k=3)
+    # Chunk 3 menyebut server dua kali dan lebih pendek
+    assert [chunk_id for chunk_id, _ in hits] == ["3", "2"]
+    assert hits[0][1] > hits[1][1] > 0
+
+    assert index.search("err_404")[0][0] == "1"
+    assert index.search("kubernetes helm") == []
+    assert index.search("") == []
+
+
+def test_search_filter(tmp_path):
+    index = make_index(tmp_path)
+    add(index, CHUNKS)
+    hits = index.search("server", filter={"tenant_id": "a"})
+    assert [chunk_id for chunk_id, _ in hits] == ["2"]
+    assert index.search("server", filter={"tenant_id": "c"}) == []
+
+
+def test_delete_and_reload(tmp_path):
+    index = make_index(tmp_path)
+    add(index, CHUNKS)
+    index.delete(["3"])
+    assert [chunk_id for chunk_id, _ in index.search("server")] == ["2"]
+    index.close()
+
+    reopened = make_index(tmp_path)
+    assert len(reopened) == 2
+    assert [chunk_id for chunk_id, _ in reopened.search("server")] == ["2"]
+    documents = reopened.get_documents(["1", "3"])
+    assert list(documents) == ["1"]
+    assert documents["1"].metadata == {"tenant_id": "a"}
+
+
+def test_add_skips_existing_chunk(tmp_path):
+    index = make_index(tmp_path)
+    add(index, CHUNKS)
+    total = index._total_length
+    add(index, {"1": ("isi lain", {})})
+    assert index._total_length == total
+    assert index.get_documents(["1"])["1"].page_content == CHUNKS["1"][0]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert [key for key, _ in fused] == ["b", "a", "d", "c"]
+    assert dict(fused)["b"] == 1 / 62 + 1 / 61
+    assert dict(fused)["d"] == 1 / 62
+
+
+def test_reciprocal_rank_fusion_weights():
+    rankings = [["lexical"], ["vector"]]
+    assert (
+        reciprocal_rank_fusion(rankings)[0][1] == reciprocal_rank_fusion(rankings)[1][1]
+    )
+    fused = reciprocal_rank_fusion(rankings, weights=[2.0, 1.0])
+    assert [key for key, _ in fused] == ["lexical", "vector"]
+    assert dict(fused)["lexical"] == 2 / 61
+
+
+def test_lexical_weight():
+    assert lexical_weight("bagaimana cara instalasi server?") == 1.0
+    assert lexical_weight("arti ERR_404") == 2.0
+    assert lexical_weight("setting di config.yaml") == 2.0
+    assert lexical_weight('cari "kalimat persis"', boost=3.0) == 3.0
+
+
+def test_is_keyword_query():
+    assert is_keyword_query("RPL")
+    assert is_keyword_query("ERR_404 config.yaml")
+    assert is_keyword_query('"rekayasa perangkat lunak"')
+    assert is_keyword_query("RPL?")
+    assert not is_keyword_query("Apa itu RPL?")
+    assert not is_keyword_query("Jelaskan bab 3 dokumen ini")
+    assert not is_keyword_query('cari "kalimat persis" di dokumen')
+    assert not is_keyword_query("rpl")
+    assert not is_keyword_query("")
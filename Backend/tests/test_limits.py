@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.limits import ModelLimiter, is_transient_error
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def start_queued(limiter, target, count):
+    threads = []
+    for index in range(count):
+        thread = threading.Thread(target=limiter.call, args=(target, index))
+        thread.start()
+        threads.append(thread)
+        # Tunggu sampai thread masuk slot atau antrian agar urutannya pasti
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            stats = limiter.stats()
+            if stats["in_flight"] + stats["waiting"] == index + 1:
+                break
+            time.sleep(0.001)
+    return threads
+
+
+def test_concurrency_limit():
+    limiter = ModelLimiter("test", max_concurrency=2, coalesce=False)
+    lock = threading.Lock()
+    active = []
+    peak = []
+    release = threading.Event()
+
+    def work(index):
+        with lock:
+            active.append(index)
+            peak.append(len(active))
+        release.wait(5)
+        with lock:
+            active.remove(index)
+
+    threads = start_queued(limiter, work, 6)
+    stats = limiter.stats()
+    assert stats["in_flight"] == 2
+    assert stats["waiting"] == 4
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert max(peak) == 2
+    stats = limiter.stats()
+    assert stats["in_flight"] == 0
+    assert stats["waiting"] == 0
+    assert stats["requests"] == 6
+
+
+def test_queue_is_fifo():
+    limiter = ModelLimiter("test", max_concurrency=1, coalesce=False)
+    order = []
+    release = threading.Event()
+
+    def work(index):
+        release.wait(5)
+        order.append(index)
+
+    threads = start_queued(limiter, work, 5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert order == list(range(5))
+
+
+def test_identical_calls_are_coalesced():
+    limiter = ModelLimiter("test", max_concurrency=4)
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def work(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return [value]
+
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(limiter.call(work, "a", key="k"))
+    )
+    leader.start()
+    started.wait(5)
+    followers = [
+        threading.Thread(
+            target=lambda: results.append(limiter.call(work, "a", key="k", shared=list))
+        )
+        for _ in range(3)
+    ]
+    for thread in followers:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while limiter.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert calls == ["a"]
+    assert results == [["a"]] * 4
+    # shared memberi salinan sendiri ke setiap follower
+    assert len({id(result) for result in results}) == 4
+    assert limiter.stats()["coalesced"] == 3
+    # Setelah selesai key tidak lagi digabung
+    assert limiter.call(lambda: "b", key="k") == "b"
+
+
+def test_coalesced_error_reaches_followers():
+    limiter = ModelLimiter("test", max_retries=0)
+    release = threading.Event()
+    errors = []
+
+    def work():
+        release.wait(5)
+        raise ValueError("gagal")
+
+    def run():
+        try:
+            limiter.call(work, key="k")
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while limiter.stats()["coalesced"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 3
+    assert limiter.stats()["requests"] == 1
+
+
+def test_async_calls_share_queue_and_coalesce():
+    limiter = ModelLimiter("test", max_concurrency=1)
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def main():
+        return await asyncio.gather(
+            limiter.acall(work, "a", key="a"),
+            limiter.acall(work, "a", key="a"),
+            limiter.acall(work, "b", key="b"),
+        )
+
+    assert asyncio.run(main()) == ["a", "a", "b"]
+    assert calls == ["a", "b"]
+    stats = limiter.stats()
+    assert stats["coalesced"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_rate_limit_is_retried_with_backoff():
+    limiter = ModelLimiter(
+        "test", max_retries=2, backoff_seconds=0.01, max_backoff_seconds=0.05
+    )
+    attempts = []
+
+    def work():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimited()
+        return "ok"
+
+    assert limiter.call(work) == "ok"
+    assert len(attempts) == 3
+    assert limiter.stats()["rate_limited"] == 2
+
+    def always_limited():
+        raise RateLimited()
+
+    with pytest.raises(RateLimited):
+        limiter.call(always_limited)
+
+
+def test_transient_errors():
+    class ServerError(Exception):
+        status_code = 503
+
+    class BadRequest(Exception):
+        status_code = 400
+
+    assert is_transient_error(ServerError())
+    assert is_transient_error(TimeoutError())
+    assert is_transient_error(ConnectionError())
+    assert not is_transient_error(RateLimited())
+    assert not is_transient_error(BadRequest())
+    assert not is_transient_error(RuntimeError())
@@ -0,0 +1,50 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app import models
+from app.models import add_messages_window, trim_history
+
+
+def turn(index, with_tool=False):
+    messages = [HumanMessage(content=f"q{index}", id=f"h{index}")]
+    if with_tool:
+        messages += [
+            AIMessage(
+                content="",
+                id=f"c{index}",
+                tool_calls=[{"name": "search", "args": {}, "id": f"t{index}"}],
+            ),
+            ToolMessage(content="hasil", tool_call_id=f"t{index}", id=f"r{index}"),
+        ]
+    messages.append(AIMessage(content=f"a{index}", id=f"a{index}"))
+    return messages
+
+
+def test_window_keeps_recent_turns(monkeypatch):
+    monkeypatch.setattr(models, "MAX_HISTORY_MESSAGES", 4)
+    history = []
+    for index in range(5):
+        history = add_messages_window(history, turn(index))
+    assert [message.content for message in history] == ["q3", "a3", "q4", "a4"]
+
+
+def test_window_starts_at_user_turn(monkeypatch):
+    monkeypatch.setattr(models, "MAX_HISTORY_MESSAGES", 5)
+    history = add_messages_window(turn(0), turn(1, with_tool=True))
+    history = add_messages_window(history, turn(2))
+    # Potongan tidak boleh diawali hasil tool tanpa tool call-nya
+    assert isinstance(history[0], HumanMessage)
+    assert [message.id for message in history] == ["h2", "a2"]
+    history = add_messages_window(turn(1, with_tool=True), turn(2))
+    assert [message.id for message in history] == ["h2", "a2"]
+
+
+def test_window_keeps_add_messages_semantics(monkeypatch):
+    monkeypatch.setattr(models, "MAX_HISTORY_MESSAGES", 10)
+    history = add_messages_window(turn(0), [AIMessage(content="ubah", id="a0")])
+    assert [message.content for message in history] == ["q0", "ubah"]
+
+
+def test_trim_history_without_user_turn_keeps_all():
+    messages = [AIMessage(content=str(index)) for index in range(5)]
+    assert trim_history(messages, 2) == messages
+    assert trim_history(messages, 0) == messages
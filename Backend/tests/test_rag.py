@@ -0,0 +1,56 @@
+import pytest
+from langchain.schema import Document
+
+from app import RAG
+from benchmarks.fakes import FakeEmbeddings
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-fake")
+    monkeypatch.setenv("EMBEDDING_CACHE", "false")
+    monkeypatch.setenv("VECTOR_STORE", "numpy")
+    monkeypatch.setenv("HYBRID_SEARCH", "true")
+    embeddings = FakeEmbeddings(size=32)
+    monkeypatch.setattr(RAG, "OpenAIEmbeddings", lambda **kwargs: embeddings)
+    rag = RAG.RAGSystem(str(tmp_path), "coll")
+    rag.add_document(
+        [
+            Document(
+                page_content="Mata kuliah RPL membahas rekayasa perangkat lunak.",
+                metadata={"source": "kurikulum.pdf"},
+            ),
+            Document(
+                page_content="Kode error ERR_404 berarti file tidak ditemukan.",
+                metadata={"source": "error.pdf"},
+            ),
+        ]
+    )
+    rag.fake_embeddings = embeddings
+    yield rag
+    rag.close()
+
+
+@pytest.mark.parametrize("query", ["RPL", "ERR_404", '"rekayasa perangkat lunak"'])
+def test_keyword_query_skips_embeddings(rag, query):
+    calls = rag.fake_embeddings.calls
+    results = rag.hybrid_search(query, k=2)
+    documents = rag.retrieve(query, k=2)
+    assert rag.fake_embeddings.calls == calls
+    assert results and documents
+    assert results[0][0].page_content == documents[0].page_content
+    assert documents[0].metadata["score"] == 1.0
+
+
+def test_question_uses_fused_search(rag):
+    calls = rag.fake_embeddings.calls
+    documents = rag.retrieve("Apa itu RPL?", k=2)
+    assert rag.fake_embeddings.calls > calls
+    assert documents[0].metadata["source"] == "kurikulum.pdf"
+
+
+def test_keyword_query_without_bm25_hit_falls_back_to_vectors(rag):
+    calls = rag.fake_embeddings.calls
+    assert rag.keyword_search("SQL") == []
+    assert rag.hybrid_search("SQL", k=1)
+    assert rag.fake_embeddings.calls > calls
@@ -0,0 +1,154 @@
+import numpy as np
+import pytest
+from langchain.schema import Document
+
+from app.vectorstores import NumpyVectorStore, quantize_int8
+
+
+class FakeEmbeddings:
+    """Vector tetap per teks agar hasil search bisa dihitung ulang di test."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def make_store(tmp_path, vectors, **kwargs):
+    return NumpyVectorStore(str(tmp_path), "coll", FakeEmbeddings(vectors), **kwargs)
+
+
+def documents(texts, **metadata):
+    return [Document(page_content=text, metadata=dict(metadata)) for text in texts]
+
+
+def test_upsert_search_and_delete(tmp_path):
+    vectors = {
+        "a": [1.0, 0.0, 0.0],
+        "b": [0.0, 1.0, 0.0],
+        "c": [0.0, 0.0, 1.0],
+        "a2": [0.9, 0.1, 0.0],
+    }
+    store = make_store(tmp_path, vectors)
+    store.upsert(documents(["a", "b", "c"]), ["1", "2", "3"])
+    assert store.count() == 3
+
+    hits = store.search([1.0, 0.0, 0.0], k=2)
+    assert [document.page_content for document, _ in hits] == ["a", "b"]
+    assert hits[0][1] == pytest.approx(0.0)
+    assert hits[1][1] == pytest.approx(2.0)
+
+    # Upsert id yang sudah ada mengganti isi di baris yang sama
+    store.upsert(documents(["a2"]), ["1"])
+    assert store.count() == 3
+    hits = store.search([1.0, 0.0, 0.0], k=1)
+    assert hits[0][0].page_content == "a2"
+
+    store.delete(["1", "missing"])
+    assert store.count() == 2
+    assert store.existing_ids(["1", "2", "3"]) == {"2", "3"}
+    hits = store.search([1.0, 0.0, 0.0], k=3)
+    assert [document.page_content for document, _ in hits] == ["b", "c"]
+
+    # Baris bekas chunk yang dihapus dipakai ulang
+    store.upsert(documents(["a"]), ["4"])
+    assert store._high == 3
+    assert store.search([1.0, 0.0, 0.0], k=1)[0][0].page_content == "a"
+
+
+def test_duplicate_ids_in_batch_keep_last(tmp_path):
+    vectors = {"a": [1.0, 0.0], "b": [0.0, 1.0]}
+    store = make_store(tmp_path, vectors)
+    store.upsert(documents(["a", "b"]), ["1", "1"])
+    assert store.count() == 1
+    assert store._high == 1
+    assert store.get_all()[1][0].page_content == "b"
+
+
+def test_add_skips_existing_ids(tmp_path):
+    vectors = {"a": [1.0, 0.0], "b": [0.0, 1.0]}
+    store = make_store(tmp_path, vectors)
+    assert store.add(documents(["a"]), ["1"]) == ["1"]
+    assert store.add(documents(["a", "b"]), ["1", "2"]) == ["2"]
+    assert store.embeddings.calls == 2
+    assert store.count() == 2
+
+
+def test_filter(tmp_path):
+    vectors = {"a": [1.0, 0.0], "b": [0.9, 0.1], "c": [0.0, 1.0]}
+    store = make_store(tmp_path, vectors)
+    store.upsert(documents(["a"], tenant_id="t1"), ["1"])
+    store.upsert(documents(["b", "c"], tenant_id="t2"), ["2", "3"])
+
+    hits = store.search([1.0, 0.0], k=3, filter={"tenant_id": "t2"})
+    assert [document.page_content for document, _ in hits] == ["b", "c"]
+    assert store.search([1.0, 0.0], k=3, filter={"tenant_id": "t3"}) == []
+    with pytest.raises(ValueError):
+        store.search([1.0, 0.0], k=3, filter={"page": "1"})
+
+
+def test_reopen_from_disk(tmp_path):
+    vectors = {"a": [1.0, 0.0], "b": [0.0, 1.0]}
+    store = make_store(tmp_path, vectors)
+    store.upsert(documents(["a", "b"], source="x.pdf"), ["1", "2"])
+    store.delete(["1"])
+    store.persist()
+
+    reopened = make_store(tmp_path, vectors)
+    assert reopened.count() == 1
+    assert reopened.existing_ids(["1", "2"]) == {"2"}
+    hits = reopened.search([1.0, 0.0], k=2, filter={"source": "x.pdf"})
+    assert [document.page_content for document, _ in hits] == ["b"]
+    np.testing.assert_allclose(reopened.get_vectors(["2"])["2"], [0.0, 1.0])
+
+
+def test_quantize_int8_round_trip():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 32)).astype(np.float32)
+    vectors[0] = 0
+    codes, scales = quantize_int8(vectors)
+    assert codes.dtype == np.int8
+    assert scales[0] == 1.0
+    error = np.abs(codes * scales[:, None] - vectors).max(axis=1)
+    assert np.all(error <= scales / 2 + 1e-6)
+
+
+def test_int8_rescore_matches_exact_search(tmp_path):
+    rng = np.random.default_rng(42)
+    count, dim, k = 3000, 64, 10
+    matrix = rng.normal(size=(count, dim)).astype(np.float32)
+    texts = [f"chunk {index}" for index in range(count)]
+    vectors = dict(zip(texts, matrix.tolist()))
+    ids = [str(index) for index in range(count)]
+
+    exact = make_store(tmp_path / "exact", vectors)
+    quantized = make_store(tmp_path / "int8", vectors, quantization="int8")
+    for store in (exact, quantized):
+        store.upsert(documents(texts), ids)
+
+    recall = []
+    for query in rng.normal(size=(20, dim)).astype(np.float32):
+        expected = exact.search(query.tolist(), k=k)
+        found = quantized.search(query.tolist(), k=k)
+        expected_texts = [document.page_content for document, _ in expected]
+        found_texts = [document.page_content for document, _ in found]
+        recall.append(len(set(expected_texts) & set(found_texts)) / k)
+        # Kandidat yang ditemukan diberi skor float32 asli, bukan skor int8
+        distances = dict((text, score) for text, (_, score) in zip(found_texts, found))
+        for document, score in expected:
+            if document.page_content in distances:
+                assert distances[document.page_content] == pytest.approx(
+                    score, rel=1e-4
+                )
+    assert np.mean(recall) >= 0.98
+
+
+def test_unknown_quantization(tmp_path):
+    with pytest.raises(ValueError):
+        make_store(tmp_path, {}, quantization="int4")
@@ -0,0 +1,38 @@
+from app import RAG
+from benchmarks import fakes
+
+
+def test_memory_prefetch_reuses_one_executor(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE", "false")
+    monkeypatch.setenv("VECTOR_STORE", "numpy")
+    monkeypatch.setenv("CHECKPOINTER", "memory")
+    monkeypatch.setenv("ANSWER_CACHE", "false")
+    monkeypatch.setenv("MEMORY_PROVIDER", "local")
+    monkeypatch.setenv("MEMORY_PATH", str(tmp_path / "memory"))
+    monkeypatch.setenv("MEMORY_FLUSH_INTERVAL_SECONDS", "3600")
+    fakes.install()
+    from app import workflow as workflow_module
+
+    created = []
+
+    class CountingExecutor(workflow_module.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            created.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(workflow_module, "ThreadPoolExecutor", CountingExecutor)
+    workflow = workflow_module.Workflow(
+        str(tmp_path / "documents"), str(tmp_path / "data"), "coll", True
+    )
+    try:
+        for turn in range(3):
+            result = workflow.run({"user_message": f"halo {turn}"}, thread_id="t1")
+            assert result["response"]
+        assert len(created) == 1
+        assert workflow.prompts.memory.queue_depth() == 3
+    finally:
+        workflow.close()
+        RAG.close_rag_systems()
+    assert created[0]._shutdown
+    # Sisa antrian memory ditulis saat close
+    assert workflow.prompts.memory.queue_depth() == 0
@@ -28,6 +28,7 @@ export default function ChatPage() {
   const [isLoading, setIsLoading] = useState(false)
   const [typingText, setTypingText] = useState("")
   const [isTyping, setIsTyping] = useState(false)
+  const [threadId, setThreadId] = useState<string | null>(null)
 
   const fileInputRef = useRef<HTMLInputElement>(null)
   const scrollAreaRef = useRef<HTMLDivElement>(null)
@@ -57,6 +58,20 @@ export default function ChatPage() {
     }, 10) // Adjust typing speed here
   }
 
+  // Document uploads are processed as background jobs, poll until finished
+  const waitForDocumentJob = async (jobId: string) => {
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 1000))
+      const jobResponse = await fetch(`http://backend:8000/api/documents/${jobId}`)
+      if (!jobResponse.ok) {
+        throw new Error("Failed to fetch document job status")
+      }
+      const job = await jobResponse.json()
+      if (job.status === "done") return job.result
+      if (job.status === "failed") throw new Error(job.error || "Document job failed")
+    }
+  }
+
   const handleSendMessage = async () => {
     if (!inputMessage.trim() && !selectedFile) return
 
@@ -85,6 +100,7 @@ export default function ChatPage() {
         const formData = new FormData()
         formData.append("message", inputMessage)
         formData.append("file", selectedFile)
+        if (threadId) formData.append("thread_id", threadId)
 
         response = await fetch("http://backend:8000/api/agent/document", {
           method: "POST",
@@ -100,6 +116,7 @@ export default function ChatPage() {
           },
           body: JSON.stringify({
             message: inputMessage,
+            thread_id: threadId,
           }),
         })
       }
@@ -108,7 +125,11 @@ export default function ChatPage() {
         throw new Error("Failed to send message")
       }
 
-      const data = await response.json()
+      let data = await response.json()
+      if (data.thread_id) setThreadId(data.thread_id)
+      if (data.job_id) {
+        data = await waitForDocumentJob(data.job_id)
+      }
 
       // Create AI message placeholder
       const aiMessageId = (Date.now() + 1).toString()